@@ -0,0 +1,199 @@
+"""
+Сравнение пропускной способности загрузки файлов в WSGI- и ASGI-режимах.
+
+API Яндекс Диска заменяется локальной заглушкой с искусственной
+задержкой, база — временным файлом SQLite. В WSGI-режиме запросы идут
+из пула потоков через тестовый клиент Flask (как в потоковом
+WSGI-сервере: новый цикл событий на каждый запрос), в ASGI-режиме —
+конкурентными задачами на одном цикле через `yacut.asgi.application`.
+Лимит одновременных загрузок на процесс на время замера задаёт
+`--disk-concurrency`: он становится и начальным, и верхним значением
+адаптивного лимита, так что заглушка без 429 его не сдвигает.
+Содержимое каждого файла случайное, чтобы дедупликация по SHA-256 не
+пропускала загрузки.
+
+    python benchmarks/upload_throughput.py --requests 200 --concurrency 16
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+_db = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False)
+os.environ['DATABASE_URI'] = f'sqlite:///{_db.name}'
+os.environ.setdefault('DISK_TOKEN', 'benchmark')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ.setdefault('CLICK_FLUSH_INTERVAL', '0')
+
+from yacut import app, db, yandexdisk  # noqa: E402
+from yacut.asgi import application  # noqa: E402
+from yacut.models import URLMap  # noqa: E402
+
+BOUNDARY = 'yacut-benchmark'
+FILE_SIZE = 64 * 1024
+
+
+def start_disk_stub(latency: float) -> str:
+    """Поднимает заглушку API Диска в отдельном потоке, возвращает адрес."""
+    async def upload_link(request):
+        await asyncio.sleep(latency)
+        return web.json_response({'href': f'{base}/put'})
+
+    async def put(request):
+        await request.read()
+        await asyncio.sleep(latency)
+        return web.Response(status=201)
+
+    async def download_link(request):
+        await asyncio.sleep(latency)
+        return web.json_response(
+            {'href': f'{base}/get?path={request.query["path"]}'})
+
+    stub = web.Application()
+    stub.router.add_get('/v1/disk/resources/upload', upload_link)
+    stub.router.add_put('/put', put)
+    stub.router.add_get('/v1/disk/resources/download', download_link)
+    runner = web.AppRunner(stub)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    base = f'http://127.0.0.1:{port}'
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return base
+
+
+def point_client_at(base: str) -> None:
+    api = f'{base}/v1/disk/resources'
+    yandexdisk.REQUEST_UPLOAD_URL = f'{api}/upload'
+    yandexdisk.DOWNLOAD_URL = f'{api}/download'
+
+
+def links_count() -> int:
+    with app.app_context():
+        return db.session.query(URLMap).count()
+
+
+def multipart_body(files: int) -> bytes:
+    parts = [
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; '
+        f'filename="file{index}.zip"\r\n'
+        'Content-Type: application/zip\r\n\r\n'.encode()
+        + os.urandom(FILE_SIZE) + b'\r\n'
+        for index in range(files)
+    ]
+    return b''.join(parts) + f'--{BOUNDARY}--\r\n'.encode()
+
+
+def run_wsgi(bodies: List[bytes], concurrency: int) -> float:
+    client = app.test_client()
+
+    def one(body):
+        response = client.post(
+            '/files', data=body,
+            content_type=f'multipart/form-data; boundary={BOUNDARY}')
+        assert response.status_code == 200, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, bodies))
+    return time.perf_counter() - started
+
+
+async def _asgi_post(body: bytes) -> int:
+    sent = False
+    status = {}
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            await asyncio.Event().wait()
+        sent = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status['code'] = message['status']
+
+    await application({
+        'type': 'http', 'http_version': '1.1', 'method': 'POST',
+        'scheme': 'http', 'path': '/files', 'root_path': '',
+        'query_string': b'', 'server': ('localhost', 80),
+        'headers': [
+            (b'host', b'localhost'),
+            (b'content-type',
+             f'multipart/form-data; boundary={BOUNDARY}'.encode()),
+            (b'content-length', str(len(body)).encode()),
+        ],
+    }, receive, send)
+    return status['code']
+
+
+async def _run_asgi(bodies: List[bytes], concurrency: int) -> float:
+    application.threads = concurrency
+    application.startup()
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(body):
+        async with limit:
+            code = await _asgi_post(body)
+            assert code == 200, code
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(body) for body in bodies))
+    elapsed = time.perf_counter() - started
+    await application.shutdown()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--files', type=int, default=2,
+                        help='Файлов в одном запросе.')
+    parser.add_argument('--disk-concurrency', type=int, default=64,
+                        help='Значение YA_CONCURRENCY на время замера.')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='Задержка заглушки Диска на вызов, секунды.')
+    args = parser.parse_args()
+
+    app.config.update(WTF_CSRF_ENABLED=False)
+    limit = yandexdisk.upload_limit
+    limit.initial_limit = limit.max_limit = args.disk_concurrency
+    limit.reset()
+    yandexdisk.upload_scheduler.max_queue = args.requests * args.files
+    with app.app_context():
+        db.create_all()
+    point_client_at(start_disk_stub(args.latency))
+    try:
+        for mode, run in (
+                ('wsgi', run_wsgi),
+                ('asgi', lambda *a: asyncio.run(_run_asgi(*a)))):
+            bodies = [multipart_body(args.files)
+                      for _ in range(args.requests)]
+            before = links_count()
+            elapsed = run(bodies, args.concurrency)
+            uploaded = links_count() - before
+            if uploaded != args.requests * args.files:
+                sys.exit(f'{mode}: загружено {uploaded} файлов из '
+                         f'{args.requests * args.files}')
+            print(f'{mode}: {args.requests} запросов за {elapsed:.2f} с, '
+                  f'{args.requests / elapsed:.1f} запросов/с, '
+                  f'{args.requests * args.files / elapsed:.1f} файлов/с')
+    finally:
+        os.unlink(_db.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""url_map
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 06:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'url_map',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('original', sa.String(length=2048), nullable=False),
+        sa.Column('short', sa.String(length=16), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    with op.batch_alter_table('url_map', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_url_map_short'), ['short'],
+                              unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('url_map', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_url_map_short'))
+    op.drop_table('url_map')
@@ -0,0 +1,107 @@
+"""url_map host, dedup and click columns; series tables
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 06:25:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('url_map', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('original_hash', sa.String(length=64),
+                                      nullable=True))
+        batch_op.add_column(sa.Column('host', sa.String(length=255),
+                                      nullable=True))
+        batch_op.add_column(sa.Column('host_rev', sa.String(length=255),
+                                      nullable=True))
+        batch_op.add_column(sa.Column('disabled', sa.Boolean(),
+                                      server_default=sa.false(),
+                                      nullable=False))
+        batch_op.add_column(sa.Column('is_custom', sa.Boolean(),
+                                      server_default=sa.false(),
+                                      nullable=False))
+        batch_op.add_column(sa.Column('clicks', sa.BigInteger(),
+                                      server_default='0', nullable=False))
+        batch_op.create_index('ix_url_map_original_hash', ['original_hash'],
+                              unique=False)
+        batch_op.create_index('ix_url_map_timestamp_id', ['timestamp', 'id'],
+                              unique=False)
+        batch_op.create_index('ix_url_map_host_timestamp_id',
+                              ['host', 'timestamp', 'id'], unique=False)
+        batch_op.create_index(
+            'ix_url_map_host_rev', ['host_rev'], unique=False,
+            postgresql_ops={'host_rev': 'varchar_pattern_ops'})
+    # Откуда взялись слаги старых ссылок, неизвестно: считаем их
+    # пользовательскими, чтобы DEDUP_AUTO_SLUGS их не переиспользовал.
+    # host и host_rev заполняет `flask backfill-hosts`.
+    op.execute(sa.text('UPDATE url_map SET is_custom = :custom')
+               .bindparams(custom=True))
+
+    op.create_table(
+        'slug_sequence',
+        sa.Column('name', sa.String(length=32), nullable=False),
+        sa.Column('next_value', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    op.create_table(
+        'click_rollup',
+        sa.Column('short', sa.String(length=16), nullable=False),
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('count', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('short', 'bucket'),
+    )
+    op.create_table(
+        'upload_job',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('files', sa.Text(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('available_at', sa.DateTime(), nullable=False),
+        sa.Column('lease_token', sa.String(length=32), nullable=True),
+        sa.Column('lease_until', sa.DateTime(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created', sa.DateTime(), nullable=False),
+        sa.Column('updated', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    with op.batch_alter_table('upload_job', schema=None) as batch_op:
+        batch_op.create_index('ix_upload_job_status_available',
+                              ['status', 'available_at'], unique=False)
+    op.create_table(
+        'disk_file',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('remote_path', sa.String(length=256), nullable=False),
+        sa.Column('short', sa.String(length=16), nullable=False),
+        sa.Column('created', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('sha256'),
+    )
+
+
+def downgrade():
+    op.drop_table('disk_file')
+    with op.batch_alter_table('upload_job', schema=None) as batch_op:
+        batch_op.drop_index('ix_upload_job_status_available')
+    op.drop_table('upload_job')
+    op.drop_table('click_rollup')
+    op.drop_table('slug_sequence')
+    with op.batch_alter_table('url_map', schema=None) as batch_op:
+        batch_op.drop_index('ix_url_map_host_rev',
+                            postgresql_ops={'host_rev': 'varchar_pattern_ops'})
+        batch_op.drop_index('ix_url_map_host_timestamp_id')
+        batch_op.drop_index('ix_url_map_timestamp_id')
+        batch_op.drop_index('ix_url_map_original_hash')
+        batch_op.drop_column('clicks')
+        batch_op.drop_column('is_custom')
+        batch_op.drop_column('disabled')
+        batch_op.drop_column('host_rev')
+        batch_op.drop_column('host')
+        batch_op.drop_column('original_hash')
@@ -0,0 +1,25 @@
+"""disk_file remote_path index
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 09:10:00
+
+"""
+from alembic import op
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('disk_file', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_disk_file_remote_path'),
+                              ['remote_path'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('disk_file', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_disk_file_remote_path'))
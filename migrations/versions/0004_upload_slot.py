@@ -0,0 +1,33 @@
+"""upload_slot
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 09:40:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'upload_slot',
+        sa.Column('remote_path', sa.String(length=256), nullable=False),
+        sa.Column('expires', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('remote_path'),
+    )
+    with op.batch_alter_table('upload_slot', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_upload_slot_expires'),
+                              ['expires'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('upload_slot', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_upload_slot_expires'))
+    op.drop_table('upload_slot')
@@ -5,4 +5,39 @@ class Config(object):
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URI')
     SECRET_KEY = os.getenv('SECRET_KEY')
     DISK_TOKEN = os.getenv('DISK_TOKEN')
-    SHORT_URL_LENGTH = os.getenv('SHORT_URL_LENGTH')
+    # Пул аккаунтов Диска `имя=токен,...`. Старые ссылки на файлы
+    # разрешаются первым аккаунтом, поэтому первым ставится DISK_TOKEN.
+    DISK_TOKENS = os.getenv('DISK_TOKENS')
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+    API_BATCH_LIMIT = int(os.getenv('API_BATCH_LIMIT', '1000'))
+    CLICK_FLUSH_INTERVAL = float(os.getenv('CLICK_FLUSH_INTERVAL', '10'))
+    CLICK_MAX_KEYS = int(os.getenv('CLICK_MAX_KEYS', '10000'))
+    DEDUP_AUTO_SLUGS = os.getenv('DEDUP_AUTO_SLUGS', '').lower() in (
+        '1', 'true', 'yes')
+    BLOOM_ERROR_RATE = float(os.getenv('BLOOM_ERROR_RATE', '0.01'))
+    BLOOM_REFRESH_INTERVAL = float(os.getenv('BLOOM_REFRESH_INTERVAL', '300'))
+    SHORT_URL_LENGTH = int(os.getenv('SHORT_URL_LENGTH', '6'))
+    SLUG_BLOCK_SIZE = int(os.getenv('SLUG_BLOCK_SIZE', '100'))
+    SLUG_SCRAMBLE_KEY = os.getenv('SLUG_SCRAMBLE_KEY', SECRET_KEY)
+    SLUG_CACHE_BACKEND = os.getenv('SLUG_CACHE_BACKEND', 'memory')
+    SLUG_CACHE_SIZE = int(os.getenv('SLUG_CACHE_SIZE', '10000'))
+    SLUG_CACHE_TTL = float(os.getenv('SLUG_CACHE_TTL', '300'))
+    SLUG_CACHE_MISS_TTL = float(os.getenv('SLUG_CACHE_MISS_TTL', '5'))
+    SLUG_CACHE_COOLDOWN = float(os.getenv('SLUG_CACHE_COOLDOWN', '5'))
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+    ASGI_THREADS = int(os.getenv('ASGI_THREADS', '32'))
+    # Каталог staging фоновых загрузок, общий для приложения и воркеров;
+    # по умолчанию instance/staging.
+    UPLOAD_STAGING_DIR = os.getenv('UPLOAD_STAGING_DIR')
+    UPLOAD_JOB_THREADS = int(os.getenv('UPLOAD_JOB_THREADS', '0'))
+    UPLOAD_JOB_LEASE = float(os.getenv('UPLOAD_JOB_LEASE', '900'))
+    UPLOAD_JOB_HEARTBEAT = float(os.getenv('UPLOAD_JOB_HEARTBEAT', '60'))
+    UPLOAD_JOB_ATTEMPTS = int(os.getenv('UPLOAD_JOB_ATTEMPTS', '5'))
+    UPLOAD_JOB_RETRY_DELAY = float(os.getenv('UPLOAD_JOB_RETRY_DELAY', '10'))
+    UPLOAD_JOB_RETRY_MAX_DELAY = float(
+        os.getenv('UPLOAD_JOB_RETRY_MAX_DELAY', '600'))
+    UPLOAD_JOB_POLL = float(os.getenv('UPLOAD_JOB_POLL', '1'))
+    UPLOAD_SLOT_TTL = int(os.getenv('UPLOAD_SLOT_TTL', '1800'))
+    # MAX_FILES файлов по MAX_ONE_FILE из forms.py и запас на разметку.
+    MAX_CONTENT_LENGTH = int(os.getenv(
+        'MAX_CONTENT_LENGTH', str(10 * 20 * 1024 * 1024 + 1024 * 1024)))
@@ -22,12 +22,18 @@ PY_URL = 'https://www.python.org'
 TEST_BASE_URL = 'http://localhost'
 
 pytest_plugins = [
-    'tests.yandex_disk_mock_server'
+    'tests.yandex_disk_mock_server',
+    'tests.redis_mock_server',
 ]
 
 try:
-    from yacut import app, db
-    from yacut.models import URLMap  # noqa
+    from yacut import app, db, slug_cache
+    from yacut.clicks import click_counter
+    from yacut.models import URLMap, slug_allocator, slug_filter  # noqa
+    from yacut.yandexdisk import (aiter_completed, disk_accounts,
+                                  disk_breaker, disk_client, download_links,
+                                  start_uploads, upload_limit,
+                                  upload_scheduler)
 except NameError as exc:
     raise AssertionError(
         'При попытке импорта объекта приложения вознакло исключение: '
@@ -41,6 +47,10 @@ except ImportError as exc:
         f'`{type(exc).__name__}: {exc}`'
     )
 
+# База тестов в памяти держит одно соединение на все потоки, поэтому
+# Bloom-фильтр здесь перестраивается в потоке запроса.
+slug_filter.background = False
+
 assert app.config['SQLALCHEMY_DATABASE_URI'] == _tmp_db_uri, (
     'Проверьте, что конфигурационному ключу `SQLALCHEMY_DATABASE_URI` '
     'присвоено значение с настройками для подключения базы данных с '
@@ -67,7 +77,18 @@ def _app():
     })
     with app.app_context():
         db.create_all()
+        slug_cache.clear()
+        slug_allocator.reset()
+        slug_filter.reset()
+        click_counter.reset()
+        upload_scheduler.reset()
+        upload_limit.reset()
+        disk_breaker.reset()
+        disk_accounts.reset()
+        download_links.reset()
         yield app
+        click_counter.reset()
+        disk_client.close()
         db.drop_all()
         db.session.close()
 
@@ -116,3 +137,9 @@ def generate_png_bytes():
     img.save(img_byte_arr, format='PNG')
     img_byte_arr.seek(0)
     return img_byte_arr.read()
+
+
+async def upload_files(files):
+    """Загружает файлы так же, как представления, и возвращает итоги."""
+    return sorted([result async for result
+                   in aiter_completed(start_uploads(files))])
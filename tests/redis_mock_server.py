@@ -0,0 +1,107 @@
+import fnmatch
+import socketserver
+import threading
+import time
+
+import pytest
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    """Обрабатывает подмножество команд Redis, нужное кэшу приложения."""
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        assert line.startswith(b'*'), 'Команда должна быть RESP-массивом.'
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2].decode())
+        return args
+
+    def _write(self, value):
+        if value is None:
+            self.wfile.write(b'$-1\r\n')
+        elif isinstance(value, int):
+            self.wfile.write(b':%d\r\n' % value)
+        elif isinstance(value, list):
+            self.wfile.write(b'*%d\r\n' % len(value))
+            for item in value:
+                self._write(item)
+        else:
+            data = value.encode()
+            self.wfile.write(b'$%d\r\n%s\r\n' % (len(data), data))
+
+    def handle(self):
+        server = self.server
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            command, *params = args
+            server.commands.append(command.upper())
+            handler = getattr(self, f'cmd_{command.lower()}', None)
+            if handler is None:
+                self.wfile.write(b'-ERR unknown command\r\n')
+                continue
+            with server.lock:
+                self._write(handler(server.store, *params))
+
+    @staticmethod
+    def _alive(store, key):
+        item = store.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del store[key]
+            return None
+        return value
+
+    def cmd_ping(self, store):
+        return 'PONG'
+
+    def cmd_get(self, store, key):
+        return self._alive(store, key)
+
+    def cmd_mget(self, store, *keys):
+        return [self._alive(store, key) for key in keys]
+
+    def cmd_set(self, store, key, value, *options):
+        expires_at = None
+        if options and options[0].upper() == 'PX':
+            expires_at = time.monotonic() + int(options[1]) / 1000
+        store[key] = (value, expires_at)
+        return 'OK'
+
+    def cmd_del(self, store, *keys):
+        return sum(store.pop(key, None) is not None for key in keys)
+
+    def cmd_scan(self, store, cursor, *options):
+        pattern = options[1] if options else '*'
+        return ['0', [k for k in store if fnmatch.fnmatch(k, pattern)]]
+
+
+class _RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _RespHandler)
+        self.store = {}
+        self.commands = []
+        self.lock = threading.Lock()
+
+
+@pytest.fixture
+def redis_server():
+    """Запускает заменитель Redis-сервера на свободном порту."""
+    server = _RespServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    server.url = f'redis://{host}:{port}/0'
+    yield server
+    server.shutdown()
+    server.server_close()
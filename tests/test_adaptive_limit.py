@@ -0,0 +1,86 @@
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from io import BytesIO
+
+from werkzeug.datastructures import FileStorage
+
+from tests.conftest import generate_png_bytes, upload_files
+from tests.yandex_disk_mock_server import intercept_requests
+from yacut import yandexdisk
+from yacut.scheduler import AimdLimit, UploadScheduler
+from yacut.yandexdisk import DiskClient
+
+
+class _Response:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+def test_aimd_decreases_once_per_cooldown_and_grows_additively():
+    scheduler = UploadScheduler(concurrency=8, max_queue=10)
+    limit = AimdLimit(scheduler, min_limit=1, max_limit=16)
+    started = time.monotonic()
+    limit.on_throttle(started)
+    limit.on_throttle(started)
+    assert scheduler.concurrency == 4, (
+        'Отказы вызовов, начатых до уменьшения лимита, не должны '
+        'снижать его повторно.'
+    )
+    for _ in range(5):
+        limit.on_success(0.01)
+    assert scheduler.concurrency == 5, (
+        'Лимит должен расти примерно на единицу за окно из limit '
+        'успешных вызовов.'
+    )
+    limit.on_success(0.05)
+    assert limit.limit < 5.2, (
+        'При задержке сильно выше базовой лимит не должен расти.'
+    )
+
+
+def test_retry_after_pauses_calls():
+    scheduler = UploadScheduler(concurrency=4, max_queue=10)
+    limit = AimdLimit(scheduler, min_limit=1, max_limit=16)
+    limit.on_throttle(time.monotonic(), retry_after=5)
+    assert 4 < limit.delay() <= 5
+    http_date = format_datetime(
+        datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < yandexdisk._retry_after(
+        _Response({'Retry-After': http_date})) <= 30
+    assert yandexdisk._retry_after(_Response({'Retry-After': '2'})) == 2
+
+
+async def _upload(count):
+    return await upload_files([
+        FileStorage(stream=BytesIO(generate_png_bytes()),
+                    filename=f'{index}.png')
+        for index in range(count)])
+
+
+async def test_limit_adapts_to_throttling_server(throttled_mock_server,
+                                                 monkeypatch):
+    server, throttle = await throttled_mock_server
+    await intercept_requests(server, monkeypatch)
+    scheduler = UploadScheduler(concurrency=8, max_queue=100)
+    limit = AimdLimit(scheduler, min_limit=1, max_limit=16)
+    client = DiskClient()
+    monkeypatch.setattr(yandexdisk, 'upload_scheduler', scheduler)
+    monkeypatch.setattr(yandexdisk, 'upload_limit', limit)
+    monkeypatch.setattr(yandexdisk, 'disk_client', client)
+    # Повторы добавили бы свои ответы 429; здесь проверяется только лимит.
+    monkeypatch.setattr(yandexdisk, 'RETRY_ATTEMPTS', 1)
+    try:
+        await _upload(16)
+        first = throttle.throttled
+        assert first and scheduler.concurrency < 8, (
+            'Ответы 429 от API Диска должны снижать лимит параллельности.'
+        )
+        assert limit.stats()['throttled'] == first
+        throttle.throttled = 0
+        await _upload(16)
+    finally:
+        client.close()
+    assert throttle.throttled < first, (
+        'После адаптации лимита API Диска должен отвечать 429 реже.'
+    )
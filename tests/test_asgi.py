@@ -0,0 +1,110 @@
+import asyncio
+from http import HTTPStatus
+
+from tests.conftest import TEST_BASE_URL, generate_png_bytes
+from tests.yandex_disk_mock_server import intercept_requests
+from yacut import views, yandexdisk
+from yacut.asgi import AsgiApp
+
+BOUNDARY = 'yacut-test-boundary'
+
+
+async def _request(application, method, path, body=b'', headers=()):
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    response = {'body': b''}
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = dict(message['headers'])
+        else:
+            response['body'] += message.get('body', b'')
+
+    await application({
+        'type': 'http', 'http_version': '1.1', 'method': method,
+        'scheme': 'http', 'path': path, 'root_path': '', 'query_string': b'',
+        'headers': [(b'host', b'localhost')] + list(headers),
+        'server': ('localhost', 80),
+    }, receive, send)
+    return response
+
+
+def _multipart(files):
+    parts = []
+    for name, data in files:
+        parts.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; '
+            f'name="files"; filename="{name}"\r\n'
+            'Content-Type: image/png\r\n\r\n'.encode() + data + b'\r\n')
+    return b''.join(parts) + f'--{BOUNDARY}--\r\n'.encode()
+
+
+def test_asgi_lifespan_and_sync_route(_app, short_python_url):
+    application = AsgiApp(_app, threads=2)
+    sent = []
+
+    async def serve():
+        queue = asyncio.Queue()
+
+        async def send(message):
+            sent.append(message['type'])
+
+        lifespan = asyncio.create_task(
+            application({'type': 'lifespan'}, queue.get, send))
+        await queue.put({'type': 'lifespan.startup'})
+        response = await _request(application, 'GET', '/py')
+        await queue.put({'type': 'lifespan.shutdown'})
+        await lifespan
+        return response
+
+    response = asyncio.run(serve())
+    assert response['status'] == HTTPStatus.FOUND, (
+        'Синхронные маршруты должны работать и в ASGI-режиме.'
+    )
+    assert response['headers'][b'location'] == b'https://www.python.org'
+    assert sent == ['lifespan.startup.complete',
+                    'lifespan.shutdown.complete']
+
+
+async def test_asgi_async_view_stays_off_server_loop(_app, mock_server,
+                                                     monkeypatch):
+    server, _ = await mock_server
+    await intercept_requests(server, monkeypatch)
+    view_loops, disk_loops = [], []
+    completed = views.aiter_completed
+    upload_one = yandexdisk._upload_one
+
+    async def recording_completed(pending):
+        view_loops.append(asyncio.get_running_loop())
+        async for result in completed(pending):
+            yield result
+
+    async def recording_upload_one(*args, **kwargs):
+        disk_loops.append(asyncio.get_running_loop())
+        return await upload_one(*args, **kwargs)
+
+    monkeypatch.setattr(views, 'aiter_completed', recording_completed)
+    monkeypatch.setattr(yandexdisk, '_upload_one', recording_upload_one)
+    application = AsgiApp(_app, threads=2)
+    body = _multipart([('a.png', generate_png_bytes()),
+                       ('b.png', generate_png_bytes())])
+    headers = [(b'content-type',
+                f'multipart/form-data; boundary={BOUNDARY}'.encode()),
+               (b'content-length', str(len(body)).encode())]
+    responses = await asyncio.gather(*(
+        _request(application, 'POST', '/files', body, headers)
+        for _ in range(2)))
+    await application.shutdown()
+    server_loop = asyncio.get_running_loop()
+    assert all(r['status'] == HTTPStatus.OK for r in responses)
+    assert TEST_BASE_URL.encode() in responses[0]['body']
+    assert len(view_loops) == 2 and server_loop not in view_loops, (
+        'В ASGI-режиме async-представления с блокирующей работой не должны '
+        'выполняться на цикле событий сервера.'
+    )
+    assert disk_loops and set(disk_loops) == {server_loop}, (
+        'Загрузки на Диск должны выполняться на цикле событий сервера.'
+    )
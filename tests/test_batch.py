@@ -0,0 +1,64 @@
+from http import HTTPStatus
+
+from tests.conftest import PY_URL, TEST_BASE_URL
+from yacut import app
+from yacut.models import URLMap, slug_allocator
+
+BATCH_URL = '/api/id/batch/'
+DUPLICATE_MSG = 'Предложенный вариант короткой ссылки уже существует.'
+
+
+def test_batch_results_in_input_order(client, short_python_url):
+    response = client.post(BATCH_URL, json=[
+        {'url': PY_URL},
+        {'url': PY_URL, 'custom_id': 'docs'},
+        {'url': PY_URL, 'custom_id': 'h@k$r'},
+        {'url': PY_URL, 'custom_id': 'docs'},
+        {'url': PY_URL, 'custom_id': 'py'},
+        {'custom_id': 'nourl'},
+        {'url': 'ftp://example.com'},
+    ])
+    assert response.status_code == HTTPStatus.OK
+    data = response.json
+    assert len(data) == 7, (
+        'Пакетный эндпоинт должен возвращать результат для каждого элемента.'
+    )
+    assert data[0]['url'] == PY_URL
+    assert data[0]['short_link'].startswith(TEST_BASE_URL)
+    assert data[1] == {'url': PY_URL, 'short_link': f'{TEST_BASE_URL}/docs'}
+    assert data[2] == {
+        'message': 'Указано недопустимое имя для короткой ссылки'}
+    assert data[3] == {'message': DUPLICATE_MSG}, (
+        'Повторяющийся в пакете алиас должен отклоняться.'
+    )
+    assert data[4] == {'message': DUPLICATE_MSG}, (
+        'Алиас, уже существующий в базе, должен отклоняться.'
+    )
+    assert data[5] == {'message': '"url" является обязательным полем!'}
+    assert data[6] == {'message': 'Введите корректный URL: http(s)://...'}
+    assert URLMap.query.count() == 3
+
+
+def test_batch_conflict_fallback(_app, monkeypatch):
+    monkeypatch.setattr(slug_allocator, '_reserve', lambda count: 0)
+    URLMap.create_one(PY_URL, slug_allocator.encode(0))
+    slug_allocator.reset()
+    results = URLMap.create_many([(PY_URL, None), (PY_URL, 'other')])
+    assert results[0][1] != slug_allocator.encode(0), (
+        'Совпадение сгенерированного слага с алиасом не должно ломать '
+        'всю пачку.'
+    )
+    assert results[1] == (PY_URL, 'other')
+    assert URLMap.query.count() == 3
+
+
+def test_batch_limit(client, monkeypatch):
+    monkeypatch.setitem(app.config, 'API_BATCH_LIMIT', 2)
+    response = client.post(BATCH_URL, json=[{'url': PY_URL}] * 3)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_batch_requires_array(client):
+    response = client.post(BATCH_URL, json={'url': PY_URL})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json == {'message': 'Ожидается массив объектов'}
@@ -0,0 +1,119 @@
+import threading
+from http import HTTPStatus
+
+from sqlalchemy import event
+
+from tests.conftest import PY_URL
+from yacut import db
+from yacut.bloom import BloomFilter, SlugFilter
+from yacut.models import URLMap
+
+AVAILABLE_URL = '/api/id/{short_id}/available/'
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    items = [f'slug{i}' for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items), (
+        'Bloom-фильтр не должен давать ложноотрицательных ответов.'
+    )
+    false_positives = sum(f'other{i}' in bloom for i in range(10000))
+    assert false_positives < 300, (
+        'Доля ложноположительных ответов должна соответствовать настройке.'
+    )
+
+
+def test_concurrent_adds_keep_every_item():
+    bloom = BloomFilter(capacity=40000, error_rate=0.01)
+
+    def add(start):
+        for i in range(start, start + 10000):
+            bloom.add(f'slug{i}')
+
+    threads = [threading.Thread(target=add, args=(n * 10000,))
+               for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert bloom.count == 40000
+    assert all(f'slug{i}' in bloom for i in range(40000)), (
+        'Параллельные вставки не должны терять биты фильтра.'
+    )
+
+
+def test_stale_filter_is_rebuilt_in_background():
+    released = threading.Event()
+    loads = []
+
+    def load():
+        loads.append(1)
+        if len(loads) > 1:
+            released.wait(5)
+        return 1, iter(['old'])
+
+    slugs = SlugFilter(load, refresh_interval=60)
+    slugs.might_contain('old')
+    slugs._thread.join(5)
+    assert 'old' in slugs._bloom
+    slugs._built_at -= 120
+    assert slugs.might_contain('free') is False, (
+        'Пока фильтр перестраивается, запросы должны обслуживаться '
+        'прежним фильтром, а не ждать перестройки.'
+    )
+    slugs.add('inserted')
+    released.set()
+    slugs._thread.join(5)
+    assert len(loads) == 2
+    assert slugs.might_contain('inserted'), (
+        'Вставки, сделанные во время перестройки, должны попасть в новый '
+        'фильтр.'
+    )
+
+
+def test_definite_negative_skips_query(_app, short_python_url):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    short = short_python_url.short
+    URLMap.is_taken('warmup')
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        taken = URLMap.is_taken(short)
+        statements_for_taken = len(statements)
+        URLMap.validate_custom('freeslug', check_unique=True)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert taken and statements_for_taken == 1
+    assert len(statements) == 1, (
+        'Если Bloom-фильтр уверен, что слаг свободен, запрос к базе '
+        'выполняться не должен.'
+    )
+
+
+def test_available_endpoint(client, short_python_url):
+    response = client.get(AVAILABLE_URL.format(short_id='free'))
+    assert response.status_code == HTTPStatus.OK
+    assert response.json == {'available': True}
+    response = client.get(AVAILABLE_URL.format(short_id='py'))
+    assert response.json == {'available': False}, (
+        'Занятый слаг должен отмечаться как недоступный.'
+    )
+    response = client.get(AVAILABLE_URL.format(short_id='files'))
+    assert response.json == {'available': False}
+    response = client.get(AVAILABLE_URL.format(short_id='h@k$r'))
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_filter_updated_on_insert(client):
+    assert client.get(AVAILABLE_URL.format(short_id='new')).json == {
+        'available': True}
+    URLMap.create_one(PY_URL, 'new')
+    assert client.get(AVAILABLE_URL.format(short_id='new')).json == {
+        'available': False}, (
+        'Вставленный слаг должен сразу попадать в Bloom-фильтр.'
+    )
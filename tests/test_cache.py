@@ -0,0 +1,126 @@
+from http import HTTPStatus
+
+from tests.conftest import PY_URL
+from yacut import db, models, slug_cache
+from yacut.cache import RedisCache, TTLCache
+from yacut.models import URLMap
+
+
+def test_lru_eviction_and_counters():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None, (
+        'При переполнении кэша должна вытесняться давно не использованная '
+        'запись.'
+    )
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (3, 1, 1), (
+        'Проверьте подсчёт попаданий, промахов и вытеснений в кэше.'
+    )
+
+
+def test_ttl_expiration():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set('a', 1, ttl=0)
+    assert cache.get('a') is None, (
+        'Запись с истёкшим TTL не должна возвращаться из кэша.'
+    )
+    assert cache.stats()['expirations'] == 1
+
+
+def test_redirect_served_from_cache(client, short_python_url):
+    short = short_python_url.short
+    client.get(f'/{short}')
+    URLMap.query.filter_by(short=short).delete(synchronize_session=False)
+    db.session.commit()
+    response = client.get(f'/{short}')
+    assert response.status_code == HTTPStatus.FOUND, (
+        'Повторный переход по короткой ссылке должен обслуживаться из кэша.'
+    )
+    assert slug_cache.stats()['hits'] == 1
+
+
+def test_cached_miss_invalidated_on_create(client):
+    response = client.get('/api/id/py/')
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert slug_cache.get('py') == '', (
+        'Отсутствующая короткая ссылка должна кэшироваться как промах.'
+    )
+    URLMap.create_one(PY_URL, 'py')
+    response = client.get('/api/id/py/')
+    assert response.status_code == HTTPStatus.OK, (
+        'После создания ссылки закэшированный промах должен сбрасываться.'
+    )
+    assert response.json == {'url': PY_URL}
+
+
+def test_update_invalidates_cache(client, short_python_url):
+    client.get(f'/{short_python_url.short}')
+    short_python_url.original = 'https://docs.python.org'
+    db.session.commit()
+    response = client.get(f'/{short_python_url.short}')
+    assert response.location == 'https://docs.python.org', (
+        'Изменение записи `URLMap` должно сбрасывать её запись в кэше.'
+    )
+
+
+def test_redis_cache_shared_between_workers(redis_server):
+    first = RedisCache(redis_server.url, ttl=60)
+    second = RedisCache(redis_server.url, ttl=60)
+    first.set('py', PY_URL)
+    assert second.get('py') == PY_URL, (
+        'Значение, записанное одним воркером в сетевой кэш, должно быть '
+        'видно другому воркеру.'
+    )
+    assert second.get_many(['py', 'nope']) == [PY_URL, None]
+    first.delete('py')
+    assert second.get('py') is None
+
+
+def test_redis_cache_unavailable_is_a_miss():
+    cache = RedisCache('redis://127.0.0.1:1/0', ttl=60)
+    assert cache.get('py') is None, (
+        'Недоступный сетевой кэш должен считаться промахом, а не ошибкой.'
+    )
+    assert cache.stats()['errors'] == 1
+
+
+def test_redis_cache_pauses_after_connection_failure(redis_server,
+                                                     monkeypatch):
+    cache = RedisCache(redis_server.url, ttl=60, cooldown=60)
+    monkeypatch.setattr(cache, 'port', 1)
+    cache.set('py', PY_URL)
+    assert cache.get('py') is None and cache.get_many(['py']) == [None]
+    assert cache.stats()['errors'] == 1, (
+        'После сбоя соединения кэш должен на время перестать обращаться '
+        'к Redis, а не ждать таймаут на каждом запросе.'
+    )
+    assert cache.stats()['skipped'] == 2
+    monkeypatch.setattr(cache, 'port', redis_server.server_address[1])
+    monkeypatch.setattr(cache.breaker, 'reset_timeout', 0)
+    cache.set('py', PY_URL)
+    assert cache.get('py') == PY_URL, (
+        'По истечении паузы кэш должен снова пробовать подключиться.'
+    )
+
+
+def test_redirect_reads_through_shared_cache(client, short_python_url,
+                                             redis_server, monkeypatch):
+    monkeypatch.setattr(models, 'slug_cache',
+                        RedisCache(redis_server.url, ttl=60))
+    short = short_python_url.short
+    client.get(f'/{short}')
+    URLMap.query.filter_by(short=short).delete(synchronize_session=False)
+    db.session.commit()
+    response = client.get(f'/{short}')
+    assert response.location == PY_URL, (
+        'Переход по короткой ссылке должен читать сетевой кэш.'
+    )
+    response = client.post('/api/id/', json={'url': PY_URL, 'custom_id': 'x'})
+    assert redis_server.store['yacut:x'][0] == PY_URL, (
+        'Создание короткой ссылки должно записывать её в сетевой кэш.'
+    )
@@ -0,0 +1,63 @@
+import json
+
+from tests.conftest import PY_URL
+from yacut.models import URLMap
+
+CSV_DATA = (
+    'url,slug\n'
+    f'{PY_URL},py\n'
+    'https://docs.python.org,\n'
+    'ftp://example.com,bad\n'
+    f'{PY_URL},py\n'
+    'https://peps.python.org,h@k$r\n'
+)
+
+
+def test_import_csv(_app, cli_runner, tmp_path):
+    source = tmp_path / 'links.csv'
+    source.write_text(CSV_DATA, encoding='utf-8')
+    errors = tmp_path / 'errors.ndjson'
+    result = cli_runner.invoke(args=[
+        'import-links', str(source), '--chunk-size', '2',
+        '--errors', str(errors),
+    ])
+    assert result.exit_code == 0, result.output
+    assert URLMap.query.count() == 2, (
+        'Импорт должен добавлять только корректные записи.'
+    )
+    assert URLMap.query.filter_by(short='py').first().original == PY_URL
+    rejected = [json.loads(line) for line in errors.read_text().splitlines()]
+    assert [item['line'] for item in rejected] == [3, 4, 5], (
+        'Отклонённые записи должны сопровождаться номером строки.'
+    )
+    assert 'offset=5' in result.output
+
+
+def test_import_ndjson_stdin_with_skip(_app, cli_runner):
+    lines = [
+        json.dumps({'url': PY_URL, 'slug': 'one'}),
+        'not json',
+        json.dumps({'url': PY_URL, 'custom_id': 'two'}),
+        json.dumps({'url': PY_URL}),
+    ]
+    result = cli_runner.invoke(
+        args=['import-links', '-', '--format', 'ndjson', '--skip', '1'],
+        input='\n'.join(lines) + '\n',
+    )
+    assert result.exit_code == 0, result.output
+    assert URLMap.query.filter_by(short='one').first() is None, (
+        'Параметр `--skip` должен пропускать уже загруженные записи.'
+    )
+    assert URLMap.query.filter_by(short='two').first() is not None
+    assert URLMap.query.count() == 2
+    assert 'отклонено 1' in result.output
+
+
+def test_import_with_process_pool(_app, cli_runner, tmp_path):
+    source = tmp_path / 'links.csv'
+    source.write_text('url\n' + f'{PY_URL}\n' * 7, encoding='utf-8')
+    result = cli_runner.invoke(args=[
+        'import-links', str(source), '--chunk-size', '2', '--workers', '2',
+    ])
+    assert result.exit_code == 0, result.output
+    assert URLMap.query.count() == 7
@@ -0,0 +1,68 @@
+import threading
+
+from yacut import db
+from yacut.clicks import ClickCounter, click_counter
+from yacut.models import URLMap
+
+CLICKS_URL = '/api/id/{short_id}/clicks/'
+
+
+def test_redirects_counted_and_flushed(client, short_python_url):
+    for _ in range(3):
+        client.get('/py')
+    assert URLMap.query.filter_by(short='py').first().clicks == 0, (
+        'Переход по ссылке не должен сразу писать в базу.'
+    )
+    response = client.get(CLICKS_URL.format(short_id='py'))
+    assert response.json == {'clicks': 3}, (
+        'API счётчиков должно учитывать ещё не сохранённые переходы.'
+    )
+    click_counter.flush()
+    db.session.expire_all()
+    assert URLMap.query.filter_by(short='py').first().clicks == 3, (
+        'При сбросе накопленные переходы должны сохраняться в базу.'
+    )
+    client.get('/py')
+    assert client.get(CLICKS_URL.format(short_id='py')).json == {'clicks': 4}
+
+
+def test_clicks_for_unknown_short_id(client):
+    response = client.get(CLICKS_URL.format(short_id='nope'))
+    assert response.status_code == 404
+
+
+def test_counter_memory_is_bounded():
+    flushed = []
+    counter = ClickCounter(flushed.append, interval=0, max_keys=2)
+    counter.record('a')
+    counter.record('b')
+    assert flushed == [{'a': 1, 'b': 1}], (
+        'При заполнении буфера счётчики должны сбрасываться досрочно.'
+    )
+
+
+def test_failed_flush_keeps_deltas():
+    def broken(deltas):
+        raise RuntimeError('база недоступна')
+
+    counter = ClickCounter(broken, interval=0, max_keys=100)
+    counter.record('a')
+    counter.flush()
+    assert counter.pending('a') == 1, (
+        'При ошибке записи накопленные переходы не должны теряться.'
+    )
+
+
+def test_background_flush():
+    done = threading.Event()
+    flushed = []
+
+    def flush(deltas):
+        flushed.append(deltas)
+        done.set()
+
+    counter = ClickCounter(flush, interval=0.01, max_keys=100)
+    counter.record('a')
+    counter.record('a')
+    assert done.wait(2), 'Фоновый поток должен периодически сбрасывать счётчики.'
+    assert flushed[0] == {'a': 2}
@@ -0,0 +1,75 @@
+from http import HTTPStatus
+
+import pytest
+
+from tests.conftest import PY_URL
+from yacut import app
+from yacut.models import URLMap, hash_url
+
+
+@pytest.fixture
+def dedup(monkeypatch):
+    monkeypatch.setitem(app.config, 'DEDUP_AUTO_SLUGS', True)
+
+
+def test_original_hash_filled(_app, short_python_url):
+    assert short_python_url.original_hash == hash_url(PY_URL), (
+        'При сохранении `URLMap` должен заполняться хеш `original`.'
+    )
+
+
+def test_dedup_reuses_generated_slug(client, dedup):
+    first = client.post('/api/id/', json={'url': PY_URL}).json
+    other = client.post('/api/id/', json={'url': f'{PY_URL}/about'}).json
+    assert first['short_link'] != other['short_link']
+    again = client.post('/api/id/', json={'url': 'www.python.org'}).json
+    assert again == first, (
+        'В режиме дедупликации повторный нормализованный URL должен получать '
+        'уже существующую сгенерированную короткую ссылку.'
+    )
+    assert URLMap.query.count() == 2
+
+
+def test_dedup_ignores_custom_aliases(client, dedup):
+    client.post('/api/id/', json={'url': PY_URL, 'custom_id': 'py'})
+    generated = client.post('/api/id/', json={'url': PY_URL})
+    assert generated.status_code == HTTPStatus.CREATED
+    assert not generated.json['short_link'].endswith('/py'), (
+        'Пользовательский алиас не должен переиспользоваться как '
+        'сгенерированная ссылка.'
+    )
+    again = client.post('/api/id/', json={'url': PY_URL, 'custom_id': 'py2'})
+    assert again.json['short_link'].endswith('/py2')
+
+
+def test_dedup_in_batch(client, dedup):
+    existing = URLMap.create_one(PY_URL)
+    response = client.post('/api/id/batch/', json=[
+        {'url': PY_URL},
+        {'url': 'https://docs.python.org'},
+        {'url': 'https://docs.python.org'},
+    ])
+    links = [item['short_link'] for item in response.json]
+    assert links[0].endswith('/' + existing.short)
+    assert links[1] == links[2], (
+        'Повторы одного URL внутри пачки должны получать одну ссылку.'
+    )
+    assert URLMap.query.count() == 2
+
+
+def test_without_dedup_creates_new_rows(client):
+    client.post('/api/id/', json={'url': PY_URL})
+    client.post('/api/id/', json={'url': PY_URL})
+    assert URLMap.query.count() == 2
+
+
+def test_dedup_skips_disabled_links(client, dedup):
+    existing = URLMap.create_one(PY_URL)
+    URLMap.disable_matching('www.python.org')
+    response = client.post('/api/id/', json={'url': PY_URL})
+    assert response.status_code == HTTPStatus.CREATED
+    assert not response.json['short_link'].endswith('/' + existing.short), (
+        'Отключённая ссылка не должна выдаваться повторно.'
+    )
+    batch = client.post('/api/id/batch/', json=[{'url': PY_URL}]).json
+    assert batch[0]['short_link'] == response.json['short_link']
@@ -0,0 +1,160 @@
+import asyncio
+from datetime import datetime, timedelta
+from http import HTTPStatus
+
+import aiohttp
+
+from tests.conftest import generate_png_bytes
+from tests.yandex_disk_mock_server import intercept_requests
+from yacut import api_views, db, streaming
+from yacut.models import UploadSlot, URLMap
+
+SLOTS_URL = '/api/files/slots/'
+FINALIZE_URL = '/api/files/finalize/'
+
+
+def test_upload_page_includes_direct_upload_script(client):
+    page = client.get('/files').get_data(as_text=True)
+    assert 'js/direct_upload.js' in page
+    assert f'data-slots-url="{SLOTS_URL}"' in page
+
+
+def test_slots_validate_files_before_calling_disk(client):
+    for files, status in (
+            ([], HTTPStatus.BAD_REQUEST),
+            ([{'name': 'a.png'}], HTTPStatus.BAD_REQUEST),
+            ([{'name': 'a.exe', 'size': 1}], HTTPStatus.BAD_REQUEST),
+            ([{'name': 'a.png', 'size': 1}] * 11, HTTPStatus.BAD_REQUEST),
+            ([{'name': 'a.png', 'size': 21 * 1024 * 1024}],
+             HTTPStatus.REQUEST_ENTITY_TOO_LARGE)):
+        response = client.post(SLOTS_URL, json={'files': files})
+        assert response.status_code == status, (
+            'Запрос слотов должен проверять число, формат и размер файлов '
+            'до обращения к API Диска.'
+        )
+
+
+def test_finalize_rejects_forged_token(client):
+    response = client.post(FINALIZE_URL, json={'tokens': ['forged']})
+    assert response.status_code == HTTPStatus.CREATED
+    assert response.get_json()['items'] == [
+        {'error': 'Недействительный или просроченный токен'}]
+    assert URLMap.query.count() == 0
+
+
+async def test_browser_uploads_directly_to_disk(client, mock_server,
+                                                monkeypatch):
+    server, user_calls = await mock_server
+    await intercept_requests(server, monkeypatch)
+    loop = asyncio.get_running_loop()
+
+    def request_slots():
+        return client.post(SLOTS_URL, json={'files': [
+            {'name': 'first.png', 'size': 100},
+            {'name': 'second.png', 'size': 100},
+            {'name': 'skipped.png', 'size': 100},
+        ]})
+
+    response = await loop.run_in_executor(None, request_slots)
+    assert response.status_code == HTTPStatus.OK
+    slots = response.get_json()['items']
+    assert all(slot['method'] == 'PUT' and slot['token'] for slot in slots)
+    assert 'upload' not in user_calls, (
+        'Выдача слотов не должна загружать файлы через приложение.'
+    )
+
+    async with aiohttp.ClientSession() as browser:
+        for slot in slots[:2]:
+            # Разное содержимое: одинаковые файлы получили бы одну ссылку.
+            data = generate_png_bytes() + slot['name'].encode()
+            async with browser.put(slot['href'], data=data,
+                                   headers={'Origin': 'http://localhost'}
+                                   ) as put:
+                assert put.status == HTTPStatus.CREATED
+                assert put.headers['Access-Control-Allow-Origin'] == '*'
+
+    def finalize():
+        return client.post(FINALIZE_URL, json={
+            'tokens': [slot['token'] for slot in slots]})
+
+    response = await loop.run_in_executor(None, finalize)
+    assert response.status_code == HTTPStatus.CREATED
+    items = response.get_json()['items']
+    assert [item['name'] for item in items] == [
+        'first.png', 'second.png', 'skipped.png']
+    assert all(item['short_link'].startswith('http://localhost/')
+               for item in items[:2])
+    assert items[2]['error'] == 'Файл не загружен на Диск', (
+        'Файл, который браузер не загрузил, не должен получать ссылку.'
+    )
+    assert URLMap.query.count() == 2
+
+
+async def _put(slot, data):
+    async with aiohttp.ClientSession() as browser:
+        async with browser.put(slot['href'], data=data) as put:
+            assert put.status == HTTPStatus.CREATED
+
+
+async def test_finalize_rejects_file_larger_than_declared(
+        client, mock_server, monkeypatch):
+    server, user_calls = await mock_server
+    await intercept_requests(server, monkeypatch)
+    monkeypatch.setattr(api_views, 'MAX_ONE_FILE', 100)
+    monkeypatch.setattr(streaming, 'MAX_ONE_FILE', 100)
+    loop = asyncio.get_running_loop()
+
+    def request_slot():
+        return client.post(SLOTS_URL, json={'files': [
+            {'name': 'big.png', 'size': 10}]}).get_json()['items'][0]
+
+    slot = await loop.run_in_executor(None, request_slot)
+    await _put(slot, b'x' * 101)
+
+    def finalize():
+        return client.post(FINALIZE_URL, json={
+            'tokens': [slot['token']]}).get_json()['items'][0]
+
+    item = await loop.run_in_executor(None, finalize)
+    assert item == {'name': 'big.png', 'error': 'Файл «big.png» больше 0 МБ'}, (
+        'Размер файла должен проверяться по данным Диска, а не по '
+        'заявленному клиентом.'
+    )
+    assert 'delete' in user_calls, 'Слишком большой файл удаляется с Диска.'
+    assert URLMap.query.count() == 0
+    assert UploadSlot.query.count() == 0
+
+
+async def test_expired_slots_are_purged(client, mock_server, monkeypatch,
+                                        cli_runner):
+    server, user_calls = await mock_server
+    await intercept_requests(server, monkeypatch)
+    loop = asyncio.get_running_loop()
+
+    def request_slots():
+        return client.post(SLOTS_URL, json={'files': [
+            {'name': 'kept.png', 'size': 100},
+            {'name': 'abandoned.png', 'size': 100}]}).get_json()['items']
+
+    kept, abandoned = await loop.run_in_executor(None, request_slots)
+    await _put(kept, generate_png_bytes())
+    await _put(abandoned, generate_png_bytes() + b'abandoned')
+    finalized = await loop.run_in_executor(None, lambda: client.post(
+        FINALIZE_URL, json={'tokens': [kept['token']]}).get_json())
+    assert UploadSlot.query.count() == 1
+    db.session.execute(db.update(UploadSlot).values(
+        expires=datetime.utcnow() - timedelta(seconds=1)))
+    db.session.commit()
+    result = await loop.run_in_executor(
+        None, cli_runner.invoke, None, ['purge-upload-slots'])
+    assert result.exit_code == 0, result.output
+    assert 'Удалено незавершённых загрузок: 1.' in result.output, (
+        'Файл слота, который так и не завершили, должен удаляться с Диска.'
+    )
+    assert 'delete' in user_calls
+    assert UploadSlot.query.count() == 0
+    response = await loop.run_in_executor(
+        None, client.get, finalized['items'][0]['short_link'])
+    assert response.status_code == HTTPStatus.FOUND, (
+        'Файл завершённого слота удаляться не должен.'
+    )
@@ -0,0 +1,168 @@
+import asyncio
+from http import HTTPStatus
+from io import BytesIO
+
+import pytest
+
+from tests.yandex_disk_mock_server import MULTI_TOKENS, intercept_requests
+from yacut import app, yandexdisk
+from yacut.accounts import AccountPool, make_account_pool, parse_tokens
+from yacut.models import URLMap
+from yacut.resilience import CircuitOpen
+
+
+def _pool(**kwargs):
+    return AccountPool([('first', MULTI_TOKENS[0]),
+                        ('second', MULTI_TOKENS[1])], **kwargs)
+
+
+def _upload(client, count, prefix='файл'):
+    client.post('/files', data={'files': [
+        (BytesIO(f'{prefix} {index}'.encode()), f'{index}.txt')
+        for index in range(count)]})
+
+
+def test_parse_tokens():
+    assert parse_tokens('main=a, b\nbackup=c') == [
+        ('main', 'a'), ('disk2', 'b'), ('backup', 'c')]
+    assert parse_tokens('') == []
+    for value in ('a=x,a=y', 'b@d=x', 'empty='):
+        with pytest.raises(ValueError):
+            parse_tokens(value)
+
+
+def test_pool_is_built_from_app_config():
+    pool = make_account_pool({'DISK_TOKEN': 'single',
+                              'DISK_TOKENS': 'main=a,backup=b'})
+    assert [account.name for account in pool.accounts] == ['main', 'backup'], (
+        'Пул аккаунтов должен строиться из DISK_TOKENS конфигурации.'
+    )
+    pool = make_account_pool({'DISK_TOKEN': 'single', 'DISK_TOKENS': None})
+    assert [account.headers for account in pool.accounts] == [
+        {'Authorization': 'OAuth single'}]
+    assert len(make_account_pool({})) == 0
+    assert yandexdisk.disk_accounts.accounts[0].headers == {
+        'Authorization': f'OAuth {app.config["DISK_TOKEN"]}'}
+
+
+def test_location_records_account():
+    pool = _pool()
+    first, second = pool.accounts
+    assert pool.location(first, 'app:/a.png') == 'app:/a.png', (
+        'Путь файла первого аккаунта должен остаться прежним, чтобы '
+        'работали старые ссылки.'
+    )
+    assert pool.location(second, 'app:/a.png') == 'second@app:/a.png'
+    assert pool.locate('second@app:/a.png') == (second, 'app:/a.png')
+    assert pool.locate('app:/a.png') == (first, 'app:/a.png')
+    with pytest.raises(RuntimeError):
+        pool.locate('removed@app:/a.png')
+
+
+def test_pool_prefers_least_loaded_healthy_account():
+    pool = _pool(min_free_space=100, threshold=1)
+    first, second = pool.accounts
+    assert pool.acquire() is first
+    assert pool.acquire() is second, (
+        'Новая загрузка должна уходить на наименее загруженный аккаунт.'
+    )
+    pool.release(first)
+    assert pool.acquire() is first
+    first.on_failure(401)
+    assert pool.acquire() is second, (
+        'Отказывающий аккаунт не должен выбираться для загрузок.'
+    )
+    second.free_space = 10
+    with pytest.raises(CircuitOpen):
+        pool.check()
+
+
+async def test_uploads_are_spread_across_accounts(client, monkeypatch,
+                                                  multi_account_mock_server):
+    server, user_calls, accounts = await multi_account_mock_server
+    await intercept_requests(server, monkeypatch)
+    monkeypatch.setattr(yandexdisk, 'disk_accounts', _pool())
+
+    await asyncio.get_running_loop().run_in_executor(
+        None, _upload, client, 4)
+    uploads = [accounts[token].get('uploads', 0) for token in MULTI_TOKENS]
+    assert sum(uploads) == 4 and all(uploads), (
+        'Одновременные загрузки должны распределяться между аккаунтами.'
+    )
+    assert 'disk_info' in user_calls, (
+        'Свободное место аккаунтов пула должно запрашиваться у Диска.'
+    )
+    links = URLMap.query.all()
+    assert sum(url.original.startswith('second@app:/') for url in links) == (
+        uploads[1])
+
+    def follow_all():
+        return [client.get(f'/{url.short}') for url in links]
+
+    responses = await asyncio.get_running_loop().run_in_executor(
+        None, follow_all)
+    assert all(response.status_code == HTTPStatus.FOUND
+               for response in responses), (
+        'Ссылка на файл должна разрешаться токеном того аккаунта, куда '
+        'файл был загружен.'
+    )
+
+
+async def test_full_or_rejected_account_is_skipped(client, monkeypatch,
+                                                   multi_account_mock_server):
+    server, _, accounts = await multi_account_mock_server
+    await intercept_requests(server, monkeypatch)
+    pool = _pool(min_free_space=1)
+    monkeypatch.setattr(yandexdisk, 'disk_accounts', pool)
+    accounts[MULTI_TOKENS[0]]['total_space'] = 0
+
+    await asyncio.get_running_loop().run_in_executor(
+        None, _upload, client, 2)
+    assert accounts[MULTI_TOKENS[1]]['uploads'] == 2, (
+        'Аккаунт без свободного места не должен получать файлы.'
+    )
+
+    accounts[MULTI_TOKENS[0]]['total_space'] = 10 ** 9
+    del accounts[MULTI_TOKENS[1]]
+    pool.reset()
+    pool.accounts[0].free_space = 1
+    pool.accounts[1].free_space = 10 ** 9
+    for account in pool.accounts:
+        account.space_checked = float('inf')
+    await asyncio.get_running_loop().run_in_executor(
+        None, _upload, client, 1, 'другой файл')
+    assert accounts[MULTI_TOKENS[0]]['uploads'] == 1, (
+        'Если аккаунт отказал в доступе, файл должен уйти на другой.'
+    )
+    assert pool.stats()['second']['failures'] == 1
+    assert URLMap.query.count() == 3
+
+
+async def test_throttled_account_fails_over_at_once(client, monkeypatch,
+                                                    multi_account_mock_server):
+    server, _, accounts = await multi_account_mock_server
+    await intercept_requests(server, monkeypatch)
+    pool = _pool()
+    monkeypatch.setattr(yandexdisk, 'disk_accounts', pool)
+    accounts[MULTI_TOKENS[0]]['retry_after'] = '30'
+    first = pool.accounts[0]
+    first.space_checked = pool.accounts[1].space_checked = float('inf')
+
+    await asyncio.get_running_loop().run_in_executor(
+        None, _upload, client, 1)
+    assert accounts[MULTI_TOKENS[0]]['throttled'] == 1, (
+        'На 429 загрузка должна сразу уйти на другой аккаунт, а не '
+        'повторяться на том же.'
+    )
+    assert accounts[MULTI_TOKENS[1]]['uploads'] == 1
+    assert first.limit.delay() > 25 and not yandexdisk.upload_limit.delay(), (
+        'Retry-After одного аккаунта не должен останавливать загрузки '
+        'на остальные.'
+    )
+
+    await asyncio.get_running_loop().run_in_executor(
+        None, _upload, client, 1, 'другой файл')
+    assert accounts[MULTI_TOKENS[0]]['throttled'] == 1, (
+        'Аккаунт на паузе по Retry-After не должен выбираться для загрузок.'
+    )
+    assert accounts[MULTI_TOKENS[1]]['uploads'] == 2
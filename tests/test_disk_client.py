@@ -0,0 +1,62 @@
+from io import BytesIO
+
+from werkzeug.datastructures import FileStorage
+
+from tests.conftest import generate_png_bytes, upload_files
+from tests.yandex_disk_mock_server import intercept_requests
+from yacut import app, yandexdisk
+from yacut.yandexdisk import DiskClient
+
+
+def _png(name='image.png'):
+    return FileStorage(stream=BytesIO(generate_png_bytes()), filename=name)
+
+
+def test_client_forgets_parent_loop_after_fork(monkeypatch):
+    client = DiskClient()
+    try:
+        parent_loop = client._home()
+        monkeypatch.setattr(client, '_pid', -1)
+        child_loop = client._home()
+        assert child_loop is not parent_loop, (
+            'После fork клиент должен открыть собственный цикл и сессию, '
+            'а не использовать объекты родительского процесса.'
+        )
+    finally:
+        parent_loop.call_soon_threadsafe(parent_loop.stop)
+        client.close()
+
+
+async def test_connections_are_reused(mock_server, monkeypatch):
+    server, user_calls = await mock_server
+    await intercept_requests(server, monkeypatch)
+    client = DiskClient()
+    monkeypatch.setattr(yandexdisk, 'disk_client', client)
+    try:
+        for index in range(3):
+            [result] = await upload_files([_png(f'{index}.png')])
+            assert result.link
+        stats = client.stats()
+    finally:
+        client.close()
+    # На файл два вызова: ссылка для загрузки и PUT.
+    assert stats['requests'] == 6
+    assert stats['connections_created'] == 1, (
+        'Вызовы API Диска из разных запросов должны переиспользовать '
+        'соединения общего пула, а не открывать новые.'
+    )
+    assert stats['connections_reused'] == 5
+    assert stats['in_flight'] == 0
+
+
+def test_disk_stats_endpoint(client, monkeypatch):
+    assert client.get('/api/disk/stats/').status_code == 403, (
+        'Статистика Диска должна быть доступна только администратору.'
+    )
+    monkeypatch.setitem(app.config, 'ADMIN_TOKEN', 'admin-secret')
+    assert client.get('/api/cache/stats/').status_code == 401
+    response = client.get('/api/disk/stats/',
+                          headers={'Authorization': 'Bearer admin-secret'})
+    assert response.status_code == 200
+    assert {'requests', 'connections_created', 'connections_reused',
+            'limit_per_host'} <= response.get_json().keys()
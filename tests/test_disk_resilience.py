@@ -0,0 +1,146 @@
+import asyncio
+import time
+from io import BytesIO
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from tests.conftest import generate_png_bytes, upload_files
+from tests.yandex_disk_mock_server import intercept_requests
+from yacut import yandexdisk
+from yacut.resilience import (CircuitBreaker, CircuitOpen, call_with_retries,
+                              hedged)
+from yacut.yandexdisk import DiskClient
+
+
+def _png(name='image.png'):
+    return FileStorage(stream=BytesIO(generate_png_bytes()), filename=name)
+
+
+def test_breaker_opens_and_probes_after_timeout():
+    breaker = CircuitBreaker(threshold=2, reset_timeout=0.05)
+    breaker.on_failure()
+    breaker.before_call()
+    breaker.on_failure()
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    with pytest.raises(CircuitOpen):
+        breaker.check()
+    time.sleep(0.06)
+    breaker.check()
+    breaker.before_call()
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    breaker.on_success()
+    assert breaker.stats() == {
+        'state': 'closed', 'failures': 0, 'opened': 1}, (
+        'Успешный пробный вызов должен закрыть автомат.'
+    )
+
+
+def test_cancelled_probe_releases_breaker():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0)
+    breaker.on_failure()
+
+    async def scenario():
+        probe = asyncio.create_task(call_with_retries(
+            lambda: asyncio.sleep(60), attempts=1, base_delay=0,
+            max_delay=0, breaker=breaker,
+            classify=lambda exc: (False, True)))
+        await asyncio.sleep(0)
+        assert breaker.stats()['state'] == 'half-open'
+        probe.cancel()
+        await asyncio.gather(probe, return_exceptions=True)
+
+    asyncio.run(scenario())
+    breaker.before_call()
+    breaker.on_success()
+    assert breaker.stats()['state'] == 'closed', (
+        'Отменённая проба не должна навсегда оставлять автомат '
+        'полуоткрытым.'
+    )
+
+
+def test_hedged_returns_first_success():
+    calls = []
+
+    async def call():
+        calls.append(None)
+        await asyncio.sleep(1 if len(calls) == 1 else 0)
+        return len(calls)
+
+    started = time.monotonic()
+    assert asyncio.run(hedged(call, 0.01)) == 2
+    assert time.monotonic() - started < 0.5, (
+        'Дублирующий вызов должен вернуть ответ, не дожидаясь первого.'
+    )
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(yandexdisk, 'RETRY_BASE_DELAY', 0.001)
+    client = DiskClient()
+    monkeypatch.setattr(yandexdisk, 'disk_client', client)
+    yield client
+    client.close()
+
+
+async def test_transient_errors_are_retried(flaky_mock_server, monkeypatch,
+                                            fast_retries):
+    server, flaky = await flaky_mock_server
+    await intercept_requests(server, monkeypatch)
+    retries = yandexdisk.call_stats['retries']
+    results = await upload_files([_png('1.png'), _png('2.png')])
+    assert all(result.link for result in results), (
+        'Разовый ответ 5xx от API Диска не должен проваливать загрузку.'
+    )
+    assert flaky.failed == 4
+    assert yandexdisk.call_stats['retries'] - retries == 4
+    assert yandexdisk.disk_breaker.stats()['state'] == 'closed'
+
+
+async def test_breaker_fails_fast_while_disk_is_down(flaky_mock_server,
+                                                     monkeypatch,
+                                                     fast_retries):
+    server, flaky = await flaky_mock_server
+    await intercept_requests(server, monkeypatch)
+    flaky.failures = 100
+    monkeypatch.setattr(yandexdisk, 'disk_breaker',
+                        CircuitBreaker(threshold=2, reset_timeout=60))
+    [result] = await upload_files([_png()])
+    assert isinstance(result.error, CircuitOpen)
+    failed = flaky.failed
+    assert failed == 2
+    with pytest.raises(CircuitOpen):
+        await upload_files([_png()])
+    assert flaky.failed == failed, (
+        'Пока автомат открыт, запросы к API Диска не должны отправляться.'
+    )
+
+
+async def test_slow_href_request_is_hedged(flaky_mock_server, monkeypatch,
+                                           fast_retries):
+    server, flaky = await flaky_mock_server
+    await intercept_requests(server, monkeypatch)
+    flaky.failures, flaky.stall = 0, 5
+    monkeypatch.setattr(yandexdisk, 'HEDGE_DELAY', 0.05)
+    hedges = yandexdisk.call_stats['hedges']
+    started = time.monotonic()
+    [result] = await upload_files([_png()])
+    assert result.link
+    assert time.monotonic() - started < 2, (
+        'Медленный GET к API Диска должен дублироваться через HEDGE_DELAY.'
+    )
+    assert yandexdisk.call_stats['hedges'] - hedges == 1
+
+
+def test_upload_view_reports_disk_outage(client, monkeypatch):
+    def disk_down(files, digests=None):
+        raise CircuitOpen('Яндекс Диск временно недоступен.')
+
+    monkeypatch.setattr('yacut.views.start_uploads', disk_down)
+    response = client.post('/files', data={
+        'files': (BytesIO(generate_png_bytes()), 'image.png')},
+        content_type='multipart/form-data')
+    assert response.status_code == 503
+    assert 'временно недоступен' in response.get_data(as_text=True)
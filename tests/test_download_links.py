@@ -0,0 +1,141 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from io import BytesIO
+
+from aiohttp import ClientResponseError
+
+from tests.conftest import generate_png_bytes
+from tests.yandex_disk_mock_server import intercept_requests
+from yacut import yandexdisk
+from yacut.models import URLMap
+from yacut.resilience import CircuitOpen
+from yacut.yandexdisk import DownloadLinks
+
+DISK_PATH = 'app:/report_0123.pdf'
+
+
+def _fake_hrefs(monkeypatch, delay=0.0, error=None):
+    calls = []
+
+    async def fake_href(session, remote_path):
+        calls.append(remote_path)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return f'https://downloader.disk.example/{len(calls)}'
+
+    monkeypatch.setattr(yandexdisk, '_get_download_href', fake_href)
+    return calls
+
+
+def _disk_link(path=DISK_PATH):
+    return URLMap.store_validated([(path, None)])[0][1]
+
+
+def test_concurrent_resolutions_share_one_call(_app, monkeypatch):
+    calls = _fake_hrefs(monkeypatch, delay=0.1)
+    links = DownloadLinks(ttl=60)
+    barrier = threading.Barrier(8)
+
+    def resolve(_):
+        barrier.wait()
+        return links.resolve(DISK_PATH)
+
+    with ThreadPoolExecutor(8) as pool:
+        hrefs = set(pool.map(resolve, range(8)))
+    assert len(calls) == 1, (
+        'Одновременные переходы по одной ссылке должны ждать один общий '
+        'запрос к API Диска.'
+    )
+    assert hrefs == {'https://downloader.disk.example/1'}
+    assert links.stats()['coalesced'] == 7
+    links.resolve(DISK_PATH)
+    assert len(calls) == 1, 'Полученная ссылка должна браться из кэша.'
+
+
+def test_cached_href_expires(_app, monkeypatch):
+    calls = _fake_hrefs(monkeypatch)
+    links = DownloadLinks(ttl=0.05)
+    links.resolve(DISK_PATH)
+    time.sleep(0.06)
+    assert links.resolve(DISK_PATH).endswith('/2'), (
+        'По истечении TTL ссылка на скачивание запрашивается заново.'
+    )
+
+
+def test_failed_resolution_is_not_cached(_app, monkeypatch):
+    calls = _fake_hrefs(monkeypatch, error=RuntimeError('сбой'))
+    links = DownloadLinks()
+    for _ in range(2):
+        assert isinstance(links.resolve_many([DISK_PATH])[DISK_PATH],
+                          RuntimeError)
+    assert len(calls) == 2
+
+
+def test_slow_resolution_times_out(client, monkeypatch):
+    calls = _fake_hrefs(monkeypatch, delay=0.3)
+    monkeypatch.setattr(yandexdisk.download_links, 'timeout', 0.05)
+    short = _disk_link()
+    assert client.get(f'/{short}').status_code == (
+        HTTPStatus.SERVICE_UNAVAILABLE), (
+        'Переход не должен ждать ссылку на скачивание дольше таймаута.'
+    )
+    response = client.get(f'/api/id/{short}/')
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert calls == [DISK_PATH], (
+        'Повторный запрос должен ждать тот же вызов API, а не начинать новый.'
+    )
+    time.sleep(0.3)
+    assert client.get(f'/{short}').status_code == HTTPStatus.FOUND
+
+
+def test_follow_disk_link_resolves_lazily(client, monkeypatch):
+    calls = _fake_hrefs(monkeypatch)
+    short = _disk_link()
+    assert calls == [], 'Ссылка на скачивание не нужна при создании.'
+    for _ in range(2):
+        response = client.get(f'/{short}')
+        assert response.status_code == HTTPStatus.FOUND
+        assert response.headers['Location'] == (
+            'https://downloader.disk.example/1')
+    assert calls == [DISK_PATH]
+    assert client.get(f'/api/id/{short}/').get_json() == {
+        'url': 'https://downloader.disk.example/1'}
+    assert client.post('/api/id/resolve/', json=[short, 'py']).get_json() == {
+        short: 'https://downloader.disk.example/1', 'py': None}
+
+
+def test_follow_disk_link_errors(client, monkeypatch):
+    short = _disk_link()
+    _fake_hrefs(monkeypatch, error=ClientResponseError(
+        None, (), status=404))
+    assert client.get(f'/{short}').status_code == HTTPStatus.NOT_FOUND, (
+        'Ссылка на удалённый с Диска файл должна отвечать 404.'
+    )
+    _fake_hrefs(monkeypatch, error=CircuitOpen('недоступен'))
+    assert client.get(f'/{short}').status_code == (
+        HTTPStatus.SERVICE_UNAVAILABLE)
+    response = client.get(f'/api/id/{short}/')
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+
+
+async def test_public_links_are_published_once(client, mock_server,
+                                               monkeypatch):
+    server, user_calls = await mock_server
+    await intercept_requests(server, monkeypatch)
+    monkeypatch.setattr(yandexdisk, 'PUBLIC_LINKS', True)
+
+    def sync_test():
+        client.post('/files', data={
+            'files': [(BytesIO(generate_png_bytes()), 'a.png')]})
+
+    await asyncio.get_running_loop().run_in_executor(None, sync_test)
+    original = URLMap.query.one().original
+    assert original.startswith('https://yadi.sk/d/'), (
+        'В режиме публичных ссылок хранится постоянная public_url.'
+    )
+    assert 'publish' in user_calls
+    assert 'get_download_link' not in user_calls
@@ -0,0 +1,101 @@
+import csv
+import io
+import json
+from datetime import datetime
+from http import HTTPStatus
+
+import pytest
+
+from tests.conftest import PY_URL
+from yacut import app, db
+from yacut.models import URLMap
+
+EXPORT_URL = '/api/export/'
+TOKEN = 'admin-secret'
+
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setitem(app.config, 'ADMIN_TOKEN', TOKEN)
+    return {'Authorization': f'Bearer {TOKEN}'}
+
+
+@pytest.fixture
+def links(_app):
+    URLMap.create_many([(PY_URL, f'link{index}') for index in range(5)])
+    db.session.execute(
+        db.update(URLMap).where(URLMap.short == 'link0')
+        .values(timestamp=datetime(2020, 1, 1)))
+    db.session.commit()
+
+
+def test_export_requires_token(client, links, admin_token):
+    response = client.get(EXPORT_URL)
+    assert response.status_code == HTTPStatus.UNAUTHORIZED, (
+        'Выгрузка без токена администратора должна возвращать 401.'
+    )
+    response = client.get(
+        EXPORT_URL, headers={'Authorization': 'Bearer wrong'})
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_export_disabled_without_token(client, links):
+    response = client.get(EXPORT_URL, headers={'Authorization': 'Bearer '})
+    assert response.status_code == HTTPStatus.FORBIDDEN, (
+        'Без настройки `ADMIN_TOKEN` административный API отключён.'
+    )
+
+
+def test_export_ndjson_in_keyset_batches(client, links, admin_token,
+                                         monkeypatch):
+    monkeypatch.setitem(app.config, 'EXPORT_BATCH_SIZE', 2)
+    response = client.get(EXPORT_URL, headers=admin_token)
+    assert response.status_code == HTTPStatus.OK
+    assert response.mimetype == 'application/x-ndjson'
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record['short'] for record in records] == [
+        f'link{index}' for index in range(5)], (
+        'Выгрузка должна содержать все строки в порядке id, '
+        'независимо от размера пачки.'
+    )
+    assert records[0]['url'] == PY_URL
+
+
+def test_export_csv_since(client, links, admin_token):
+    response = client.get(
+        EXPORT_URL + '?format=csv&since=2021-01-01', headers=admin_token)
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row['short'] for row in rows] == [
+        f'link{index}' for index in range(1, 5)], (
+        'Параметр `since` должен отсекать ссылки, созданные раньше даты.'
+    )
+
+
+def test_export_separates_disk_paths(client, links, admin_token):
+    URLMap.store_validated([('app:/report.pdf', 'file')])
+    response = client.get(EXPORT_URL + '?format=csv', headers=admin_token)
+    rows = {row['short']: row
+            for row in csv.DictReader(io.StringIO(response.text))}
+    assert rows['file']['url'] == '' and (
+        rows['file']['disk_path'] == 'app:/report.pdf'), (
+        'Путь на Диске должен выгружаться в `disk_path`, а не в `url`.'
+    )
+    assert rows['link1']['url'] == PY_URL and rows['link1']['disk_path'] == ''
+
+
+def test_export_cli_roundtrip(links, cli_runner, tmp_path):
+    target = tmp_path / 'links.csv'
+    result = cli_runner.invoke(args=['export-links', str(target)])
+    assert result.exit_code == 0, result.output
+    rows = list(csv.DictReader(target.open(encoding='utf-8')))
+    assert len(rows) == 5 and rows[0]['url'] == PY_URL, (
+        'Команда `export-links` должна выгружать все ссылки.'
+    )
+    URLMap.query.delete()
+    db.session.commit()
+    result = cli_runner.invoke(args=['import-links', str(target)])
+    assert result.exit_code == 0, result.output
+    assert URLMap.query.count() == 5, (
+        'Выгрузку в CSV должно быть возможно загрузить обратно.'
+    )
@@ -0,0 +1,212 @@
+import asyncio
+import hashlib
+import re
+from http import HTTPStatus
+from io import BytesIO
+
+import aiohttp
+
+from tests.conftest import generate_png_bytes
+from tests.yandex_disk_mock_server import intercept_requests
+from yacut import dedup, yandexdisk
+from yacut.dedup import file_digest
+from yacut.models import DiskFile, URLMap
+from yacut.yandexdisk import UploadResult, Uploaded
+
+BOUNDARY = 'yacut-test'
+
+
+def _count_puts(monkeypatch):
+    calls = []
+    put_file = yandexdisk._put_file
+
+    async def counting_put(session, href, stream, *args):
+        calls.append(href)
+        return await put_file(session, href, stream, *args)
+
+    monkeypatch.setattr(yandexdisk, '_put_file', counting_put)
+    return calls
+
+
+async def _fake_upload(session, file_storage, owner, reservation=None):
+    return Uploaded(f'https://disk.example/{file_storage.filename}',
+                    f'app:/{file_storage.filename}')
+
+
+def _short_links(page):
+    return re.findall(r'<a href="(http://localhost/[^"]+)"', page)
+
+
+def _stream_body(name, payload):
+    return (f'--{BOUNDARY}\r\nContent-Disposition: form-data; '
+            f'name="files"; filename="{name}"\r\n\r\n').encode() + (
+        payload + f'\r\n--{BOUNDARY}--\r\n'.encode())
+
+
+def test_file_digest_keeps_position():
+    stream = BytesIO(b'abcdef')
+    stream.seek(2)
+    assert file_digest(stream) == hashlib.sha256(b'cdef').hexdigest()
+    assert stream.tell() == 2, (
+        'Подсчёт хеша не должен сдвигать позицию потока перед загрузкой.'
+    )
+
+
+async def test_repeat_form_upload_skips_put(client, mock_server,
+                                            monkeypatch):
+    server, _ = await mock_server
+    await intercept_requests(server, monkeypatch)
+    puts = _count_puts(monkeypatch)
+    payload = generate_png_bytes()
+
+    def sync_test():
+        pages = [client.post('/files', data={
+            'files': [(BytesIO(payload), f'{name}.png')]}).get_data(
+                as_text=True) for name in ('first', 'again')]
+        assert len(puts) == 1, (
+            'Файл, который уже есть на Диске, не должен загружаться снова.'
+        )
+        assert _short_links(pages[0]) == _short_links(pages[1]), (
+            'Повторная загрузка должна возвращать прежнюю короткую ссылку.'
+        )
+
+    await asyncio.get_running_loop().run_in_executor(None, sync_test)
+    assert DiskFile.query.one().sha256 == hashlib.sha256(payload).hexdigest()
+    assert URLMap.query.count() == 1
+
+
+async def test_streamed_duplicate_is_removed_from_disk(client, mock_server,
+                                                       monkeypatch):
+    server, user_calls = await mock_server
+    await intercept_requests(server, monkeypatch)
+    puts = _count_puts(monkeypatch)
+    body = _stream_body('image.png', generate_png_bytes())
+
+    def sync_test():
+        return [client.post(
+            '/api/files/', data=body,
+            content_type=f'multipart/form-data; boundary={BOUNDARY}'
+        ).get_json()['items'][0]['short_link'] for _ in range(2)]
+
+    links = await asyncio.get_running_loop().run_in_executor(None, sync_test)
+    assert len(puts) == 2, 'Хеш потоковой загрузки известен только после PUT.'
+    assert links[0] == links[1]
+    for _ in range(100):
+        if 'delete' in user_calls:
+            break
+        await asyncio.sleep(0.01)
+    assert 'delete' in user_calls, (
+        'Лишняя копия уже известного файла должна удаляться с Диска.'
+    )
+
+
+async def test_direct_duplicate_is_checked_by_disk_hash(client, mock_server,
+                                                       monkeypatch):
+    server, user_calls = await mock_server
+    await intercept_requests(server, monkeypatch)
+    payload = generate_png_bytes()
+
+    def request_slot():
+        page = client.post('/files', data={
+            'files': [(BytesIO(payload), 'a.png')]}).get_data(as_text=True)
+        response = client.post('/api/files/slots/', json={'files': [
+            {'name': 'copy.png', 'size': len(payload),
+             'sha256': hashlib.sha256(payload).hexdigest()}]})
+        assert response.status_code == HTTPStatus.OK
+        return _short_links(page)[0], response.get_json()['items'][0]
+
+    loop = asyncio.get_running_loop()
+    link, slot = await loop.run_in_executor(None, request_slot)
+    assert slot['token'] and 'short_link' not in slot, (
+        'Хешу от клиента верить нельзя: слот выдаётся и для известного '
+        'содержимого, а ссылка — только после загрузки.'
+    )
+    async with aiohttp.ClientSession() as browser:
+        async with browser.put(slot['href'], data=payload) as put:
+            assert put.status == HTTPStatus.CREATED
+
+    def finalize():
+        return client.post('/api/files/finalize/', json={
+            'tokens': [slot['token']]}).get_json()['items'][0]
+
+    item = await loop.run_in_executor(None, finalize)
+    assert item['short_link'] == link, (
+        'Если хеш, посчитанный Диском, уже известен, возвращается прежняя '
+        'ссылка.'
+    )
+    for _ in range(100):
+        if 'delete' in user_calls:
+            break
+        await asyncio.sleep(0.01)
+    assert 'delete' in user_calls, (
+        'Лишняя копия из прямой загрузки должна удаляться с Диска.'
+    )
+    assert URLMap.query.count() == 1
+
+
+def test_form_hashes_files_off_the_event_loop(client, monkeypatch):
+    loops = []
+    digest = dedup.file_digest
+
+    def recording_digest(stream):
+        try:
+            loops.append(asyncio.get_running_loop())
+        except RuntimeError:
+            loops.append(None)
+        return digest(stream)
+
+    monkeypatch.setattr(dedup, 'file_digest', recording_digest)
+    monkeypatch.setattr(yandexdisk, '_upload_one', _fake_upload)
+    response = client.post('/files', data={
+        'files': [(BytesIO(generate_png_bytes()), 'a.png')]})
+    assert response.status_code == HTTPStatus.OK
+    assert loops == [None], (
+        'Файл должен хешироваться в пуле потоков, а не на цикле событий '
+        'async-представления.'
+    )
+
+
+async def test_finalize_token_is_single_use(client, mock_server, monkeypatch):
+    server, user_calls = await mock_server
+    await intercept_requests(server, monkeypatch)
+    payload = generate_png_bytes()
+    loop = asyncio.get_running_loop()
+
+    def request_slot():
+        return client.post('/api/files/slots/', json={'files': [
+            {'name': 'a.png', 'size': len(payload)}]}).get_json()['items'][0]
+
+    slot = await loop.run_in_executor(None, request_slot)
+    async with aiohttp.ClientSession() as browser:
+        async with browser.put(slot['href'], data=payload) as put:
+            assert put.status == HTTPStatus.CREATED
+
+    def finalize(tokens):
+        return client.post('/api/files/finalize/', json={
+            'tokens': tokens}).get_json()['items']
+
+    first, again = await loop.run_in_executor(
+        None, finalize, [slot['token'], slot['token']])
+    replay, = await loop.run_in_executor(None, finalize, [slot['token']])
+    assert again['error'] == replay['error'] == 'Токен уже использован', (
+        'Токен завершения должен срабатывать только один раз.'
+    )
+    await asyncio.sleep(0.05)
+    assert 'delete' not in user_calls, (
+        'Повтор завершения не должен удалять с Диска единственную копию.'
+    )
+    response = await loop.run_in_executor(
+        None, client.get, first['short_link'])
+    assert response.status_code == HTTPStatus.FOUND
+    assert URLMap.query.count() == 1
+
+
+def test_same_path_is_not_a_copy():
+    known = {'h': Uploaded('app:/a', 'app:/a', 'h', 'abc')}
+    results = [UploadResult(0, 'a', link='app:/a', remote_path='app:/a',
+                            sha256='h'),
+               UploadResult(1, 'b', link='app:/b', remote_path='app:/b',
+                            sha256='h')]
+    assert dedup._partition(results, known) == ({}, ['app:/b']), (
+        'Путь, уже записанный для хеша, — сам файл, а не лишняя копия.'
+    )
@@ -1,4 +1,5 @@
 import asyncio
+import re
 from http import HTTPStatus
 from io import BytesIO
 
@@ -11,7 +12,6 @@ FILES_URL = '/files'
 EXPECTED_API_CALLS = {
     'get_upload_link',
     'upload',
-    'get_download_link'
 }
 
 
@@ -88,6 +88,22 @@ async def test_upload_files(client, mock_server, monkeypatch):
         assert not (EXPECTED_API_CALLS - user_calls), (
             COMMON_ASSERT_MSG_FOR_UPLOAD_FILES
         )
+        assert 'get_download_link' not in user_calls, (
+            'Ссылка на скачивание должна запрашиваться при переходе, '
+            'а не при загрузке файла.'
+        )
+        short_link = re.search(
+            rf'href="{TEST_BASE_URL}/(\w+)"', response_data).group(1)
+        redirect = client.get(f'/{short_link}')
+        assert redirect.status_code == HTTPStatus.FOUND
+        assert redirect.headers['Location'].startswith(
+            mocked_yadisk_direct_link_domain), (
+            'Переход по короткой ссылке на файл должен вести на ссылку '
+            'для скачивания с Диска.'
+        )
+        assert 'get_download_link' in user_calls, (
+            COMMON_ASSERT_MSG_FOR_UPLOAD_FILES
+        )
 
     loop = asyncio.get_running_loop()
     await loop.run_in_executor(None, sync_test)
@@ -0,0 +1,92 @@
+from http import HTTPStatus
+
+import pytest
+
+from yacut import app, db, slug_cache
+from yacut.models import URLMap
+
+LINKS = {
+    'apex': 'https://evil.example.com',
+    'sub': 'https://cdn.Evil.Example.com:8443/x',
+    'near': 'https://notevil.example.com',
+    'other': 'https://python.org',
+}
+
+
+@pytest.fixture
+def links(_app):
+    URLMap.create_many(list((url, short) for short, url in LINKS.items()))
+
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setitem(app.config, 'ADMIN_TOKEN', 'admin-secret')
+    return {'Authorization': 'Bearer admin-secret'}
+
+
+def _listed(client, headers, query):
+    data = client.get(f'/api/id/?{query}', headers=headers).get_json()
+    return {item['short_link'].rsplit('/', 1)[-1] for item in data['items']}
+
+
+def test_host_is_stored_normalized(links):
+    row = URLMap.query.filter_by(short='sub').first()
+    assert (row.host, row.host_rev) == (
+        'cdn.evil.example.com', 'moc.elpmaxe.live.ndc'), (
+        'Хост исходного URL должен сохраняться в нижнем регистре без порта.'
+    )
+
+
+def test_lookup_by_exact_host_and_suffix(client, links, admin_token):
+    assert _listed(client, admin_token, 'host=evil.example.com') == {'apex'}
+    assert _listed(client, admin_token,
+                   'host=evil.example.com&match=suffix') == {
+        'apex', 'sub'}, (
+        'Поиск по суффиксу должен находить хост и его поддомены, '
+        'но не хосты, лишь оканчивающиеся той же строкой.'
+    )
+    response = client.get('/api/id/?host=x&match=like', headers=admin_token)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_backfill_hosts(links, cli_runner):
+    db.session.execute(db.update(URLMap).values(host=None, host_rev=None))
+    db.session.commit()
+    result = cli_runner.invoke(
+        args=['backfill-hosts', '--batch-size', '3'])
+    assert result.exit_code == 0, result.output
+    assert 'updated=4' in result.output
+    hosts = dict(db.session.execute(
+        db.select(URLMap.short, URLMap.host_rev)).all())
+    assert hosts['other'] == 'gro.nohtyp', (
+        'Команда `backfill-hosts` должна заполнить хост у старых строк.'
+    )
+
+
+def test_bulk_disable_invalidates_cache(client, links, admin_token):
+    assert client.get('/sub').status_code == HTTPStatus.FOUND
+    assert slug_cache.get('sub') == LINKS['sub']
+    response = client.post(
+        '/api/admin/disable/',
+        json={'host': 'evil.example.com', 'match': 'suffix'},
+        headers=admin_token)
+    assert response.status_code == HTTPStatus.OK
+    assert response.get_json() == {'disabled': 2}
+    assert client.get('/sub').status_code == HTTPStatus.NOT_FOUND, (
+        'Отключённая ссылка не должна перенаправлять, даже если '
+        'была в кэше.'
+    )
+    resolved = client.post('/api/id/resolve/', json=['apex', 'near'])
+    assert resolved.get_json() == {'apex': None, 'near': LINKS['near']}
+    conflict = client.post('/api/id/', json={'url': LINKS['other'],
+                                             'custom_id': 'apex'})
+    assert conflict.status_code == HTTPStatus.BAD_REQUEST, (
+        'Слаг отключённой ссылки остаётся занятым.'
+    )
+
+
+def test_bulk_disable_requires_token(client, links, admin_token):
+    response = client.post('/api/admin/disable/',
+                           json={'host': 'evil.example.com'})
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+    assert client.get('/apex').status_code == HTTPStatus.FOUND
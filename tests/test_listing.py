@@ -0,0 +1,111 @@
+from datetime import datetime
+from http import HTTPStatus
+
+import pytest
+from sqlalchemy import event
+
+from yacut import app, db
+from yacut.models import URLMap
+
+LIST_URL = '/api/id/'
+AUTH = {'Authorization': 'Bearer admin-secret'}
+
+
+@pytest.fixture(autouse=True)
+def admin_token(monkeypatch):
+    monkeypatch.setitem(app.config, 'ADMIN_TOKEN', 'admin-secret')
+
+
+def _seed():
+    URLMap.create_many(
+        [(f'https://site{index % 2}.example.com/page{index}', f'link{index}')
+         for index in range(7)])
+    # Две ссылки с одинаковым временем: порядок решает id.
+    db.session.execute(
+        db.update(URLMap).values(timestamp=datetime(2024, 1, 1)))
+    db.session.execute(
+        db.update(URLMap).where(URLMap.short == 'link0')
+        .values(timestamp=datetime(2023, 1, 1)))
+    db.session.commit()
+
+
+def _walk(client, query=''):
+    shorts, cursor, pages = [], None, 0
+    while True:
+        url = f'{LIST_URL}?limit=3{query}'
+        if cursor:
+            url += f'&cursor={cursor}'
+        data = client.get(url, headers=AUTH).get_json()
+        shorts += [item['short_link'].rsplit('/', 1)[-1]
+                   for item in data['items']]
+        pages += 1
+        cursor = data['next_cursor']
+        if cursor is None:
+            return shorts, pages
+
+
+def test_list_newest_first_with_cursor(client):
+    _seed()
+    shorts, pages = _walk(client)
+    assert shorts == [f'link{index}' for index in (6, 5, 4, 3, 2, 1, 0)], (
+        'Ссылки должны отдаваться «сначала новые», без пропусков и повторов '
+        'при одинаковом времени создания.'
+    )
+    assert pages == 3
+
+
+def test_list_filter_by_host(client):
+    _seed()
+    shorts, _ = _walk(client, '&host=SITE1.example.com')
+    assert shorts == ['link5', 'link3', 'link1'], (
+        'Параметр `host` должен оставлять только ссылки на указанный хост.'
+    )
+
+
+def test_list_page_is_single_keyset_query(client):
+    _seed()
+    cursor = client.get(f'{LIST_URL}?limit=2',
+                        headers=AUTH).get_json()['next_cursor']
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        client.get(f'{LIST_URL}?limit=2&cursor={cursor}', headers=AUTH)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert len(statements) == 1, (
+        'Следующая страница должна запрашиваться одним запросом.'
+    )
+    assert '(url_map.timestamp, url_map.id) <' in statements[0], (
+        'Продолжение страницы должно идти по курсору (timestamp, id), '
+        'а не сдвигом OFFSET.'
+    )
+
+
+def test_list_validation(client):
+    for query in ('limit=0', 'limit=100000', 'cursor=!!!', 'cursor=YWJj'):
+        response = client.get(f'{LIST_URL}?{query}', headers=AUTH)
+        assert response.status_code == HTTPStatus.BAD_REQUEST, (
+            f'Некорректный запрос `{query}` должен возвращать 400.'
+        )
+
+
+def test_list_requires_admin_token(client):
+    _seed()
+    assert client.get(LIST_URL).status_code == HTTPStatus.UNAUTHORIZED, (
+        'Полный список ссылок должен быть доступен только администратору.'
+    )
+    response = client.get(LIST_URL, headers={'Authorization': 'Bearer x'})
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_list_labels_disk_paths(client):
+    short = URLMap.store_validated([('app:/report.pdf', None)])[0][1]
+    item, = client.get(LIST_URL, headers=AUTH).get_json()['items']
+    assert item['short_link'].endswith(f'/{short}')
+    assert item['url'] is None and item['disk_path'] == 'app:/report.pdf', (
+        'Путь на Диске не URL: листинг должен отдавать его в `disk_path`.'
+    )
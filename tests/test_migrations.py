@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def _flask_db(database, *args):
+    env = dict(os.environ, DATABASE_URI=f'sqlite:///{database}',
+               FLASK_APP='yacut')
+    return subprocess.run(
+        [sys.executable, '-m', 'flask', 'db', *args], cwd=BASE_DIR, env=env,
+        capture_output=True, text=True, timeout=60)
+
+
+def test_migrations_match_models(tmp_path):
+    database = tmp_path / 'yacut.db'
+    upgrade = _flask_db(database, 'upgrade')
+    assert upgrade.returncode == 0, upgrade.stderr
+    check = _flask_db(database, 'check')
+    assert check.returncode == 0, (
+        'Миграции должны приводить схему базы к моделям: '
+        f'{check.stdout}{check.stderr}'
+    )
@@ -0,0 +1,62 @@
+from http import HTTPStatus
+
+from sqlalchemy import event
+
+from tests.conftest import PY_URL
+from yacut import app, db
+from yacut.models import URLMap
+
+RESOLVE_URL = '/api/id/resolve/'
+
+
+def test_resolve_many(client, short_python_url):
+    URLMap.create_one('https://docs.python.org', 'docs')
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.post(RESOLVE_URL,
+                               json=['py', 'docs', 'nope', 'h@k$r', 'py'])
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == HTTPStatus.OK
+    assert response.json == {
+        'py': PY_URL,
+        'docs': 'https://docs.python.org',
+        'nope': None,
+        'h@k$r': None,
+    }, 'Каждому слагу должен соответствовать URL либо null.'
+    assert len(statements) == 1, (
+        'Набор слагов должен разрешаться одним IN-запросом.'
+    )
+
+
+def test_resolve_uses_cache(client, short_python_url):
+    client.post(RESOLVE_URL, json=['py', 'nope'])
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.post(RESOLVE_URL, json=['py', 'nope'])
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.json == {'py': PY_URL, 'nope': None}
+    assert not statements, (
+        'Повторное разрешение слагов должно обслуживаться из кэша.'
+    )
+
+
+def test_resolve_validation(client, monkeypatch):
+    response = client.post(RESOLVE_URL, json={'ids': ['py']})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    monkeypatch.setitem(app.config, 'API_BATCH_LIMIT', 1)
+    response = client.post(RESOLVE_URL, json=['a', 'b'])
+    assert response.status_code == HTTPStatus.BAD_REQUEST, (
+        'Размер пакета слагов должен ограничиваться.'
+    )
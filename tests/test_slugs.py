@@ -0,0 +1,82 @@
+from sqlalchemy import event
+
+from tests.conftest import PY_URL
+from yacut import db
+from yacut.models import SlugSequence, URLMap, slug_allocator
+from yacut.slugs import BASE, Scrambler, SlugAllocator, encode_base62
+
+
+def test_encode_base62_min_width():
+    assert encode_base62(0, 6) == 'aaaaaa'
+    assert encode_base62(BASE - 1, 6) == 'aaaaa9'
+
+
+def test_scrambler_is_bijective():
+    scrambler = Scrambler(b'secret')
+    domain = BASE ** 2
+    permuted = {scrambler.permute(value, domain) for value in range(domain)}
+    assert permuted == set(range(domain)), (
+        'Перемешивание значений счётчика должно быть биекцией.'
+    )
+
+
+def test_allocator_reserves_blocks_and_grows_width():
+    calls = []
+
+    def reserve(count):
+        calls.append(count)
+        return (len(calls) - 1) * count
+
+    allocator = SlugAllocator(reserve, block_size=10, min_width=1)
+    slugs = [allocator.allocate() for _ in range(BASE + 5)]
+    assert len(set(slugs)) == len(slugs), (
+        'Генератор не должен выдавать повторяющиеся слаги.'
+    )
+    assert len(calls) == 7, (
+        'Счётчик в базе должен резервироваться блоками, а не на каждый слаг.'
+    )
+    assert len(slugs[0]) == 1 and len(slugs[-1]) == 2, (
+        'Настройка `SHORT_URL_LENGTH` задаёт минимальную ширину слага, '
+        'которая растёт по мере заполнения пространства.'
+    )
+
+
+def test_reserve_is_shared_between_allocators(_app):
+    first = SlugAllocator(SlugSequence.reserve, block_size=5, key=b'k')
+    second = SlugAllocator(SlugSequence.reserve, block_size=5, key=b'k')
+    slugs = first.allocate_many(7) + second.allocate_many(7)
+    assert len(set(slugs)) == 14, (
+        'Аллокаторы разных процессов должны получать непересекающиеся блоки.'
+    )
+    assert db.session.get(SlugSequence, 'url_map').next_value == 14
+
+
+def test_create_one_without_existence_probe(_app):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement.split()[0].upper())
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        URLMap.create_one(PY_URL)
+        statements.clear()
+        obj = URLMap.create_one(PY_URL)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert statements == ['INSERT'], (
+        'Создание ссылки со сгенерированным слагом должно стоить одного '
+        'INSERT без предварительных SELECT.'
+    )
+    assert len(obj.short) == 6
+
+
+def test_generated_slug_skips_custom_alias(_app, monkeypatch):
+    monkeypatch.setattr(slug_allocator, '_reserve', lambda count: 0)
+    taken = slug_allocator.encode(0)
+    URLMap.create_one(PY_URL, taken)
+    obj = URLMap.create_one(PY_URL)
+    assert obj.short == slug_allocator.encode(1), (
+        'При совпадении сгенерированного слага с пользовательским алиасом '
+        'должен выдаваться следующий слаг.'
+    )
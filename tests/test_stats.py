@@ -0,0 +1,65 @@
+from datetime import datetime
+from http import HTTPStatus
+
+from yacut import db
+from yacut.clicks import click_counter
+from yacut.models import ClickRollup
+
+STATS_URL = '/api/id/{short_id}/stats/'
+
+
+def _seed(short, counts):
+    ClickRollup.add({(short, bucket): count for bucket, count in counts})
+    db.session.commit()
+
+
+def test_rollups_fed_from_redirects(client, short_python_url):
+    client.get('/py')
+    client.get('/py')
+    click_counter.flush()
+    client.get('/py')
+    click_counter.flush()
+    rows = ClickRollup.query.filter_by(short='py').all()
+    assert len(rows) == 1 and rows[0].count == 3, (
+        'Переходы должны агрегироваться в одну строку на слаг и час.'
+    )
+
+
+def test_stats_downsampling(client, short_python_url):
+    _seed('py', [
+        (datetime(2024, 1, 1, 10), 1),  # понедельник
+        (datetime(2024, 1, 1, 11), 2),
+        (datetime(2024, 1, 3, 9), 4),
+        (datetime(2024, 1, 8, 0), 8),  # следующий понедельник
+    ])
+    params = '?from=2024-01-01T00:00:00&to=2024-01-09T00:00:00'
+    url = STATS_URL.format(short_id='py') + params
+    hourly = client.get(url).json['points']
+    assert len(hourly) == 4
+    daily = client.get(url + '&granularity=day').json['points']
+    assert daily == [
+        {'time': '2024-01-01T00:00:00', 'clicks': 3},
+        {'time': '2024-01-03T00:00:00', 'clicks': 4},
+        {'time': '2024-01-08T00:00:00', 'clicks': 8},
+    ], 'Агрегация по дням должна суммировать часы одного дня.'
+    weekly = client.get(url + '&granularity=week').json['points']
+    assert weekly == [
+        {'time': '2024-01-01T00:00:00', 'clicks': 7},
+        {'time': '2024-01-08T00:00:00', 'clicks': 8},
+    ], 'Агрегация по неделям должна начинать неделю с понедельника.'
+
+
+def test_stats_range_and_validation(client, short_python_url):
+    _seed('py', [(datetime(2024, 1, 1, 10), 1),
+                 (datetime(2024, 2, 1, 10), 1)])
+    url = STATS_URL.format(short_id='py')
+    response = client.get(url + '?from=2024-01-15T00:00:00'
+                                 '&to=2024-03-01T00:00:00')
+    assert response.json['points'] == [
+        {'time': '2024-02-01T10:00:00', 'clicks': 1}]
+    response = client.get(url + '?granularity=month')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    response = client.get(url + '?from=yesterday')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    response = client.get(STATS_URL.format(short_id='nope'))
+    assert response.status_code == HTTPStatus.NOT_FOUND
@@ -0,0 +1,107 @@
+import asyncio
+from http import HTTPStatus
+from io import BytesIO
+
+from werkzeug.formparser import MultiPartParser
+
+from tests.conftest import generate_png_bytes
+from tests.yandex_disk_mock_server import intercept_requests
+
+API_FILES_URL = '/api/files/'
+BOUNDARY = 'yacut-test'
+
+
+def _part(name, payload, headers=()):
+    head = (f'--{BOUNDARY}\r\nContent-Disposition: form-data; '
+            f'name="files"; filename="{name}"\r\n'
+            'Content-Type: application/octet-stream\r\n')
+    head += ''.join(f'{key}: {value}\r\n' for key, value in headers)
+    return head.encode() + b'\r\n' + payload + b'\r\n'
+
+
+def _body(*parts):
+    return b''.join(parts) + f'--{BOUNDARY}--\r\n'.encode()
+
+
+def _post(client, body):
+    return client.post(
+        API_FILES_URL, data=body,
+        content_type=f'multipart/form-data; boundary={BOUNDARY}')
+
+
+def test_rejects_non_multipart_body(client):
+    response = client.post(API_FILES_URL, json={'files': []})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_rejects_disallowed_extension_before_upload(client):
+    response = _post(client, _body(_part('script.exe', b'MZ')))
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert 'script.exe' in response.get_json()['message'], (
+        'Файл с недопустимым расширением должен отклоняться до загрузки.'
+    )
+
+
+def test_rejects_declared_oversized_part(client, monkeypatch):
+    monkeypatch.setattr('yacut.streaming.MAX_ONE_FILE', 10)
+    response = _post(client, _body(
+        _part('big.png', b'x', headers=[('Content-Length', '11')])))
+    assert response.status_code == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+
+
+def test_rejects_body_above_max_content_length(client, monkeypatch):
+    monkeypatch.setitem(client.application.config, 'MAX_CONTENT_LENGTH', 10)
+    response = _post(client, _body(_part('image.png', b'x' * 100)))
+    assert response.status_code == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+
+
+def test_form_enforces_max_files(client):
+    response = client.post('/files', data={'files': [
+        (BytesIO(b'x'), f'{index}.png') for index in range(11)]})
+    assert 'не более 10 файлов' in response.get_data(as_text=True), (
+        'Форма загрузки должна проверять ограничение MAX_FILES.'
+    )
+
+
+async def test_streams_files_without_spooling(client, mock_server,
+                                              monkeypatch):
+    server, user_calls = await mock_server
+    await intercept_requests(server, monkeypatch)
+
+    def no_spooling(*args, **kwargs):
+        raise AssertionError(
+            'Потоковая загрузка не должна разбирать тело через '
+            'request.files.')
+
+    monkeypatch.setattr(MultiPartParser, 'parse', no_spooling)
+    body = _body(_part('1.png', generate_png_bytes()),
+                 _part('2.png', generate_png_bytes()))
+
+    def sync_test():
+        response = _post(client, body)
+        assert response.status_code == HTTPStatus.CREATED
+        items = response.get_json()['items']
+        assert [item['name'] for item in items] == ['1.png', '2.png']
+        assert all(item['short_link'].startswith('http://localhost/')
+                   for item in items)
+        assert {'get_upload_link', 'upload', 'stored'} <= user_calls
+
+    await asyncio.get_running_loop().run_in_executor(None, sync_test)
+
+
+async def test_oversized_part_aborts_upload(client, mock_server,
+                                            monkeypatch):
+    server, user_calls = await mock_server
+    await intercept_requests(server, monkeypatch)
+    monkeypatch.setattr('yacut.streaming.MAX_ONE_FILE', 1000)
+    monkeypatch.setattr('yacut.streaming.READ_SIZE', 256)
+
+    def sync_test():
+        response = _post(client, _body(_part('big.png', b'x' * 5000)))
+        assert response.status_code == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+        assert 'big.png' in response.get_json()['message']
+        assert 'stored' not in user_calls, (
+            'Загрузка части сверх MAX_ONE_FILE должна прерываться.'
+        )
+
+    await asyncio.get_running_loop().run_in_executor(None, sync_test)
@@ -0,0 +1,169 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from io import BytesIO
+
+import pytest
+
+from yacut import db, yandexdisk
+from yacut.jobs import run_once
+from yacut.models import UploadJob
+from yacut.yandexdisk import Uploaded
+
+
+@pytest.fixture
+def uploads(_app, tmp_path, monkeypatch):
+    """Подменяет загрузку на Диск; `failures` — сколько раз файл упадёт."""
+    monkeypatch.setitem(_app.config, 'UPLOAD_STAGING_DIR', str(tmp_path))
+    monkeypatch.setitem(_app.config, 'UPLOAD_JOB_RETRY_DELAY', 0)
+    state = {'calls': [], 'failures': {}, 'delay': 0}
+
+    async def fake_upload(session, file_storage, owner, reservation=None):
+        name = file_storage.filename
+        state['calls'].append((name, file_storage.stream.read()))
+        await asyncio.sleep(state['delay'])
+        if state['failures'].get(name, 0):
+            state['failures'][name] -= 1
+            raise RuntimeError('Диск ответил ошибкой')
+        return Uploaded(f'https://disk.example/{name}', f'app:/{name}')
+
+    monkeypatch.setattr(yandexdisk, '_upload_one', fake_upload)
+    state['staging'] = tmp_path
+    return state
+
+
+def _post_job(client, *names):
+    return client.post('/api/jobs/', data={'files': [
+        (BytesIO(name.encode()), name) for name in names]})
+
+
+def _job(client, job_id):
+    return client.get(f'/api/jobs/{job_id}').get_json()
+
+
+def test_job_is_processed_in_background(client, uploads):
+    response = _post_job(client, 'a.png', 'b.txt')
+    assert response.status_code == 202, (
+        'Постановка задания должна возвращать статус 202.'
+    )
+    job = response.get_json()
+    assert job['status'] == UploadJob.QUEUED
+    assert job['status_url'].endswith(f'/api/jobs/{job["id"]}')
+    assert uploads['calls'] == [], (
+        'Запрос не должен сам загружать файлы на Диск.'
+    )
+    assert run_once() is True
+    assert sorted(uploads['calls']) == [('a.png', b'a.png'),
+                                        ('b.txt', b'b.txt')]
+    job = _job(client, job['id'])
+    assert job['status'] == UploadJob.DONE
+    for item in job['files']:
+        location = client.get(item['short_link']).headers['Location']
+        assert location == f'https://disk.example/{item["name"]}'
+    assert os.listdir(uploads['staging']) == [], (
+        'После завершения задания staging должен очищаться.'
+    )
+    assert run_once() is False
+
+
+def test_failed_file_is_retried_alone(client, uploads):
+    uploads['failures']['bad.png'] = 1
+    job_id = _post_job(client, 'bad.png', 'good.png').get_json()['id']
+    run_once()
+    job = _job(client, job_id)
+    assert job['status'] == UploadJob.QUEUED, (
+        'Задание с неудачным файлом должно вернуться в очередь.'
+    )
+    assert 'short_link' in job['files'][1]
+    assert 'error' in job['files'][0]
+    uploads['calls'].clear()
+    run_once()
+    assert [name for name, _ in uploads['calls']] == ['bad.png'], (
+        'Повтор должен загружать только файлы без ссылки.'
+    )
+    job = _job(client, job_id)
+    assert job['status'] == UploadJob.DONE
+    assert job['attempts'] == 2
+    assert all('short_link' in item for item in job['files'])
+
+
+def test_expired_lease_is_reclaimed(client, uploads):
+    job_id = _post_job(client, 'a.png').get_json()['id']
+    crashed = UploadJob.claim(lease=60)
+    assert crashed.id == job_id
+    assert run_once() is False, (
+        'Задание с живой арендой не должен забирать другой воркер.'
+    )
+    db.session.execute(UploadJob.__table__.update().values(
+        lease_until=datetime.utcnow() - timedelta(seconds=1)))
+    db.session.commit()
+    stale_token = crashed.lease_token
+    assert run_once() is True
+    assert _job(client, job_id)['status'] == UploadJob.DONE
+    crashed.lease_token = stale_token
+    assert crashed.renew(60) is False, (
+        'Упавший воркер не должен менять задание после потери аренды.'
+    )
+
+
+def test_job_fails_when_attempts_exhausted(client, uploads, monkeypatch):
+    monkeypatch.setitem(client.application.config, 'UPLOAD_JOB_ATTEMPTS', 2)
+    uploads['failures']['bad.png'] = 10
+    job_id = _post_job(client, 'bad.png').get_json()['id']
+    while run_once():
+        pass
+    job = _job(client, job_id)
+    assert job['status'] == UploadJob.FAILED
+    assert job['attempts'] == 2
+    assert job['files'][0]['error'] == 'Не удалось загрузить файл'
+    assert os.listdir(uploads['staging']) == []
+
+
+def test_upload_worker_cli(client, uploads, cli_runner):
+    _post_job(client, 'a.png')
+    _post_job(client, 'b.png')
+    result = cli_runner.invoke(args=['upload-worker', '--once'])
+    assert result.exit_code == 0, result.output
+    assert 'Обработано заданий: 2.' in result.output
+
+
+def test_job_api_errors(client, uploads):
+    response = client.get('/api/jobs/unknown')
+    assert response.status_code == 404
+    assert response.get_json() == {'message': 'Задание не найдено'}
+    response = _post_job(client, 'script.exe')
+    assert response.status_code == 400
+    assert UploadJob.query.count() == 0
+    response = client.post('/api/jobs/', data={})
+    assert response.status_code == 400
+
+
+def test_form_can_enqueue_background_upload(client, uploads):
+    response = client.post('/files', data={
+        'files': [(BytesIO(b'data'), 'a.png')], 'background': 'y'})
+    assert response.status_code == 202
+    job = UploadJob.query.one()
+    assert job.id in response.get_data(as_text=True), (
+        'Страница должна показывать поставленное задание.'
+    )
+    assert uploads['calls'] == []
+
+
+def test_lease_is_renewed_while_file_uploads(client, uploads, monkeypatch):
+    config = client.application.config
+    monkeypatch.setitem(config, 'UPLOAD_JOB_HEARTBEAT', 0.05)
+    uploads['delay'] = 0.3
+    renewals = []
+    renew = UploadJob.renew
+
+    def recording_renew(job, lease):
+        renewals.append(job.entries[0].get('link'))
+        return renew(job, lease)
+
+    monkeypatch.setattr(UploadJob, 'renew', recording_renew)
+    job_id = _post_job(client, 'slow.png').get_json()['id']
+    assert run_once() is True
+    assert renewals.count(None) >= 2, (
+        'Аренда должна продлеваться по таймеру, пока файл ещё загружается.'
+    )
+    assert _job(client, job_id)['status'] == UploadJob.DONE
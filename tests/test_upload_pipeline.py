@@ -0,0 +1,75 @@
+import asyncio
+import json
+import re
+from concurrent.futures import Future
+from io import BytesIO
+
+from yacut import yandexdisk
+from yacut.yandexdisk import UploadResult, Uploaded, iter_completed
+
+DELAYS = {'slow.png': 0.2, 'bad.png': 0.05, 'fast.png': 0}
+
+
+async def fake_upload(session, file_storage, owner, reservation=None):
+    await asyncio.sleep(DELAYS[file_storage.filename])
+    if file_storage.filename == 'bad.png':
+        raise RuntimeError('Диск ответил ошибкой')
+    return Uploaded(f'https://disk.example/{file_storage.filename}',
+                    f'app:/{file_storage.filename}')
+
+
+def _post_files(client, **kwargs):
+    return client.post('/files', data={'files': [
+        (BytesIO(b'data'), name) for name in DELAYS]}, **kwargs)
+
+
+def test_results_follow_completion_order():
+    # Каждый результат забирается сразу после завершения его загрузки:
+    # порядок двух уже завершённых futures в as_completed не определён.
+    first, second = Future(), Future()
+    pending = {first: (0, 'a.png'), second: (1, 'b.png')}
+    completed = iter_completed(pending)
+    second.set_result(Uploaded('https://disk.example/b.png', 'app:/b.png'))
+    results = [next(completed)]
+    first.set_exception(RuntimeError('сбой'))
+    results.append(next(completed))
+    assert next(completed, None) is None
+    assert [result.index for result in results] == [1, 0]
+    assert results[0] == UploadResult(1, 'b.png',
+                                      link='https://disk.example/b.png',
+                                      remote_path='app:/b.png')
+    assert isinstance(results[1].error, RuntimeError)
+
+
+def test_failed_file_does_not_shift_names(client, monkeypatch):
+    monkeypatch.setattr(yandexdisk, '_upload_one', fake_upload)
+    page = _post_files(client).get_data(as_text=True)
+    links = dict(
+        (name, short) for short, name in
+        re.findall(r'<a href="([^"]+)"[^>]*>([^<]+)</a>', page)
+        if name in DELAYS)
+    assert set(links) == {'slow.png', 'fast.png'}
+    for name, short in links.items():
+        location = client.get(short).headers['Location']
+        assert location == f'https://disk.example/{name}', (
+            'Короткая ссылка должна вести на файл с тем же именем, даже '
+            'если соседний файл не загрузился.'
+        )
+    assert 'bad.png: Не удалось загрузить файл' in page
+
+
+def test_event_stream_reports_files_as_they_complete(client, monkeypatch):
+    monkeypatch.setattr(yandexdisk, '_upload_one', fake_upload)
+    response = _post_files(client, headers={'Accept': 'text/event-stream'})
+    assert response.mimetype == 'text/event-stream'
+    events = [
+        (block.split('\n')[0][len('event: '):],
+         json.loads(block.split('\n')[1][len('data: '):]))
+        for block in response.get_data(as_text=True).strip().split('\n\n')]
+    assert [data.get('name') for _, data in events[:3]] == [
+        'fast.png', 'bad.png', 'slow.png'], (
+        'События должны приходить по мере готовности файлов.'
+    )
+    assert events[0][1]['index'] == 2 and 'short' in events[0][1]
+    assert 'error' in events[1][1]
+    assert events[-1] == ('done', {'uploaded': 2, 'failed': 1})
@@ -0,0 +1,103 @@
+import asyncio
+from http import HTTPStatus
+from io import BytesIO
+
+import pytest
+
+from tests.conftest import generate_png_bytes
+from yacut import yandexdisk
+from yacut.scheduler import UploadBusy, UploadScheduler
+
+
+async def _run_owners(scheduler, owners):
+    order = []
+    gate = asyncio.Event()
+
+    async def upload(owner, index):
+        async with scheduler.slot(owner):
+            if owner == 'blocker':
+                await gate.wait()
+            order.append(f'{owner}{index}')
+
+    tasks = [asyncio.create_task(upload('blocker', 0))]
+    await asyncio.sleep(0)
+    for owner, files in owners:
+        tasks += [asyncio.create_task(upload(owner, index))
+                  for index in range(files)]
+    await asyncio.sleep(0)
+    gate.set()
+    await asyncio.gather(*tasks)
+    return order[1:]
+
+
+def test_round_robin_between_owners():
+    scheduler = UploadScheduler(concurrency=1, max_queue=10)
+    order = asyncio.run(_run_owners(scheduler, [('a', 3), ('b', 1)]))
+    assert order == ['a0', 'b0', 'a1', 'a2'], (
+        'Свободный слот должен доставаться следующему запросу по кругу, '
+        'а не следующему файлу того же запроса.'
+    )
+    stats = scheduler.stats()
+    assert stats['queue_wait_count'] == 5
+    assert stats['active'] == stats['waiting'] == 0
+
+
+def test_admit_rejects_when_queue_is_full():
+    scheduler = UploadScheduler(concurrency=2, max_queue=3)
+    scheduler.admit(5)
+    with pytest.raises(UploadBusy):
+        scheduler.admit(6)
+    assert scheduler.stats()['rejected'] == 6
+
+
+def test_cancelled_waiter_leaves_queue():
+    scheduler = UploadScheduler(concurrency=1, max_queue=10)
+
+    async def scenario():
+        async with scheduler.slot('a'):
+            waiter = asyncio.create_task(scheduler._acquire('b'))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats['waiting'] == 0 and stats['active'] == 0, (
+        'Отменённое ожидание не должно занимать место в очереди.'
+    )
+
+
+def test_upload_view_busy(client, monkeypatch):
+    monkeypatch.setattr(yandexdisk.upload_scheduler, 'concurrency', 1)
+    monkeypatch.setattr(yandexdisk.upload_scheduler, 'max_queue', 0)
+    response = client.post('/files', data={'files': [
+        (BytesIO(generate_png_bytes()), 'a.png'),
+        (BytesIO(generate_png_bytes()), 'b.png'),
+    ]})
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE, (
+        'При переполненной очереди загрузок страница должна сразу '
+        'отвечать 503, не дожидаясь свободного слота.'
+    )
+    assert 'перегружен' in response.data.decode()
+
+
+def test_admit_reserves_queue_until_upload_is_queued():
+    scheduler = UploadScheduler(concurrency=1, max_queue=1)
+    first, second = scheduler.admit(2)
+    with pytest.raises(UploadBusy):
+        scheduler.admit(1)
+    second.release()
+    assert scheduler.stats()['reserved'] == 1, (
+        'Место загрузки, отменённой до очереди, должно освобождаться.'
+    )
+
+    async def scenario():
+        async with scheduler.slot('a', first):
+            return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats['reserved'] == 0 and stats['active'] == 1, (
+        'Зарезервированное место должно переходить в слот загрузки.'
+    )
+    first.release()
+    assert scheduler.stats()['reserved'] == 0
@@ -1,7 +1,9 @@
-import aiohttp
+import asyncio
 import re
+
+import aiohttp
 from contextlib import suppress
-from hashlib import md5
+from hashlib import md5, sha256
 from urllib.parse import unquote, quote
 
 import pytest
@@ -10,6 +12,8 @@ from aiohttp import web
 REQUEST_UPLOAD_URL = '/v1/disk/resources/upload'
 UPLOAD_URL = '/upload-target'
 DOWNLOAD_LINK_URL = '/v1/disk/resources/download'
+RESOURCES_URL = '/v1/disk/resources'
+PUBLISH_URL = '/v1/disk/resources/publish'
 
 COMMON_ASSERT_MSG_FOR_UPLOAD_FILES = (
     'Убедитесь, что для загрузки полученных файлов на Яндекс Диск `'
@@ -17,22 +21,50 @@ COMMON_ASSERT_MSG_FOR_UPLOAD_FILES = (
     f'1. GET-запрос к эндпоинту `{REQUEST_UPLOAD_URL}` для получения '
     'ссылки для загрузки файла;\n'
     f'2. PUT-запрос к эндпоинту `{UPLOAD_URL}` для загрузки файла;\n'
-    f'3. GET-запрос к эндпоинту `{DOWNLOAD_LINK_URL}` для получения '
-    'ссылки для скачивания файла.'
+    f'3. при переходе по короткой ссылке — GET-запрос к эндпоинту '
+    f'`{DOWNLOAD_LINK_URL}` для получения ссылки для скачивания файла.'
 )
 
+# Токены аккаунтов мок-сервера `multi_account_mock_server`.
+MULTI_TOKENS = ('y0_first_account_token', 'y0_second_account_token')
 
-@pytest.fixture
-async def mock_server(aiohttp_server):
-    """Возвращает мок-сервер для проверки работы с API Я.Диска."""
-    user_calls = set()
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'PUT',
+    'Access-Control-Allow-Headers': 'Content-Type',
+}
+
+
+def build_mock_app(user_calls, middlewares=(), accounts=None):
+    """
+    Собирает приложение мок-сервера API Я.Диска.
+
+    `accounts` — {токен: {'total_space': байты}}: тогда сервер принимает
+    только эти токены, хранит файлы каждого аккаунта отдельно и ведёт в
+    словаре аккаунта `used_space` и число загрузок `uploads`. Аккаунту с
+    `retry_after` ссылка на загрузку не выдаётся: ответ 429, счётчик
+    таких ответов — `throttled`.
+    """
     file_names = {}
+    uploaded = {}
+    published = set()
 
     async def check_headers(path, headers):
         assert 'Authorization' in headers, (
             'Убедитесь, что в запросе к эндпоинту Яндекс Диска '
             f'`{path}` передаётся заголовок `Authorization` с токеном доступа.'
         )
+        token = headers['Authorization'].partition(' ')[2]
+        if accounts is not None and token not in accounts:
+            return None
+        return token
+
+    def file_key(request, token):
+        """Файлы разных аккаунтов с одним путём — разные файлы."""
+        return md5(f'{token}:{request.query["path"]}'.encode()).hexdigest()
+
+    def unauthorized():
+        return web.json_response({'error': 'UnauthorizedError'}, status=401)
 
     async def handle_fields_param(request, response_data):
         fields_query_param = request.query.get('fields')
@@ -47,7 +79,9 @@ async def mock_server(aiohttp_server):
     async def get_upload_link_handler(request):
         """Обработчик для запросов на получение ссылки для загрузки файлов."""
         user_calls.add('get_upload_link')
-        await check_headers(request.path, request.headers)
+        token = await check_headers(request.path, request.headers)
+        if token is None:
+            return unauthorized()
         assert 'path' in request.query, (
             'Убедитесь, что в запросе к эндпоинту Яндекс Диска '
             'для получения ссылки для загрузки файла '
@@ -62,8 +96,17 @@ async def mock_server(aiohttp_server):
             'путь в параметре `path` содержит символ `/` перед именем файла.'
         )
         file_name = path_param.split('/')[-1]
-        path_hash = md5(request.query['path'].encode()).hexdigest()
-        file_names[path_hash] = file_name
+        account = accounts and accounts[token]
+        if account and 'retry_after' in account:
+            account['throttled'] = account.get('throttled', 0) + 1
+            return web.json_response(
+                {'error': 'TooManyRequestsError'}, status=429,
+                headers={'Retry-After': account['retry_after']})
+        if account and account.get('used_space', 0) >= account['total_space']:
+            return web.json_response(
+                {'error': 'DiskInsufficientStorageError'}, status=507)
+        path_hash = file_key(request, token)
+        file_names[path_hash] = (token, file_name)
 
         link = f'http://{request.host}{UPLOAD_URL}/{path_hash}'
         response_data = await handle_fields_param(
@@ -84,22 +127,39 @@ async def mock_server(aiohttp_server):
             'Убедитесь, что PUT-запрос на загрузку файла на Яндекс Диск '
             'содержит загружаемые данные.'
         )
-        location_header = '/disk/{}'.format(
-            quote(file_names[request.url.name])
-        )
-        return web.Response(headers={'Location': location_header}, status=201)
+        token, file_name = file_names[request.url.name]
+        location_header = '/disk/{}'.format(quote(file_name))
+        uploaded[request.url.name] = request_data
+        if accounts:
+            account = accounts[token]
+            account['used_space'] = (
+                account.get('used_space', 0) + len(request_data))
+            account['uploads'] = account.get('uploads', 0) + 1
+        user_calls.add('stored')
+        return web.Response(
+            headers={'Location': location_header, **CORS_HEADERS},
+            status=201)
+
+    async def upload_preflight_handler(request):
+        """Обработчик CORS-запроса браузера перед загрузкой файла."""
+        return web.Response(headers=CORS_HEADERS, status=200)
 
     async def mock_get_download_link_handler(request):
         """Обработчик для запросов на получение ссылки для скачивания файла."""
         user_calls.add('get_download_link')
-        await check_headers(request.path, request.headers)
+        token = await check_headers(request.path, request.headers)
+        if token is None:
+            return unauthorized()
         assert 'path' in request.query, (
             'Убедитесь, что при отправке запроса к эндпоинту Яндекс Диска '
             'для получения ссылки на скачивание файла '
             f'(`{DOWNLOAD_LINK_URL}`) передаётся параметр запроса `path` с '
             'путем к скачиваемому файлу.'
         )
-        path_hash = md5(request.query['path'].encode()).hexdigest()
+        path_hash = file_key(request, token)
+        if path_hash not in uploaded:
+            return web.json_response(
+                {'error': 'DiskNotFoundError'}, status=404)
         link = f'http://{request.host}disk/{path_hash}'
         response_data = await handle_fields_param(
             request,
@@ -111,40 +171,182 @@ async def mock_server(aiohttp_server):
         )
         return web.json_response(response_data, status=200)
 
+    async def resource_handler(request):
+        """Обработчик для запросов метаданных и удаления файла."""
+        token = await check_headers(request.path, request.headers)
+        if token is None:
+            return unauthorized()
+        path_hash = file_key(request, token)
+        if path_hash not in uploaded:
+            return web.json_response(
+                {'error': 'DiskNotFoundError'}, status=404)
+        if request.method == 'DELETE':
+            user_calls.add('delete')
+            del uploaded[path_hash]
+            return web.Response(status=204)
+        data = uploaded[path_hash]
+        resource = {
+            'path': request.query['path'],
+            'size': len(data),
+            'md5': md5(data).hexdigest(),
+            'sha256': sha256(data).hexdigest(),
+        }
+        if path_hash in published:
+            resource['public_url'] = f'https://yadi.sk/d/{path_hash}'
+        response_data = await handle_fields_param(request, resource)
+        return web.json_response(response_data, status=200)
+
+    async def publish_handler(request):
+        """Обработчик для запросов на публикацию файла."""
+        user_calls.add('publish')
+        token = await check_headers(request.path, request.headers)
+        if token is None:
+            return unauthorized()
+        path_hash = file_key(request, token)
+        if path_hash not in uploaded:
+            return web.json_response(
+                {'error': 'DiskNotFoundError'}, status=404)
+        published.add(path_hash)
+        return web.json_response({'href': '', 'method': 'GET'}, status=200)
+
     async def disk_info_handler(request):
         """Обработчик для запроса информации о Я.Диске."""
-        return web.json_response(
-            {
-                'is_paid': True,
-                'max_file_size': 53687091200,
-                'paid_max_file_size': 53687091200,
-                'reg_time': '2016-08-28T08:00:34+00:00',
-                'revision': 1718044099614274,
-                'system_folders': {'applications': 'disk:/Приложения'},
-                'total_space': 2478196129792,
-                'trash_size': 1574013,
-                'unlimited_autoupload_enabled': False,
-                'used_space': 20888456034
-            },
-            status=200
-        )
+        user_calls.add('disk_info')
+        token = await check_headers(request.path, request.headers)
+        if token is None:
+            return unauthorized()
+        info = {
+            'is_paid': True,
+            'max_file_size': 53687091200,
+            'paid_max_file_size': 53687091200,
+            'reg_time': '2016-08-28T08:00:34+00:00',
+            'revision': 1718044099614274,
+            'system_folders': {'applications': 'disk:/Приложения'},
+            'total_space': 2478196129792,
+            'trash_size': 1574013,
+            'unlimited_autoupload_enabled': False,
+            'used_space': 20888456034
+        }
+        if accounts:
+            info['total_space'] = accounts[token]['total_space']
+            info['used_space'] = accounts[token].get('used_space', 0)
+        response_data = await handle_fields_param(request, info)
+        return web.json_response(response_data, status=200)
 
     async def catch_all_handler(request):
         """Обработчик для любых других запросов."""
         raise AssertionError(COMMON_ASSERT_MSG_FOR_UPLOAD_FILES)
 
-    app = web.Application()
+    app = web.Application(middlewares=list(middlewares))
     app.router.add_get(REQUEST_UPLOAD_URL, get_upload_link_handler)
     app.router.add_put(UPLOAD_URL + '/{path_hash}', mock_upload_handler)
+    app.router.add_route('OPTIONS', UPLOAD_URL + '/{path_hash}',
+                         upload_preflight_handler)
     app.router.add_get(DOWNLOAD_LINK_URL, mock_get_download_link_handler)
+    app.router.add_get(RESOURCES_URL, resource_handler)
+    app.router.add_delete(RESOURCES_URL, resource_handler)
+    app.router.add_put(PUBLISH_URL, publish_handler)
 
     app.router.add_get('/v1/disk/', disk_info_handler)
     app.router.add_route('*', '/{tail:.*}', catch_all_handler)
 
-    server = await aiohttp_server(app)
+    return app
+
+
+class Throttle:
+    """
+    Имитирует ограничение частоты запросов API Я.Диска: отвечает 429
+    с заголовком Retry-After, если одновременных запросов уже `capacity`.
+    """
+
+    def __init__(self, capacity, retry_after='0', delay=0.02):
+        self.capacity = capacity
+        self.retry_after = retry_after
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.throttled = 0
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        if self.in_flight >= self.capacity:
+            self.throttled += 1
+            return web.json_response(
+                {'error': 'TooManyRequestsError'}, status=429,
+                headers={'Retry-After': self.retry_after})
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            return await handler(request)
+        finally:
+            self.in_flight -= 1
+
+
+class Flaky:
+    """
+    Имитирует нестабильный API Я.Диска: первые `failures` запросов к
+    каждому адресу получают 500, а первый GET-запрос может «зависнуть»
+    на `stall` секунд.
+    """
+
+    def __init__(self, failures=1, stall=0):
+        self.failures = failures
+        self.stall = stall
+        self.calls = {}
+        self.failed = 0
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        key = (request.method, request.path_qs)
+        number = self.calls[key] = self.calls.get(key, 0) + 1
+        if number <= self.failures:
+            self.failed += 1
+            return web.json_response(
+                {'error': 'InternalServerError'}, status=500)
+        if number == 1 and self.stall and request.method == 'GET':
+            await asyncio.sleep(self.stall)
+        return await handler(request)
+
+
+@pytest.fixture
+async def mock_server(aiohttp_server):
+    """Возвращает мок-сервер для проверки работы с API Я.Диска."""
+    user_calls = set()
+    server = await aiohttp_server(build_mock_app(user_calls))
     return server, user_calls
 
 
+@pytest.fixture
+async def multi_account_mock_server(aiohttp_server):
+    """
+    Мок-сервер API Я.Диска с двумя аккаунтами; возвращает также словарь
+    аккаунтов, где видно, сколько файлов загружено на каждый.
+    """
+    user_calls = set()
+    accounts = {token: {'total_space': 10 ** 9} for token in MULTI_TOKENS}
+    server = await aiohttp_server(
+        build_mock_app(user_calls, accounts=accounts))
+    return server, user_calls, accounts
+
+
+@pytest.fixture
+async def throttled_mock_server(aiohttp_server):
+    """Мок-сервер API Я.Диска, который пропускает два запроса за раз."""
+    throttle = Throttle(capacity=2)
+    server = await aiohttp_server(
+        build_mock_app(set(), [throttle.middleware]))
+    return server, throttle
+
+
+@pytest.fixture
+async def flaky_mock_server(aiohttp_server):
+    """Мок-сервер API Я.Диска, который отвечает 500 на первый запрос."""
+    flaky = Flaky()
+    server = await aiohttp_server(build_mock_app(set(), [flaky.middleware]))
+    return server, flaky
+
+
 async def intercept_requests(mock_server, monkeypatch):
     """Перехватывает запросы к API Я.Диска, используя мок-сервер."""
     def substitute_host(url):
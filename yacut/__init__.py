@@ -3,14 +3,16 @@ from flask import Flask
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 from settings import Config
+from .cache import make_cache
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
+slug_cache = make_cache(app.config)
 
 from . import models
 
 from . import error_handlers
-from . import views, api_views
+from . import views, api_views, cli
@@ -0,0 +1,212 @@
+"""
+Пул аккаунтов Яндекс Диска для загрузок.
+
+Новый файл уходит на исправный аккаунт, наименее загруженный
+относительно его адаптивного лимита, а при равенстве — с наибольшим
+свободным местом. Лимит и пауза по Retry-After у каждого аккаунта свои:
+ответ 429 одного аккаунта не тормозит загрузки на остальные. Аккаунт
+записывается в путь файла (`имя@app:/...`), чтобы потом разрешать
+ссылку тем же токеном; у файлов первого аккаунта путь остаётся без
+имени, как до появления пула.
+"""
+import re
+import threading
+import time
+from typing import Iterable, List, Mapping, Optional, Tuple
+
+from .resilience import CircuitBreaker, CircuitOpen
+from .scheduler import AimdLimit
+
+DISK_PATH_PREFIX = 'app:/'
+ACCOUNT_NAME_RE = re.compile(r'[\w-]+')
+LOCATION_RE = re.compile(r'([\w-]+)@(app:/.*)', re.DOTALL)
+NO_ACCOUNTS_MESSAGE = (
+    'Нет доступных аккаунтов Яндекс Диска. Повторите попытку позже.')
+
+
+def is_location(value: str) -> bool:
+    """Путь файла на Диске (возможно, с аккаунтом), а не URL."""
+    return (value.startswith(DISK_PATH_PREFIX)
+            or LOCATION_RE.fullmatch(value) is not None)
+
+
+def parse_tokens(value: str) -> List[Tuple[str, str]]:
+    """
+    Пары (имя, токен) из `DISK_TOKENS`: записи `имя=токен` через
+    запятую или пробел; у записи без имени имя — `diskN` по позиции.
+    """
+    accounts = []
+    entries = (entry for entry in re.split(r'[\s,]+', value or '') if entry)
+    for position, entry in enumerate(entries, 1):
+        name, _, token = entry.rpartition('=')
+        name = name or f'disk{position}'
+        if not ACCOUNT_NAME_RE.fullmatch(name) or not token:
+            raise ValueError(f'Некорректная запись DISK_TOKENS: {name!r}')
+        if name in dict(accounts):
+            raise ValueError(f'Аккаунт {name!r} указан в DISK_TOKENS дважды')
+        accounts.append((name, token))
+    return accounts
+
+
+class DiskAccount:
+    """
+    Аккаунт пула: заголовок авторизации, здоровье, адаптивный лимит
+    и свободное место.
+    """
+
+    def __init__(self, name: str, token: str, breaker: CircuitBreaker,
+                 limit: AimdLimit):
+        self.name = name
+        self.headers = {'Authorization': f'OAuth {token}'}
+        self.health = breaker
+        self.limit = limit
+        self.reset()
+
+    def reset(self) -> None:
+        self.health.reset()
+        self.limit.reset()
+        self.in_flight = 0
+        self.uploads = 0
+        self.free_space: Optional[int] = None
+        self.space_checked: Optional[float] = None
+
+    def load(self) -> float:
+        return self.in_flight / self.limit.limit
+
+    def healthy(self) -> bool:
+        if self.limit.delay():
+            # Аккаунт попросил подождать (Retry-After).
+            return False
+        try:
+            self.health.check()
+        except CircuitOpen:
+            return False
+        return True
+
+    def on_failure(self, status: int) -> None:
+        self.health.on_failure()
+        if status == 507:
+            # Место кончилось: до следующей проверки аккаунт не выбирается.
+            self.free_space = 0
+            self.space_checked = time.monotonic()
+
+    def stats(self) -> dict:
+        return dict(self.health.stats(), in_flight=self.in_flight,
+                    uploads=self.uploads, free_space=self.free_space,
+                    adaptive=self.limit.stats())
+
+
+class AccountPool:
+    """
+    Аккаунты из `DISK_TOKENS` (или один из `DISK_TOKEN`) и выбор
+    аккаунта для загрузки. Свободное место проверяется раз в
+    `space_ttl` секунд; аккаунт, где его меньше `min_free_space`, или
+    аккаунт, который раз за разом отказывает или просит подождать, не
+    выбирается. С одним аккаунтом выбора нет, и ничего из этого не
+    делается: его 429 учитывает общий лимит загрузок.
+    """
+
+    def __init__(self, tokens: Iterable[Tuple[str, str]],
+                 min_free_space: int = 0, space_ttl: float = 300.0,
+                 threshold: int = 5, reset_timeout: float = 30.0,
+                 concurrency: int = 4, min_concurrency: int = 1,
+                 max_concurrency: int = 32):
+        self.accounts = [
+            DiskAccount(name, token, CircuitBreaker(threshold, reset_timeout),
+                        AimdLimit(None, min_concurrency,
+                                  max(concurrency, max_concurrency),
+                                  initial_limit=concurrency))
+            for name, token in tokens]
+        self._by_name = {account.name: account for account in self.accounts}
+        self.min_free_space = min_free_space
+        self.space_ttl = space_ttl
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.accounts)
+
+    def reset(self) -> None:
+        with self._lock:
+            for account in self.accounts:
+                account.reset()
+
+    def location(self, account: DiskAccount, remote_path: str) -> str:
+        """Путь файла вместе с аккаунтом, где он хранится."""
+        if account is self.accounts[0]:
+            return remote_path
+        return f'{account.name}@{remote_path}'
+
+    def locate(self, location: str) -> Tuple[DiskAccount, str]:
+        """(аккаунт, путь на его Диске) по пути из `location`."""
+        if location.startswith(DISK_PATH_PREFIX):
+            return self.accounts[0], location
+        match = LOCATION_RE.fullmatch(location)
+        if match is None or match.group(1) not in self._by_name:
+            raise RuntimeError(
+                f'Аккаунт Диска для {location!r} не настроен')
+        return self._by_name[match.group(1)], match.group(2)
+
+    def _usable(self, account: DiskAccount) -> bool:
+        if len(self.accounts) == 1:
+            # Выбирать не из чего: сбои одного аккаунта остаются делом
+            # `disk_breaker` и адаптивного лимита.
+            return True
+        if account.free_space is not None and (
+                account.free_space < self.min_free_space):
+            return False
+        return account.healthy()
+
+    def check(self) -> None:
+        """Поднимает CircuitOpen, если ни один аккаунт не годится."""
+        with self._lock:
+            if not any(map(self._usable, self.accounts)):
+                raise CircuitOpen(NO_ACCOUNTS_MESSAGE)
+
+    def acquire(self, exclude: Iterable[DiskAccount] = ()) -> DiskAccount:
+        """
+        Наименее загруженный исправный аккаунт не из `exclude`; его
+        счётчик загрузок растёт до `release`.
+        """
+        with self._lock:
+            candidates = [account for account in self.accounts
+                          if account not in exclude and self._usable(account)]
+            if not candidates:
+                raise CircuitOpen(NO_ACCOUNTS_MESSAGE)
+            account = min(candidates, key=lambda account: (
+                account.load(), -(account.free_space or 0)))
+            account.in_flight += 1
+            account.uploads += 1
+            return account
+
+    def release(self, account: DiskAccount) -> None:
+        with self._lock:
+            account.in_flight -= 1
+
+    def claim_stale(self) -> List[DiskAccount]:
+        """
+        Аккаунты, чьё свободное место пора проверить; отметка ставится
+        сразу, чтобы одновременные загрузки не проверяли их повторно.
+        """
+        if len(self.accounts) < 2:
+            return []
+        now = time.monotonic()
+        with self._lock:
+            stale = [account for account in self.accounts
+                     if account.space_checked is None
+                     or now - account.space_checked >= self.space_ttl]
+            for account in stale:
+                account.space_checked = now
+            return stale
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {account.name: account.stats()
+                    for account in self.accounts}
+
+
+def make_account_pool(config: Mapping, **options) -> AccountPool:
+    """Пул из `DISK_TOKENS` конфигурации, а без него — из `DISK_TOKEN`."""
+    tokens = parse_tokens(config.get('DISK_TOKENS'))
+    if not tokens and config.get('DISK_TOKEN'):
+        tokens = [('main', config['DISK_TOKEN'])]
+    return AccountPool(tokens, **options)
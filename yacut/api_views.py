@@ -1,8 +1,51 @@
-from flask import jsonify, request, url_for
+import base64
+import binascii
+import hmac
+from datetime import datetime, timedelta
+from functools import wraps
+from typing import List, Optional, Tuple
 
-from . import app
+from aiohttp import ClientResponseError
+from flask import Response, jsonify, request, stream_with_context, url_for
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from . import app, db, slug_cache
+from .bulk import FORMATS, MIMETYPES, export_lines
+from .clicks import pending_clicks
+from .dedup import link_results
 from .error_handlers import InvalidAPIUsage
-from .models import URLMap, SlugConflict, SlugInvalid, UrlInvalid
+from .forms import MAX_FILES, MAX_ONE_FILE, file_size
+from .jobs import enqueue_upload, purge_expired_slots
+from .models import (ClickRollup, DiskFile, URLMap, SlugConflict,
+                     SlugInvalid, UploadJob, UploadSlot, UrlInvalid)
+from .resilience import CircuitOpen
+from .scheduler import UploadBusy
+from .streaming import UploadRejected, check_file, stream_uploads
+from .yandexdisk import (UploadResult, UploadTooLarge, disk_client,
+                         download_links, is_disk_path, iter_completed,
+                         request_upload_slots, resolve_uploads)
+
+STATS_DEFAULT_PERIOD = timedelta(days=7)
+LIST_DEFAULT_LIMIT = 50
+LIST_MAX_LIMIT = 1000
+HOST_MATCHES = ('exact', 'suffix')
+
+
+def admin_required(view):
+    """Пускает только запросы с `Authorization: Bearer <ADMIN_TOKEN>`."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = app.config['ADMIN_TOKEN']
+        if not token:
+            raise InvalidAPIUsage('Административный API отключён',
+                                  status_code=403)
+        scheme, _, supplied = request.headers.get(
+            'Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(
+                supplied.strip().encode(), token.encode()):
+            raise InvalidAPIUsage('Требуется авторизация', status_code=401)
+        return view(*args, **kwargs)
+    return wrapper
 
 
 @app.route('/api/id/', methods=['POST'])
@@ -25,9 +68,448 @@ def add_url():
                                           _external=True)}), 201
 
 
+def _encode_cursor(row: dict) -> str:
+    raw = f"{row['timestamp'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        moment, _, row_id = raw.decode().partition('|')
+        return datetime.fromisoformat(moment), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidAPIUsage(
+            'Некорректное значение параметра "cursor"', status_code=400)
+
+
+def _parse_host_match(match) -> str:
+    if match not in HOST_MATCHES:
+        raise InvalidAPIUsage(
+            'Некорректное значение параметра "match"', status_code=400)
+    return match
+
+
+@app.route('/api/id/', methods=['GET'])
+@admin_required
+def list_urls():
+    limit = request.args.get('limit', LIST_DEFAULT_LIMIT, type=int)
+    if not 0 < limit <= LIST_MAX_LIMIT:
+        raise InvalidAPIUsage(
+            'Некорректное значение параметра "limit"', status_code=400)
+    match = _parse_host_match(request.args.get('match', 'exact'))
+    cursor = request.args.get('cursor')
+    after = _decode_cursor(cursor) if cursor else None
+    rows = URLMap.page(limit + 1, after=after, host=request.args.get('host'),
+                       suffix=match == 'suffix')
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = _encode_cursor(rows[limit - 1])
+    return jsonify({
+        'items': [dict(_link_json(row['original'], row['short']),
+                       **_stored_url(row['original']),
+                       timestamp=row['timestamp'].isoformat(),
+                       disabled=row['disabled'])
+                  for row in rows[:limit]],
+        'next_cursor': next_cursor,
+    }), 200
+
+
+def _parse_batch_item(item) -> Optional[Tuple[str, Optional[str]]]:
+    if not isinstance(item, dict) or 'url' not in item:
+        return None
+    url, custom = item['url'], item.get('custom_id')
+    if not isinstance(url, str):
+        url = ''
+    if custom is not None and not isinstance(custom, str):
+        custom = '-'
+    return url, custom
+
+
+def _stored_url(original: str) -> dict:
+    # Путь на Диске — не URL; ссылку на скачивание листинг не запрашивает.
+    if is_disk_path(original):
+        return {'url': None, 'disk_path': original}
+    return {'url': original}
+
+
+def _link_json(original: str, short: str) -> dict:
+    return {'url': original,
+            'short_link': url_for('follow_short', short=short,
+                                  _external=True)}
+
+
+@app.route('/api/id/batch/', methods=['POST'])
+def add_urls_batch():
+    data = request.get_json(silent=True)
+    if data is None:
+        raise InvalidAPIUsage('Отсутствует тело запроса', status_code=400)
+    if not isinstance(data, list):
+        raise InvalidAPIUsage('Ожидается массив объектов', status_code=400)
+    limit = app.config['API_BATCH_LIMIT']
+    if len(data) > limit:
+        raise InvalidAPIUsage(f'Не более {limit} ссылок за один запрос',
+                              status_code=400)
+
+    items = [_parse_batch_item(item) for item in data]
+    results = iter(URLMap.create_many(item for item in items if item))
+    response = []
+    for item in items:
+        result = next(results) if item else None
+        if item is None:
+            response.append({'message': '"url" является обязательным полем!'})
+        elif isinstance(result, ValueError):
+            response.append({'message': str(result)})
+        else:
+            response.append(_link_json(*result))
+    return jsonify(response), 200
+
+
+@app.route('/api/id/resolve/', methods=['POST'])
+def resolve_short_ids():
+    data = request.get_json(silent=True)
+    if data is None:
+        raise InvalidAPIUsage('Отсутствует тело запроса', status_code=400)
+    if not isinstance(data, list) or not all(
+            isinstance(item, str) for item in data):
+        raise InvalidAPIUsage('Ожидается массив строк', status_code=400)
+    limit = app.config['API_BATCH_LIMIT']
+    if len(data) > limit:
+        raise InvalidAPIUsage(f'Не более {limit} ссылок за один запрос',
+                              status_code=400)
+    originals = URLMap.get_originals(data)
+    # Пути на Диске разрешаются так же, как при переходе; файл, ссылку
+    # на который получить не удалось, отдаётся как null.
+    hrefs = download_links.resolve_many(
+        [original for original in originals.values()
+         if original and is_disk_path(original)])
+    for short, original in originals.items():
+        if original in hrefs:
+            href = hrefs[original]
+            originals[short] = None if isinstance(href, Exception) else href
+    return jsonify(originals), 200
+
+
 @app.route('/api/id/<string:short_id>/', methods=['GET'])
 def get_original_url(short_id):
+    original = URLMap.get_original(short_id)
+    if original is None:
+        raise InvalidAPIUsage('Указанный id не найден', status_code=404)
+    if is_disk_path(original):
+        try:
+            original = download_links.resolve(original)
+        except CircuitOpen as e:
+            raise InvalidAPIUsage(str(e), status_code=503)
+        except Exception as e:
+            raise InvalidAPIUsage(_link_error(e), status_code=(
+                404 if isinstance(e, ClientResponseError)
+                and e.status == 404 else 503))
+    return jsonify({'url': original}), 200
+
+
+@app.route('/api/id/<string:short_id>/clicks/', methods=['GET'])
+def get_clicks(short_id):
+    row = URLMap.get_by_short(short_id)
+    if not row:
+        raise InvalidAPIUsage('Указанный id не найден', status_code=404)
+    return jsonify({'clicks': row.clicks + pending_clicks(row.short)})
+
+
+def _parse_datetime_arg(name: str) -> Optional[datetime]:
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise InvalidAPIUsage(
+            f'Некорректное значение параметра "{name}"', status_code=400)
+
+
+@app.route('/api/id/<string:short_id>/stats/', methods=['GET'])
+def get_stats(short_id):
     row = URLMap.get_by_short(short_id)
     if not row:
         raise InvalidAPIUsage('Указанный id не найден', status_code=404)
-    return jsonify({'url': row.original}), 200
+    granularity = request.args.get('granularity', 'hour')
+    if granularity not in ClickRollup.GRANULARITIES:
+        raise InvalidAPIUsage(
+            'Некорректное значение параметра "granularity"', status_code=400)
+    end = _parse_datetime_arg('to') or datetime.utcnow()
+    start = _parse_datetime_arg('from') or end - STATS_DEFAULT_PERIOD
+    points = ClickRollup.series(row.short, start, end, granularity)
+    return jsonify({
+        'short_id': row.short,
+        'granularity': granularity,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'points': [{'time': moment.isoformat(), 'clicks': clicks}
+                   for moment, clicks in points],
+    }), 200
+
+
+@app.route('/api/id/<string:short_id>/available/', methods=['GET'])
+def check_short_id(short_id):
+    try:
+        URLMap.validate_custom(short_id, check_unique=True)
+    except SlugInvalid as e:
+        raise InvalidAPIUsage(str(e), status_code=400)
+    except SlugConflict:
+        return jsonify({'available': False}), 200
+    return jsonify({'available': True}), 200
+
+
+@app.route('/api/export/', methods=['GET'])
+@admin_required
+def export_links():
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        raise InvalidAPIUsage(
+            'Некорректное значение параметра "format"', status_code=400)
+    rows = URLMap.iter_rows(since=_parse_datetime_arg('since'),
+                            batch_size=app.config['EXPORT_BATCH_SIZE'])
+    return Response(stream_with_context(export_lines(rows, fmt)),
+                    mimetype=MIMETYPES[fmt])
+
+
+@app.route('/api/admin/disable/', methods=['POST'])
+@admin_required
+def disable_host_links():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise InvalidAPIUsage('Отсутствует тело запроса', status_code=400)
+    host = data.get('host')
+    if not isinstance(host, str) or not host.strip('. '):
+        raise InvalidAPIUsage('"host" является обязательным полем!',
+                              status_code=400)
+    match = _parse_host_match(data.get('match', 'exact'))
+    disabled = URLMap.disable_matching(host, suffix=match == 'suffix')
+    return jsonify({'disabled': disabled}), 200
+
+
+@app.route('/api/cache/stats/', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    return jsonify(slug_cache.stats()), 200
+
+
+@app.route('/api/disk/stats/', methods=['GET'])
+@admin_required
+def get_disk_stats():
+    return jsonify(disk_client.stats()), 200
+
+
+def _uploaded_item(result: UploadResult, created) -> dict:
+    if created is None:
+        return {'name': result.name, 'error': 'Не удалось загрузить файл'}
+    if isinstance(created, ValueError):
+        return {'name': result.name, 'error': str(created)}
+    return {'name': result.name,
+            'short_link': _link_json(*created)['short_link']}
+
+
+@app.route('/api/files/', methods=['POST'])
+def upload_files_stream():
+    boundary = request.mimetype_params.get('boundary')
+    if request.mimetype != 'multipart/form-data' or not boundary:
+        raise InvalidAPIUsage('Ожидается тело multipart/form-data',
+                              status_code=400)
+    limit = app.config['MAX_CONTENT_LENGTH']
+    if limit and (request.content_length or 0) > limit:
+        raise InvalidAPIUsage('Слишком большой запрос', status_code=413)
+    try:
+        uploads = stream_uploads(request.stream, boundary.encode(),
+                                 owner=object())
+    except UploadRejected as e:
+        raise InvalidAPIUsage(str(e), status_code=e.status_code)
+    except (UploadBusy, CircuitOpen) as e:
+        raise InvalidAPIUsage(str(e), status_code=503)
+    if not uploads:
+        raise InvalidAPIUsage('Необходимо загрузить хотя бы один файл',
+                              status_code=400)
+    results = sorted(iter_completed({
+        future: (index, name)
+        for index, (name, future) in enumerate(uploads)}))
+    return jsonify({'items': [
+        _uploaded_item(result, created)
+        for result, created in zip(results, link_results(results))]}), 201
+
+
+def _slot_serializer() -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(app.config['SECRET_KEY'],
+                                  salt='disk-upload-slot')
+
+
+def _slot_files(data) -> List[str]:
+    """Имена файлов из тела запроса слотов."""
+    files = data.get('files') if isinstance(data, dict) else None
+    if not isinstance(files, list) or not files:
+        raise InvalidAPIUsage('Ожидается непустой массив "files"',
+                              status_code=400)
+    if len(files) > MAX_FILES:
+        raise InvalidAPIUsage(f'Можно загрузить не более {MAX_FILES} файлов',
+                              status_code=400)
+    checked = []
+    for item in files:
+        item = item if isinstance(item, dict) else {}
+        name, size = item.get('name'), item.get('size')
+        if not isinstance(name, str) or not isinstance(size, int):
+            raise InvalidAPIUsage('Для каждого файла нужны "name" и "size"',
+                                  status_code=400)
+        try:
+            check_file(name.strip(), size)
+        except UploadRejected as e:
+            raise InvalidAPIUsage(str(e), status_code=e.status_code)
+        checked.append(name.strip())
+    return checked
+
+
+def _slot_item(name: str, slot) -> dict:
+    if isinstance(slot, Exception):
+        app.logger.warning('Не удалось получить ссылку для загрузки '
+                           '%s: %r', name, slot)
+        return {'name': name,
+                'error': 'Не удалось получить ссылку для загрузки'}
+    remote_path, href = slot
+    return {'name': name, 'href': href, 'method': 'PUT',
+            'token': _slot_serializer().dumps(
+                {'path': remote_path, 'name': name})}
+
+
+@app.route('/api/files/slots/', methods=['POST'])
+async def request_file_slots():
+    names = _slot_files(request.get_json(silent=True))
+    # Слот выдаётся и для уже известного содержимого: хешу от клиента
+    # верить нельзя. Повтор узнаётся при завершении по хешу, который
+    # посчитал Диск, и тогда лишняя копия удаляется.
+    try:
+        slots = await request_upload_slots(names)
+    except CircuitOpen as e:
+        raise InvalidAPIUsage(str(e), status_code=503)
+    # Незавершённые слоты учитываются, чтобы их файлы не копились на
+    # Диске: просроченные удаляются здесь же, понемногу за запрос.
+    UploadSlot.issue([slot[0] for slot in slots
+                      if not isinstance(slot, Exception)],
+                     app.config['UPLOAD_SLOT_TTL'])
+    purge_expired_slots()
+    items = [_slot_item(name, slot) for name, slot in zip(names, slots)]
+    return jsonify({'items': items,
+                    'expires_in': app.config['UPLOAD_SLOT_TTL']}), 200
+
+
+def _load_slot(token) -> Optional[dict]:
+    if not isinstance(token, str):
+        return None
+    try:
+        return _slot_serializer().loads(
+            token, max_age=app.config['UPLOAD_SLOT_TTL'])
+    except BadSignature:
+        return None
+
+
+def _link_error(error: Exception) -> str:
+    if isinstance(error, ClientResponseError) and error.status == 404:
+        return 'Файл не загружен на Диск'
+    app.logger.warning('Не удалось получить ссылку на файл: %r', error)
+    return 'Не удалось получить ссылку на файл'
+
+
+def _finalized_item(slot: Optional[dict], link, created) -> dict:
+    if slot is None:
+        return {'error': 'Недействительный или просроченный токен'}
+    if slot.get('used'):
+        return {'name': slot['name'], 'error': 'Токен уже использован'}
+    if isinstance(link, UploadTooLarge):
+        try:
+            check_file(slot['name'], link.size)
+        except UploadRejected as e:
+            return {'name': slot['name'], 'error': str(e)}
+    if isinstance(link, Exception):
+        return {'name': slot['name'], 'error': _link_error(link)}
+    result = next(created)
+    if isinstance(result, ValueError):
+        return {'name': slot['name'], 'error': str(result)}
+    return {'name': slot['name'],
+            'short_link': _link_json(*result)['short_link']}
+
+
+@app.route('/api/files/finalize/', methods=['POST'])
+async def finalize_file_uploads():
+    data = request.get_json(silent=True)
+    tokens = data.get('tokens') if isinstance(data, dict) else None
+    if not isinstance(tokens, list) or not 0 < len(tokens) <= MAX_FILES:
+        raise InvalidAPIUsage(
+            f'Ожидается массив "tokens" из 1–{MAX_FILES} элементов',
+            status_code=400)
+    slots = [_load_slot(token) for token in tokens]
+    # Токен одноразовый: путь, на который ссылка уже выдана, и повтор
+    # токена в том же запросе второй раз не завершаются.
+    used = DiskFile.recorded_paths(slot['path'] for slot in slots if slot)
+    for index, slot in enumerate(slots):
+        if slot and slot['path'] in used:
+            slots[index] = dict(slot, used=True)
+        elif slot:
+            used.add(slot['path'])
+    valid = [slot for slot in slots if slot and not slot.get('used')]
+    try:
+        links = await resolve_uploads(
+            [slot['path'] for slot in valid],
+            max_size=MAX_ONE_FILE) if valid else []
+    except CircuitOpen as e:
+        raise InvalidAPIUsage(str(e), status_code=503)
+    UploadSlot.settle(
+        slot['path'] for slot, link in zip(valid, links)
+        if not isinstance(link, Exception)
+        or isinstance(link, UploadTooLarge))
+    created = iter(link_results([
+        UploadResult(index, slot['name'], **uploaded._asdict())
+        for index, (slot, uploaded) in enumerate(zip(valid, links))
+        if not isinstance(uploaded, Exception)]))
+    links = iter(links)
+    items = [_finalized_item(
+        slot, next(links) if slot and not slot.get('used') else None,
+        created) for slot in slots]
+    return jsonify({'items': items}), 201
+
+
+def _job_json(job: UploadJob) -> dict:
+    files = []
+    for entry in job.entries:
+        item = {'name': entry['name']}
+        if entry.get('short'):
+            item['short_link'] = url_for('follow_short', short=entry['short'],
+                                         _external=True)
+        elif entry.get('error'):
+            item['error'] = entry['error']
+        files.append(item)
+    return {'id': job.id, 'status': job.status, 'attempts': job.attempts,
+            'error': job.error, 'created': job.created.isoformat(),
+            'updated': job.updated.isoformat(), 'files': files,
+            'status_url': url_for('get_upload_job', job_id=job.id,
+                                  _external=True)}
+
+
+@app.route('/api/jobs/', methods=['POST'])
+def create_upload_job():
+    files = [storage for storage in request.files.getlist('files')
+             if storage.filename and storage.filename.strip()]
+    if not files:
+        raise InvalidAPIUsage('Необходимо загрузить хотя бы один файл',
+                              status_code=400)
+    if len(files) > MAX_FILES:
+        raise InvalidAPIUsage(f'Можно загрузить не более {MAX_FILES} файлов',
+                              status_code=400)
+    for storage in files:
+        try:
+            check_file(storage.filename.strip(), file_size(storage))
+        except UploadRejected as e:
+            raise InvalidAPIUsage(str(e), status_code=e.status_code)
+    return jsonify(_job_json(enqueue_upload(files))), 202
+
+
+@app.route('/api/jobs/<string:job_id>', methods=['GET'])
+def get_upload_job(job_id):
+    job = db.session.get(UploadJob, job_id)
+    if job is None:
+        raise InvalidAPIUsage('Задание не найдено', status_code=404)
+    return jsonify(_job_json(job)), 200
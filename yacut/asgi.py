@@ -0,0 +1,108 @@
+"""
+ASGI-точка входа: `uvicorn yacut.asgi:application`.
+
+Все маршруты, включая async-представления, выполняются в пуле потоков:
+в них есть блокирующая работа (запросы к базе, шаблоны, чтение файлов),
+которая не должна останавливать цикл событий сервера. На этом цикле
+остаётся только клиент Яндекс Диска: сессия `disk_client`
+привязывается к нему при старте, и вызовы Диска из представлений
+передаются туда.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.wsgi import WsgiToAsgiInstance
+
+from . import app
+from .clicks import click_counter
+from .yandexdisk import disk_client
+
+logger = logging.getLogger(__name__)
+
+
+class _WsgiInstance(WsgiToAsgiInstance):
+    """
+    Штатный WsgiToAsgi выполняет все запросы в одном потоке
+    (thread_sensitive=True). Здесь запросы идут в общем пуле через
+    обычный `run_in_executor`, без контекста sync_to_async: поэтому
+    async-представление получает свой цикл в потоке пула, а не
+    возвращается на цикл сервера.
+    """
+
+    executor: ThreadPoolExecutor = None
+
+    async def run_wsgi_app(self, body):
+        await asyncio.get_running_loop().run_in_executor(
+            self.executor, self._respond, body)
+
+    def _respond(self, body) -> None:
+        environ = self.build_environ(self.scope, body)
+        sent = 0
+        for output in self.wsgi_application(environ, self.start_response):
+            self._start()
+            limit = self.response_content_length
+            if limit is not None:
+                # Больше объявленного Content-Length не отправляется.
+                output = output[:limit - sent]
+            self.sync_send({'type': 'http.response.body', 'body': output,
+                            'more_body': True})
+            sent += len(output)
+            if sent == limit:
+                break
+        self._start()
+        self.sync_send({'type': 'http.response.body'})
+
+    def _start(self) -> None:
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+
+
+class AsgiApp:
+    """ASGI-обёртка над Flask-приложением с поддержкой lifespan."""
+
+    def __init__(self, wsgi_application, threads: int = 32):
+        self.wsgi_application = wsgi_application
+        self.threads = threads
+        self.executor = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if self.executor is None:
+            self.startup()
+        instance = _WsgiInstance(self.wsgi_application)
+        instance.executor = self.executor
+        await instance(scope, receive, send)
+
+    def startup(self) -> None:
+        disk_client.bind(asyncio.get_running_loop())
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.threads, thread_name_prefix='asgi-wsgi')
+
+    async def shutdown(self) -> None:
+        loop = asyncio.get_running_loop()
+        await disk_client.aclose()
+        executor, self.executor = self.executor, None
+        if executor is not None:
+            await loop.run_in_executor(None, executor.shutdown)
+        await loop.run_in_executor(None, click_counter.flush)
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                try:
+                    await self.shutdown()
+                except Exception:
+                    logger.exception('Ошибка при остановке приложения')
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = AsgiApp(app, threads=app.config['ASGI_THREADS'])
@@ -0,0 +1,150 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from typing import Callable, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MIN_CAPACITY = 1024
+
+
+class BloomFilter:
+    """
+    Классический Bloom-фильтр на bytearray.
+
+    Размер и число хеш-функций подбираются по ожидаемому числу элементов
+    и допустимой доле ложноположительных ответов; позиции считаются
+    двойным хешированием одного дайджеста blake2b. Вставки защищены
+    блокировкой: `|=` над байтом не атомарен, и параллельные вставки
+    теряли бы биты.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.size = max(8, math.ceil(
+            -self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> None:
+        positions = list(self._positions(item))
+        with self._lock:
+            for pos in positions:
+                self.bits[pos >> 3] |= 1 << (pos & 7)
+            self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[pos >> 3] & (1 << (pos & 7))
+            for pos in self._positions(item)
+        )
+
+
+class SlugFilter:
+    """
+    Bloom-фильтр занятых коротких ссылок.
+
+    Строится лениво при первом обращении через `load() -> (count, slugs)`
+    с запасом в два раза от числа строк, пополняется при вставках и
+    перестраивается при переполнении или раз в `refresh_interval` секунд,
+    чтобы подхватить ссылки, созданные другими воркерами. Перестройка
+    идёт в фоновом потоке (`background`), а запросы тем временем
+    пользуются прежним фильтром; вставки, сделанные за время перестройки,
+    добавляются в новый фильтр перед подменой. Пока фильтр не построен,
+    любой слаг считается «возможно занятым».
+    """
+
+    def __init__(self, load: Callable[[], Tuple[int, Iterable[str]]],
+                 error_rate: float = 0.01, refresh_interval: float = 300.0,
+                 background: bool = True):
+        self._load = load
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.background = background
+        self._lock = threading.Lock()
+        self._bloom: Optional[BloomFilter] = None
+        self._built_at = 0.0
+        self._retry_at = 0.0
+        # Слаги, вставленные во время перестройки; None — её нет.
+        self._pending: Optional[List[str]] = None
+        self._generation = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def reset(self) -> None:
+        with self._lock:
+            self._bloom = None
+            self._retry_at = 0.0
+            self._pending = None
+            self._generation += 1
+
+    def _stale(self) -> bool:
+        bloom = self._bloom
+        return (
+            bloom is None
+            or bloom.count > bloom.capacity
+            or time.monotonic() - self._built_at > self.refresh_interval
+        )
+
+    def _claim_rebuild(self) -> Optional[int]:
+        """Поколение для новой перестройки или None, если она не нужна."""
+        with self._lock:
+            if (self._pending is not None or not self._stale()
+                    or time.monotonic() < self._retry_at):
+                return None
+            self._pending = []
+            return self._generation
+
+    def _rebuild(self, generation: int) -> None:
+        try:
+            count, slugs = self._load()
+            bloom = BloomFilter(max(MIN_CAPACITY, count * 2),
+                                self.error_rate)
+            for slug in slugs:
+                bloom.add(slug)
+        except Exception:
+            logger.exception('Не удалось построить Bloom-фильтр')
+            with self._lock:
+                if generation == self._generation:
+                    self._pending = None
+                    self._retry_at = time.monotonic() + 5
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            for slug in self._pending:
+                bloom.add(slug)
+            self._pending = None
+            self._bloom = bloom
+            self._built_at = time.monotonic()
+
+    def might_contain(self, slug: str) -> bool:
+        if self._stale() and self._pending is None:
+            generation = self._claim_rebuild()
+            if generation is not None and self.background:
+                self._thread = threading.Thread(
+                    target=self._rebuild, args=(generation,),
+                    name='slug-filter', daemon=True)
+                self._thread.start()
+            elif generation is not None:
+                self._rebuild(generation)
+        bloom = self._bloom
+        return bloom is None or slug in bloom
+
+    def add(self, slug: str) -> None:
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(slug)
+            bloom = self._bloom
+        if bloom is not None:
+            bloom.add(slug)
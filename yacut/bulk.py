@@ -0,0 +1,131 @@
+import csv
+import io
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from .accounts import is_location
+from .models import URLMap
+
+FORMATS = ('csv', 'ndjson')
+SLUG_KEYS = ('slug', 'custom_id', 'short')
+EXPORT_FIELDS = ('id', 'short', 'url', 'timestamp', 'is_custom', 'clicks',
+                 'disk_path')
+MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+Row = Tuple[Optional[str], Optional[str]]
+Checked = Tuple[Optional[Tuple[str, Optional[str]]], Optional[str]]
+
+
+def _slug_of(record: dict) -> Optional[str]:
+    for key in SLUG_KEYS:
+        if record.get(key):
+            return record[key]
+    return None
+
+
+def read_rows(stream, fmt: str) -> Iterator[Row]:
+    """
+    Построчно читает пары (url, slug) из CSV с заголовком или NDJSON.
+
+    Нечитаемая запись превращается в (None, None), чтобы сохранить
+    нумерацию строк для отчёта об ошибках и продолжения импорта.
+    """
+    if fmt == 'csv':
+        for record in csv.DictReader(stream):
+            yield record.get('url'), _slug_of(record)
+        return
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield None, None
+            continue
+        if not isinstance(record, dict):
+            yield None, None
+            continue
+        yield record.get('url'), _slug_of(record)
+
+
+def chunked(rows: Iterable, size: int) -> Iterator[List]:
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def validate_chunk(rows: List[Row]) -> List[Checked]:
+    """Проверяет пары по правилам `_normalize_url` и `SHORT_RE`."""
+    checked = []
+    for url, slug in rows:
+        if not isinstance(url, str) or not (slug is None
+                                            or isinstance(slug, str)):
+            checked.append((None, 'Некорректная запись'))
+            continue
+        try:
+            checked.append((URLMap.validate_item(url, slug), None))
+        except ValueError as e:
+            checked.append((None, str(e)))
+    return checked
+
+
+def validated_chunks(chunks: Iterable[List[Row]],
+                     workers: int = 1) -> Iterator[Tuple[List, List]]:
+    """
+    Проверяет пачки, при workers > 1 — в пуле процессов.
+
+    В работе одновременно не больше 2 * workers пачек, поэтому память
+    не растёт с размером входного файла, а порядок пачек сохраняется.
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield chunk, validate_chunk(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append((chunk, pool.submit(validate_chunk, chunk)))
+            if len(pending) >= workers * 2:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
+
+
+def _export_record(row: dict) -> dict:
+    # Путь на Диске выгружается отдельно: в `url` только настоящие URL.
+    disk_path = row['original'] if is_location(row['original']) else None
+    return {
+        'id': row['id'],
+        'short': row['short'],
+        'url': None if disk_path else row['original'],
+        'timestamp': row['timestamp'].isoformat(),
+        'is_custom': bool(row['is_custom']),
+        'clicks': row['clicks'],
+        'disk_path': disk_path,
+    }
+
+
+def export_lines(rows: Iterable[dict], fmt: str) -> Iterator[str]:
+    """Превращает строки `URLMap.iter_rows` в строки CSV или NDJSON."""
+    if fmt == 'ndjson':
+        for row in rows:
+            yield json.dumps(_export_record(row), ensure_ascii=False) + '\n'
+        return
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(_export_record(row))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
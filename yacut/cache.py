@@ -0,0 +1,307 @@
+import logging
+import socket
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from .resilience import CircuitBreaker, CircuitOpen
+
+logger = logging.getLogger(__name__)
+
+
+class BaseCache:
+    """
+    Интерфейс кэша строк по строковым ключам.
+
+    Реализации обязаны возвращать None при отсутствии ключа и никогда
+    не поднимать исключений наружу: недоступный кэш равносилен промаху.
+    """
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def get_many(self, keys: Iterable[str]) -> List[Optional[str]]:
+        return [self.get(key) for key in keys]
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+class TTLCache(BaseCache):
+    """
+    LRU-кэш ограниченного размера с временем жизни записей.
+
+    Потокобезопасен в пределах процесса. Ведёт счётчики попаданий,
+    промахов, вытеснений по размеру и истечений по TTL.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires_at = item
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any,
+            ttl: Optional[float] = None) -> None:
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+            self.evictions = self.expirations = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+class RedisCache(BaseCache):
+    """
+    Сетевой кэш поверх протокола Redis (RESP2), общий для всех воркеров.
+
+    Держит небольшой пул соединений; при сетевой ошибке соединение
+    выбрасывается, а операция считается промахом. После сетевой ошибки
+    кэш `cooldown` секунд не обращается к серверу вовсе, а затем
+    пробует одно соединение: пока Redis лежит, запросы идут в базу без
+    ожидания таймаутов.
+    """
+
+    def __init__(self, url: str, ttl: float = 300.0, prefix: str = 'yacut:',
+                 timeout: float = 0.5, pool_size: int = 8,
+                 cooldown: float = 5.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.db = int((parsed.path or '/0').lstrip('/') or 0)
+        self.password = parsed.password
+        self.ttl = ttl
+        self.prefix = prefix
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._pool = []
+        self._lock = threading.Lock()
+        self.breaker = CircuitBreaker(threshold=1, reset_timeout=cooldown)
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.skipped = 0
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port),
+                                        timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = (sock, sock.makefile('rb'))
+        if self.password:
+            self._call(conn, 'AUTH', self.password)
+        if self.db:
+            self._call(conn, 'SELECT', self.db)
+        return conn
+
+    def _acquire(self):
+        with self._lock:
+            if self._pool:
+                return self._pool.pop()
+        return self._connect()
+
+    def _release(self, conn) -> None:
+        with self._lock:
+            if len(self._pool) < self.pool_size:
+                self._pool.append(conn)
+                return
+        self._close(conn)
+
+    @staticmethod
+    def _close(conn) -> None:
+        sock, reader = conn
+        reader.close()
+        sock.close()
+
+    @staticmethod
+    def _encode(*args) -> bytes:
+        out = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            out.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        return b''.join(out)
+
+    def _read_reply(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError('Соединение с кэшем закрыто.')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            raise RuntimeError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            return reader.read(length + 2)[:-2].decode()
+        if kind == b'*':
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self._read_reply(reader) for _ in range(length)]
+        raise ConnectionError('Некорректный ответ кэша.')
+
+    def _call(self, conn, *args):
+        sock, reader = conn
+        sock.sendall(self._encode(*args))
+        return self._read_reply(reader)
+
+    def execute(self, *args):
+        conn = self._acquire()
+        try:
+            reply = self._call(conn, *args)
+        except (OSError, ConnectionError):
+            self._close(conn)
+            raise
+        except RuntimeError:
+            self._release(conn)
+            raise
+        self._release(conn)
+        return reply
+
+    def _safe(self, *args):
+        try:
+            self.breaker.before_call()
+        except CircuitOpen:
+            self.skipped += 1
+            return None
+        try:
+            reply = self.execute(*args)
+        except (OSError, ConnectionError):
+            self.breaker.on_failure()
+        except RuntimeError:
+            # Ошибку команды вернул работающий сервер.
+            self.breaker.on_success()
+        except BaseException:
+            self.breaker.release_probe()
+            raise
+        else:
+            self.breaker.on_success()
+            return reply
+        self.errors += 1
+        logger.warning('Кэш %s:%s недоступен', self.host, self.port,
+                       exc_info=True)
+        return None
+
+    def _count(self, value) -> None:
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._safe('GET', self.prefix + key)
+        self._count(value)
+        return value
+
+    def get_many(self, keys: Iterable[str]) -> List[Optional[str]]:
+        keys = list(keys)
+        if not keys:
+            return []
+        values = self._safe('MGET', *(self.prefix + key for key in keys))
+        if values is None:
+            values = [None] * len(keys)
+        for value in values:
+            self._count(value)
+        return values
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        ttl_ms = max(1, int((self.ttl if ttl is None else ttl) * 1000))
+        self._safe('SET', self.prefix + key, value, 'PX', ttl_ms)
+
+    def delete(self, key: str) -> None:
+        self._safe('DEL', self.prefix + key)
+
+    def clear(self) -> None:
+        cursor = '0'
+        while True:
+            reply = self._safe('SCAN', cursor, 'MATCH', self.prefix + '*',
+                               'COUNT', 1000)
+            if reply is None:
+                break
+            cursor, keys = reply
+            if keys:
+                self._safe('DEL', *keys)
+            if cursor == '0':
+                break
+        self.hits = self.misses = self.errors = self.skipped = 0
+
+    def stats(self) -> dict:
+        return {
+            'backend': 'redis',
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'skipped': self.skipped,
+            'breaker': self.breaker.stats(),
+        }
+
+
+def make_cache(config) -> BaseCache:
+    backend = config.get('SLUG_CACHE_BACKEND') or 'memory'
+    if backend == 'memory':
+        return TTLCache(maxsize=config['SLUG_CACHE_SIZE'],
+                        ttl=config['SLUG_CACHE_TTL'])
+    if backend.startswith('redis://'):
+        return RedisCache(backend, ttl=config['SLUG_CACHE_TTL'],
+                          cooldown=config['SLUG_CACHE_COOLDOWN'])
+    raise RuntimeError(f'Неизвестный бэкенд кэша: {backend}')
@@ -0,0 +1,130 @@
+import json
+import time
+from itertools import islice
+
+import click
+
+from . import app
+from .bulk import (FORMATS, chunked, export_lines, read_rows,
+                   validated_chunks)
+from .jobs import purge_expired_slots, run_once, upload_workers
+from .models import URLMap
+
+
+def _report_error(errors, line: int, row, message: str) -> None:
+    if errors is None:
+        return
+    url, slug = row
+    errors.write(json.dumps({'line': line, 'url': url, 'slug': slug,
+                             'error': message}, ensure_ascii=False) + '\n')
+
+
+@app.cli.command('import-links')
+@click.argument('source', type=click.File('r', encoding='utf-8'),
+                default='-')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS),
+              help='Формат входа; по умолчанию по расширению файла.')
+@click.option('--chunk-size', default=5000, show_default=True,
+              help='Сколько записей вставлять одной транзакцией.')
+@click.option('--workers', default=1, show_default=True,
+              help='Число процессов для проверки записей.')
+@click.option('--skip', default=0, show_default=True,
+              help='Пропустить первые N записей (продолжение после сбоя).')
+@click.option('--errors', type=click.File('w', encoding='utf-8'),
+              help='Куда писать отклонённые записи в формате NDJSON.')
+def import_links(source, fmt, chunk_size, workers, skip, errors):
+    """Потоковый импорт пар (url, slug) из CSV или NDJSON-файла/stdin."""
+    if fmt is None:
+        fmt = 'csv' if source.name.endswith('.csv') else 'ndjson'
+    rows = islice(read_rows(source, fmt), skip, None)
+    offset = skip
+    inserted = rejected = 0
+    started = time.monotonic()
+    for chunk, checked in validated_chunks(chunked(rows, chunk_size),
+                                           workers):
+        valid = [index for index, (item, _) in enumerate(checked) if item]
+        stored = URLMap.store_validated(
+            [checked[index][0] for index in valid], warm_cache=False)
+        for index, (item, message) in enumerate(checked):
+            if message:
+                rejected += 1
+                _report_error(errors, offset + index + 1, chunk[index],
+                              message)
+        for index, result in zip(valid, stored):
+            if isinstance(result, ValueError):
+                rejected += 1
+                _report_error(errors, offset + index + 1, chunk[index],
+                              str(result))
+            else:
+                inserted += 1
+        offset += len(chunk)
+        rate = (offset - skip) / max(time.monotonic() - started, 1e-6)
+        click.echo(f'offset={offset} inserted={inserted} '
+                   f'rejected={rejected} rate={rate:.0f}/s', err=True)
+    click.echo(f'Импорт завершён: обработано {offset - skip}, '
+               f'добавлено {inserted}, отклонено {rejected}.')
+
+
+@app.cli.command('export-links')
+@click.argument('target', type=click.File('w', encoding='utf-8'),
+                default='-')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS),
+              help='Формат выхода; по умолчанию по расширению файла.')
+@click.option('--since', type=click.DateTime(),
+              help='Выгрузить только ссылки, созданные не раньше даты.')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Сколько строк читать из базы одним запросом.')
+def export_links(target, fmt, since, batch_size):
+    """Потоковая выгрузка ссылок в CSV или NDJSON-файл/stdout."""
+    if fmt is None:
+        fmt = 'csv' if target.name.endswith('.csv') else 'ndjson'
+    rows = URLMap.iter_rows(since=since, batch_size=batch_size)
+    for line in export_lines(rows, fmt):
+        target.write(line)
+
+
+@app.cli.command('backfill-hosts')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Сколько строк обновлять одной транзакцией.')
+def backfill_hosts(batch_size):
+    """Заполняет хост исходного URL у ранее созданных ссылок."""
+    updated = 0
+    for count in URLMap.backfill_hosts(batch_size):
+        updated += count
+        click.echo(f'updated={updated}', err=True)
+    click.echo(f'Обновлено ссылок: {updated}.')
+
+
+@app.cli.command('purge-upload-slots')
+def purge_upload_slots():
+    """Удаляет с Диска файлы незавершённых слотов прямой загрузки."""
+    purged = 0
+    while True:
+        count = purge_expired_slots(wait=True)
+        if not count:
+            break
+        purged += count
+        click.echo(f'purged={purged}', err=True)
+    click.echo(f'Удалено незавершённых загрузок: {purged}.')
+
+
+@app.cli.command('upload-worker')
+@click.option('--threads', default=1, show_default=True,
+              help='Число потоков, обрабатывающих задания.')
+@click.option('--once', is_flag=True,
+              help='Обработать готовые задания и выйти.')
+def upload_worker(threads, once):
+    """Обрабатывает очередь фоновых загрузок файлов на Диск."""
+    if once:
+        processed = 0
+        while run_once():
+            processed += 1
+            click.echo(f'processed={processed}', err=True)
+        click.echo(f'Обработано заданий: {processed}.')
+        return
+    upload_workers.ensure_started(threads)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        upload_workers.stop()
@@ -0,0 +1,133 @@
+import atexit
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Hashable
+
+from . import app, db
+from .models import ClickRollup, URLMap
+
+logger = logging.getLogger(__name__)
+
+
+class ClickCounter:
+    """
+    Счётчик переходов в памяти воркера с отложенной записью в базу.
+
+    `record()` лишь увеличивает счётчик под блокировкой; фоновый поток
+    раз в `interval` секунд забирает накопленные приращения и передаёт
+    их пачкой в `flush(deltas)`. Число ключей ограничено `max_keys`:
+    при заполнении сброс запускается досрочно, а если база недоступна
+    и буфер вырос вдвое, переходы по новым ключам отбрасываются.
+    При интервале 0 фоновый поток не запускается, сброс выполняется
+    только явно, при переполнении и при завершении процесса.
+    """
+
+    def __init__(self, flush: Callable[[Dict[Hashable, int]], None],
+                 interval: float = 10.0, max_keys: int = 10000):
+        self._flush = flush
+        self.interval = interval
+        self.max_keys = max_keys
+        self._counts: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.dropped = 0
+
+    def record(self, key: Hashable) -> None:
+        with self._lock:
+            counts = self._counts
+            if key in counts:
+                counts[key] += 1
+            elif len(counts) < self.max_keys * 2:
+                counts[key] = 1
+            else:
+                self.dropped += 1
+            overflow = len(counts) >= self.max_keys
+        if self.interval <= 0:
+            if overflow:
+                self.flush()
+            return
+        self._ensure_thread()
+        if overflow:
+            self._wake.set()
+
+    def pending(self, key: Hashable) -> int:
+        with self._lock:
+            return self._counts.get(key, 0)
+
+    def snapshot(self) -> Dict[Hashable, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def _ensure_thread(self) -> None:
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name='click-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                deltas, self._counts = self._counts, {}
+            if not deltas:
+                return
+            try:
+                self._flush(deltas)
+            except Exception:
+                logger.exception('Не удалось сохранить счётчики переходов')
+                with self._lock:
+                    for key, delta in deltas.items():
+                        if (key in self._counts
+                                or len(self._counts) < self.max_keys * 2):
+                            self._counts[key] = (
+                                self._counts.get(key, 0) + delta)
+                        else:
+                            self.dropped += delta
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self.dropped = 0
+
+
+def _save_clicks(deltas: Dict[tuple, int]) -> None:
+    totals = {}
+    for (short, _), count in deltas.items():
+        totals[short] = totals.get(short, 0) + count
+    with app.app_context():
+        URLMap.add_clicks(totals)
+        ClickRollup.add(deltas)
+        db.session.commit()
+
+
+def record_click(short: str) -> None:
+    click_counter.record(
+        (short, ClickRollup.hour_bucket(datetime.utcnow())))
+
+
+def pending_clicks(short: str) -> int:
+    return sum(count for (key, _), count in click_counter.snapshot().items()
+               if key == short)
+
+
+click_counter = ClickCounter(
+    flush=_save_clicks,
+    interval=app.config['CLICK_FLUSH_INTERVAL'],
+    max_keys=app.config['CLICK_MAX_KEYS'],
+)
+atexit.register(click_counter.flush)
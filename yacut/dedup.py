@@ -0,0 +1,126 @@
+"""
+Дедупликация файлов на Диске по SHA-256 содержимого.
+
+Файл, который можно перемотать (форма `/files`, фоновые задания),
+хешируется до загрузки: если такое содержимое уже есть на Диске, PUT
+не выполняется и возвращается прежняя короткая ссылка. У потоковых
+загрузок хеш считается по ходу PUT, а лишняя копия после загрузки
+удаляется с Диска.
+"""
+import asyncio
+import hashlib
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Optional
+
+from .models import DiskFile, URLMap
+from .yandexdisk import (Pending, UploadResult, Uploaded, discard_files,
+                         start_uploads as start_disk_uploads)
+
+READ_SIZE = 1 << 20
+
+
+def file_digest(stream) -> Optional[str]:
+    """SHA-256 перематываемого потока; позиция потока сохраняется."""
+    if not getattr(stream, 'seekable', lambda: False)():
+        return None
+    start = stream.tell()
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(READ_SIZE), b''):
+        digest.update(chunk)
+    stream.seek(start)
+    return digest.hexdigest()
+
+
+def _digests(files: List) -> List[Optional[str]]:
+    return [file_digest(f.stream) if f else None for f in files]
+
+
+async def file_digests(files: List) -> List[Optional[str]]:
+    """Хеши файлов для `start_uploads`; чтение идёт в пуле потоков."""
+    return await asyncio.get_running_loop().run_in_executor(
+        None, _digests, files)
+
+
+def known_files(digests: Iterable[Optional[str]]) -> Dict[str, Uploaded]:
+    """Уже загруженные файлы, чьи короткие ссылки по-прежнему работают."""
+    files = DiskFile.lookup(digests)
+    originals = URLMap.get_originals(row.short for row in files.values())
+    return {digest: Uploaded(originals[row.short], row.remote_path, digest,
+                             row.short)
+            for digest, row in files.items() if originals.get(row.short)}
+
+
+def _done(value: Uploaded) -> Future:
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def start_uploads(files: List, owner=None,
+                  digests: Optional[List[Optional[str]]] = None) -> Pending:
+    """
+    Как `yandexdisk.start_uploads`, но файлы с уже известным содержимым
+    не загружаются: их future сразу содержит прежнюю ссылку. Async-код
+    передаёт `digests`, заранее посчитанные `file_digests`.
+    """
+    files = list(files or [])
+    if digests is None:
+        digests = _digests(files)
+    known = known_files(digests)
+    pending = start_disk_uploads(
+        [None if digest in known else f
+         for f, digest in zip(files, digests)], owner)
+    for index, (f, digest) in enumerate(zip(files, digests)):
+        if digest in known:
+            pending[_done(known[digest])] = (index, f.filename)
+    return pending
+
+
+def _partition(results: List[UploadResult], known: Dict[str, Uploaded]):
+    """Новые файлы по ключу (хеш или индекс) и пути лишних копий."""
+    fresh, copies = {}, set()
+    for result in results:
+        if not result.link or result.short:
+            continue
+        original = known.get(result.sha256) or fresh.get(result.sha256)
+        if original is None:
+            fresh[result.sha256 or result.index] = result
+        elif result.remote_path != original.remote_path:
+            # Тот же путь (повтор завершения) — это сам файл, а не копия.
+            copies.add(result.remote_path)
+    return fresh, sorted(path for path in copies if path)
+
+
+def _link(result: UploadResult, known: Dict[str, Uploaded], created: dict):
+    if result.short:
+        return result.link, result.short
+    if not result.link:
+        return None
+    if result.sha256 in known:
+        return known[result.sha256].link, known[result.sha256].short
+    return created[result.sha256 or result.index]
+
+
+def link_results(results: List[UploadResult]) -> List:
+    """
+    Короткие ссылки для результатов загрузки в их порядке: пара
+    (original, short), ValueError либо None, если файл не загрузился.
+    Новые файлы получают ссылки одной транзакцией и запоминаются по
+    хешу, а копии уже известных удаляются с Диска.
+    """
+    known = known_files(result.sha256 for result in results
+                        if result.link and not result.short)
+    fresh, copies = _partition(results, known)
+    # Путь на Диске — не http(s)-URL, а сам путь выдан сервисом, поэтому
+    # проверка URL из API здесь не нужна.
+    created = dict(zip(fresh, URLMap.store_validated(
+        [(result.link, None) for result in fresh.values()])))
+    DiskFile.remember([
+        {'sha256': key, 'remote_path': fresh[key].remote_path,
+         'short': value[1]}
+        for key, value in created.items()
+        if isinstance(key, str) and fresh[key].remote_path
+        and not isinstance(value, ValueError)])
+    if copies:
+        discard_files(copies)
+    return [_link(result, known, created) for result in results]
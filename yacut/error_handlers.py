@@ -40,6 +40,15 @@ def page_not_found(error):
     return render_template('404.html'), 404
 
 
+@app.errorhandler(413)
+def request_too_large(error):
+    message = 'Слишком большой запрос'
+    if _wants_json():
+        return jsonify({'message': message}), 413
+    flash(message, 'danger')
+    return redirect(url_for('upload_file_and_get_url'))
+
+
 @app.errorhandler(500)
 def internal_error(error):
     db.session.rollback()
@@ -1,8 +1,9 @@
+import os
 import re
 
 from flask_wtf import FlaskForm
 from flask_wtf.file import MultipleFileField, FileAllowed
-from wtforms import StringField, SubmitField
+from wtforms import BooleanField, StringField, SubmitField
 from wtforms.validators import (DataRequired, Length,
                                 Optional, ValidationError, Regexp)
 
@@ -22,8 +23,17 @@ ALLOWED_EXTS = {
 }
 
 
+def file_size(storage) -> int:
+    stream = storage.stream
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
 def _is_taken(slug: str) -> bool:
-    return URLMap.query.filter_by(short=slug).first() is not None
+    return URLMap.is_taken(slug)
 
 
 class ShortLinkForm(FlaskForm):
@@ -55,8 +65,18 @@ class FileUploaderForm(FlaskForm):
             )
         ]
     )
+    background = BooleanField('Загрузить в фоне')
     submit = SubmitField('Загрузить')
 
     def validate_files(self, field):
         if not field.data:
             raise ValidationError('Необходимо загрузить хотя бы один файл')
+        files = [f for f in field.data if f and f.filename]
+        if len(files) > MAX_FILES:
+            raise ValidationError(
+                f'Можно загрузить не более {MAX_FILES} файлов')
+        for storage in files:
+            if file_size(storage) > MAX_ONE_FILE:
+                raise ValidationError(
+                    f'Файл «{storage.filename}» больше '
+                    f'{MAX_ONE_FILE // (1024 * 1024)} МБ')
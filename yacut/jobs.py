@@ -0,0 +1,235 @@
+"""
+Фоновая загрузка файлов на Диск через очередь заданий в базе.
+
+Запрос сохраняет файлы в staging (`UPLOAD_STAGING_DIR`) и ставит
+`UploadJob`, а загрузку выполняют потоки `upload_workers` внутри
+приложения (`UPLOAD_JOB_THREADS` > 0) или отдельный процесс
+`flask upload-worker`. Staging должен быть общим для приложения и
+воркеров.
+"""
+import concurrent.futures
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from typing import List
+
+from werkzeug.datastructures import FileStorage
+from werkzeug.utils import secure_filename
+
+from . import app
+from .dedup import link_results, start_uploads
+from .models import UploadJob, UploadSlot
+from .resilience import backoff_delay
+from .scheduler import UploadBusy
+from .yandexdisk import UploadResult, discard_files, iter_completed
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseLost(RuntimeError):
+    """Аренду задания перехватил другой воркер."""
+
+
+def staging_dir() -> str:
+    return (app.config['UPLOAD_STAGING_DIR']
+            or os.path.join(app.instance_path, 'staging'))
+
+
+def enqueue_upload(files: List[FileStorage]) -> UploadJob:
+    """Сохраняет файлы в staging и ставит задание на их загрузку."""
+    os.makedirs(staging_dir(), exist_ok=True)
+    job_dir = tempfile.mkdtemp(prefix='job-', dir=staging_dir())
+    entries = []
+    for index, storage in enumerate(files):
+        name = storage.filename.strip()
+        path = os.path.join(job_dir, f'{index}_{secure_filename(name)}')
+        storage.save(path)
+        entries.append({'name': name, 'path': path})
+    job = UploadJob.enqueue(entries)
+    upload_workers.notify()
+    return job
+
+
+def _cleanup(entries: List[dict]) -> None:
+    if entries:
+        shutil.rmtree(os.path.dirname(entries[0]['path']),
+                      ignore_errors=True)
+
+
+def _record(entry: dict, result: UploadResult) -> None:
+    if result.link:
+        entry.update(link=result.link, sha256=result.sha256,
+                     remote_path=result.remote_path)
+        if result.short:
+            entry['short'] = result.short
+        entry.pop('error', None)
+    else:
+        entry['error'] = 'Не удалось загрузить файл'
+
+
+def _upload_entries(job: UploadJob, entries: List[dict]) -> None:
+    # Повтор загружает только файлы, для которых ещё нет ссылки.
+    todo = [index for index, entry in enumerate(entries)
+            if not entry.get('link')]
+    streams = [open(entries[index]['path'], 'rb') for index in todo]
+    try:
+        files = [FileStorage(stream=stream, filename=entries[index]['name'])
+                 for index, stream in zip(todo, streams)]
+        # Аренда продлевается после каждого файла и не реже раза в
+        # UPLOAD_JOB_HEARTBEAT секунд, пока загрузки ещё идут.
+        for result in iter_completed(start_uploads(files, owner=job.id),
+                                     app.config['UPLOAD_JOB_HEARTBEAT']):
+            if result is not None:
+                _record(entries[todo[result.index]], result)
+            job.entries = entries
+            if not job.renew(app.config['UPLOAD_JOB_LEASE']):
+                raise LeaseLost(job.id)
+    finally:
+        for stream in streams:
+            stream.close()
+
+
+def _link_entries(entries: List[dict]) -> None:
+    todo = [entry for entry in entries
+            if entry.get('link') and not entry.get('short')]
+    created = link_results([
+        UploadResult(index, entry['name'], link=entry['link'],
+                     remote_path=entry.get('remote_path'),
+                     sha256=entry.get('sha256'))
+        for index, entry in enumerate(todo)])
+    for entry, result in zip(todo, created):
+        if isinstance(result, ValueError):
+            entry['error'] = str(result)
+        else:
+            entry['short'] = result[1]
+
+
+def _settle(job: UploadJob, entries: List[dict]) -> None:
+    job.entries = entries
+    done = [entry for entry in entries if entry.get('short')]
+    if len(done) < len(entries) and (
+            job.attempts < app.config['UPLOAD_JOB_ATTEMPTS']):
+        job.release(backoff_delay(job.attempts,
+                                  app.config['UPLOAD_JOB_RETRY_DELAY'],
+                                  app.config['UPLOAD_JOB_RETRY_MAX_DELAY']))
+        return
+    job.finish(UploadJob.DONE if done else UploadJob.FAILED)
+    _cleanup(entries)
+
+
+def process(job: UploadJob) -> None:
+    """Загружает файлы задания, создаёт ссылки и решает, нужен ли повтор."""
+    entries = job.entries
+    try:
+        _upload_entries(job, entries)
+    except UploadBusy:
+        # Очередь загрузок процесса занята: попытка не засчитывается.
+        job.release(app.config['UPLOAD_JOB_POLL'],
+                    attempts=job.attempts - 1)
+        return
+    except LeaseLost:
+        logger.warning('Аренда задания %s потеряна', job.id)
+        return
+    except OSError:
+        logger.exception('Файлы задания %s недоступны', job.id)
+        job.finish(UploadJob.FAILED, 'Файлы задания недоступны')
+        return
+    except Exception:
+        logger.exception('Сбой загрузки файлов задания %s', job.id)
+    _link_entries(entries)
+    _settle(job, entries)
+
+
+def purge_expired_slots(limit: int = 100, wait: bool = False) -> int:
+    """
+    Удаляет с Диска файлы слотов прямой загрузки, которые так и не
+    завершили до истечения токена; возвращает число таких слотов.
+    С `wait` дожидается удаления, иначе оно идёт в фоне.
+    """
+    paths = UploadSlot.take_expired(limit)
+    futures = discard_files(paths) if paths else []
+    if wait:
+        concurrent.futures.wait(futures)
+    return len(paths)
+
+
+def run_once() -> bool:
+    """Обрабатывает одно готовое задание; False, если очередь пуста."""
+    job = UploadJob.claim(app.config['UPLOAD_JOB_LEASE'])
+    if job is None:
+        return False
+    if job.attempts > app.config['UPLOAD_JOB_ATTEMPTS']:
+        # Воркеры падали на этом задании, не успевая его завершить.
+        job.finish(UploadJob.FAILED, 'Исчерпаны попытки загрузки')
+        _cleanup(job.entries)
+        return True
+    process(job)
+    return True
+
+
+class UploadWorkers:
+    """
+    Потоки, забирающие задания из очереди в базе. Простаивающий поток
+    опрашивает очередь раз в `UPLOAD_JOB_POLL` секунд или просыпается
+    по `notify`. После fork пул запускается заново.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._pid = None
+
+    def ensure_started(self, threads: int = None) -> None:
+        threads = app.config['UPLOAD_JOB_THREADS'] if threads is None \
+            else threads
+        if threads <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._run, daemon=True,
+                                 name=f'upload-worker-{index}')
+                for index in range(threads)]
+            for thread in self._threads:
+                thread.start()
+
+    def notify(self) -> None:
+        self.ensure_started()
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with app.app_context():
+                    busy = run_once()
+            except Exception:
+                logger.exception('Ошибка обработки задания загрузки')
+                busy = False
+            if not busy:
+                self._wake.wait(app.config['UPLOAD_JOB_POLL'])
+                self._wake.clear()
+
+    def stop(self, timeout: float = None) -> None:
+        with self._lock:
+            threads, self._threads, self._pid = self._threads, [], None
+        self._stop.set()
+        self._wake.set()
+        for thread in threads:
+            thread.join(timeout)
+
+
+upload_workers = UploadWorkers()
+
+
+@app.before_request
+def _start_upload_workers() -> None:
+    # Потоки запускаются в каждом рабочем процессе, чтобы подхватить
+    # задания упавших воркеров, даже если новых заданий нет.
+    upload_workers.ensure_started()
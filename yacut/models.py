@@ -1,17 +1,27 @@
+import hashlib
+import json
 import re
-import secrets
-import string
-from datetime import datetime
-from typing import Optional
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
 from urllib.parse import urlparse
 
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from sqlalchemy.exc import IntegrityError
 
-from yacut import db
+from yacut import app, db, slug_cache
+from .bloom import SlugFilter
+from .slugs import SlugAllocator
 
-SHORT_LEN = 6
 SHORT_RE = re.compile(r'^[A-Za-z0-9]{1,16}$')
-ALPHABET = string.ascii_letters + string.digits
+# Отрицательный результат поиска в кэше: короткой ссылки нет в базе.
+NOT_FOUND = ''
+# Ссылка есть, но отключена: слаг занят, переход по нему запрещён.
+# Исходные URL всегда начинаются со схемы, поэтому значения не пересекаются.
+DISABLED = '!'
+SLUG_CONFLICT_MESSAGE = 'Предложенный вариант короткой ссылки уже существует.'
 
 
 class SlugInvalid(ValueError):
@@ -26,7 +36,7 @@ class SlugConflict(ValueError):
     """
     Поднимается, когда алиас уже занят в базе или относится к зарезервированным
     значениям (например, 'files'). Используется для ответа пользователю с
-    сообщением: 'Предложенный вариант короткой ссылки уже существует.'.
+    сообщением SLUG_CONFLICT_MESSAGE.
     """
 
 
@@ -38,14 +48,57 @@ class UrlInvalid(ValueError):
     """
 
 
+def hash_url(original: str) -> str:
+    return hashlib.sha256(original.encode()).hexdigest()
+
+
+def _default_original_hash(context) -> str:
+    return hash_url(context.get_current_parameters()['original'])
+
+
+def host_of(original: str) -> str:
+    return (urlparse(original).hostname or '').lower()
+
+
+def _default_host(context) -> str:
+    return host_of(context.get_current_parameters()['original'])
+
+
+def _default_host_rev(context) -> str:
+    return host_of(context.get_current_parameters()['original'])[::-1]
+
+
 class URLMap(db.Model):
     __tablename__ = 'url_map'
     RESERVED = {'files'}
+    # Листинг «сначала новые» идёт по (timestamp, id) в обратном порядке;
+    # составные индексы позволяют продолжать с курсора без OFFSET.
+    __table_args__ = (
+        db.Index('ix_url_map_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_url_map_host_timestamp_id', 'host', 'timestamp', 'id'),
+        # Поиск по суффиксу домена — это префиксный LIKE по развёрнутому
+        # хосту; в PostgreSQL такой индекс нужен с pattern_ops.
+        db.Index('ix_url_map_host_rev', 'host_rev',
+                 postgresql_ops={'host_rev': 'varchar_pattern_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     original = db.Column(db.String(2048), nullable=False)
     short = db.Column(db.String(16), unique=True, index=True, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Индексируемый отпечаток нормализованного `original` фиксированной
+    # длины: сам столбец String(2048) эффективно не индексируется.
+    original_hash = db.Column(db.String(64), index=True,
+                              default=_default_original_hash)
+    # Хост исходного URL в нижнем регистре, без порта.
+    host = db.Column(db.String(255), default=_default_host)
+    host_rev = db.Column(db.String(255), default=_default_host_rev)
+    disabled = db.Column(db.Boolean, nullable=False, default=False,
+                         server_default=db.false())
+    is_custom = db.Column(db.Boolean, nullable=False, default=False,
+                          server_default=db.false())
+    clicks = db.Column(db.BigInteger, nullable=False, default=0,
+                       server_default='0')
 
     @staticmethod
     def _normalize_url(url: str) -> str:
@@ -70,11 +123,9 @@ class URLMap(db.Model):
         if len(s) > 16 or not re.fullmatch(r'[A-Za-z0-9]+', s):
             raise SlugInvalid('Указано недопустимое имя для короткой ссылки')
         if s.lower() in URLMap.RESERVED:
-            raise SlugConflict(
-                'Предложенный вариант короткой ссылки уже существует.')
-        if check_unique and URLMap.query.filter_by(short=s).first():
-            raise SlugConflict(
-                'Предложенный вариант короткой ссылки уже существует.')
+            raise SlugConflict(SLUG_CONFLICT_MESSAGE)
+        if check_unique and URLMap.is_taken(s):
+            raise SlugConflict(SLUG_CONFLICT_MESSAGE)
         return s
 
     @classmethod
@@ -84,38 +135,798 @@ class URLMap(db.Model):
             return None
         return cls.query.filter_by(short=s).first()
 
+    @classmethod
+    def _read_through(cls, short: str) -> str:
+        cached = slug_cache.get(short)
+        if cached is not None:
+            return cached
+        row = cls.query.filter_by(short=short).first()
+        if row is None:
+            slug_cache.set(short, NOT_FOUND,
+                           ttl=current_app.config['SLUG_CACHE_MISS_TTL'])
+            return NOT_FOUND
+        value = DISABLED if row.disabled else row.original
+        slug_cache.set(short, value)
+        return value
+
+    @classmethod
+    def get_original(cls, short_id: str) -> Optional[str]:
+        s = (short_id or '').strip()
+        if not SHORT_RE.fullmatch(s):
+            return None
+        value = cls._read_through(s)
+        return None if value in (NOT_FOUND, DISABLED) else value
+
+    @classmethod
+    def _fetch_originals(cls, shorts: List[str]) -> dict:
+        found = {}
+        for short, original, disabled in db.session.execute(
+                db.select(cls.short, cls.original, cls.disabled)
+                .where(cls.short.in_(shorts))):
+            found[short] = DISABLED if disabled else original
+        miss_ttl = current_app.config['SLUG_CACHE_MISS_TTL']
+        for short in shorts:
+            if short in found:
+                slug_cache.set(short, found[short])
+            else:
+                slug_cache.set(short, NOT_FOUND, ttl=miss_ttl)
+        return {short: original for short, original in found.items()
+                if original != DISABLED}
+
+    @classmethod
+    def get_originals(cls, short_ids: Iterable[str]) -> dict:
+        """Разрешает набор коротких ссылок: кэш, затем один IN-запрос."""
+        stripped = {short_id: (short_id or '').strip()
+                    for short_id in short_ids}
+        valid = list(dict.fromkeys(
+            s for s in stripped.values() if SHORT_RE.fullmatch(s)))
+        found = {}
+        missing = []
+        for s, cached in zip(valid, slug_cache.get_many(valid)):
+            if cached is None:
+                missing.append(s)
+            elif cached not in (NOT_FOUND, DISABLED):
+                found[s] = cached
+        if missing:
+            found.update(cls._fetch_originals(missing))
+        return {short_id: found.get(s) for short_id, s in stripped.items()}
+
+    @classmethod
+    def add_clicks(cls, deltas: dict) -> None:
+        table = cls.__table__
+        db.session.execute(
+            table.update()
+            .where(table.c.short == db.bindparam('b_short'))
+            .values(clicks=table.c.clicks + db.bindparam('b_delta')),
+            [{'b_short': short, 'b_delta': delta}
+             for short, delta in sorted(deltas.items())],
+        )
+
+    @classmethod
+    def iter_rows(cls, since: Optional[datetime] = None,
+                  batch_size: int = 1000) -> Iterator[dict]:
+        """
+        Обходит таблицу по возрастанию id keyset-пагинацией.
+
+        Каждая пачка — отдельный запрос `id > последний LIMIT n`, поэтому
+        память не зависит от размера таблицы, а ORM-объекты не создаются.
+        """
+        table = cls.__table__
+        columns = (table.c.id, table.c.short, table.c.original,
+                   table.c.timestamp, table.c.is_custom, table.c.clicks)
+        last_id = 0
+        while True:
+            query = (db.select(*columns).where(table.c.id > last_id)
+                     .order_by(table.c.id).limit(batch_size))
+            if since is not None:
+                query = query.where(table.c.timestamp >= since)
+            rows = db.session.execute(query).mappings().all()
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+            last_id = rows[-1]['id']
+
+    @classmethod
+    def host_clause(cls, host: str, suffix: bool = False):
+        """
+        Условие «ссылка ведёт на хост»; при `suffix` — на хост или любой
+        его поддомен (`example.com` найдёт и `www.example.com`).
+        """
+        host = host.strip().lower().rstrip('.')
+        if not suffix:
+            return cls.host == host
+        reversed_host = host[::-1]
+        return db.or_(
+            cls.host_rev == reversed_host,
+            cls.host_rev.startswith(reversed_host + '.', autoescape=True),
+        )
+
+    @classmethod
+    def page(cls, limit: int, after: Optional[Tuple[datetime, int]] = None,
+             host: Optional[str] = None,
+             suffix: bool = False) -> List[dict]:
+        """
+        Страница ссылок «сначала новые», начиная строго после курсора
+        `after = (timestamp, id)` последней строки предыдущей страницы.
+        """
+        table = cls.__table__
+        query = (
+            db.select(table.c.id, table.c.short, table.c.original,
+                      table.c.timestamp, table.c.disabled)
+            .order_by(table.c.timestamp.desc(), table.c.id.desc())
+            .limit(limit)
+        )
+        if after is not None:
+            query = query.where(
+                db.tuple_(table.c.timestamp, table.c.id) < after)
+        if host:
+            query = query.where(cls.host_clause(host, suffix))
+        return [dict(row) for row in db.session.execute(query).mappings()]
+
+    @classmethod
+    def backfill_hosts(cls, batch_size: int = 1000) -> Iterator[int]:
+        """
+        Заполняет `host` и `host_rev` у строк, созданных до появления
+        столбцов, пачками по id; после каждой пачки отдаёт её размер.
+        """
+        table = cls.__table__
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                db.select(table.c.id, table.c.original)
+                .where(table.c.id > last_id,
+                       db.or_(table.c.host.is_(None),
+                              table.c.host_rev.is_(None)))
+                .order_by(table.c.id).limit(batch_size)
+            ).all()
+            if not rows:
+                return
+            params = []
+            for row_id, original in rows:
+                host = host_of(original)
+                params.append({'b_id': row_id, 'host': host,
+                               'host_rev': host[::-1]})
+            db.session.execute(
+                table.update().where(table.c.id == db.bindparam('b_id')),
+                params)
+            db.session.commit()
+            last_id = rows[-1][0]
+            yield len(rows)
+
+    @classmethod
+    def disable_matching(cls, host: str, suffix: bool = False,
+                         batch_size: int = 1000) -> int:
+        """
+        Отключает все ссылки на хост пачками и сбрасывает их в кэше.
+
+        Массовый UPDATE идёт мимо событий ORM, поэтому слаги удаляются
+        из кэша явно — после фиксации каждой пачки.
+        """
+        clause = cls.host_clause(host, suffix)
+        disabled = 0
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                db.select(cls.id, cls.short)
+                .where(clause, cls.disabled.is_(False), cls.id > last_id)
+                .order_by(cls.id).limit(batch_size)
+            ).all()
+            if not rows:
+                return disabled
+            db.session.execute(
+                db.update(cls).where(cls.id.in_([row[0] for row in rows]))
+                .values(disabled=True)
+                .execution_options(synchronize_session=False))
+            db.session.commit()
+            for _, short in rows:
+                slug_cache.delete(short)
+            disabled += len(rows)
+            last_id = rows[-1][0]
+
+    @classmethod
+    def is_taken(cls, short: str) -> bool:
+        if not slug_filter.might_contain(short):
+            return False
+        return cls._read_through(short) != NOT_FOUND
+
+    @classmethod
+    def _insert(cls, obj: "URLMap") -> bool:
+        short, original = obj.short, obj.original
+        db.session.add(obj)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return False
+        slug_cache.set(short, original)
+        return True
+
+    @classmethod
+    def find_generated(cls, original: str) -> Optional["URLMap"]:
+        return cls.query.filter(
+            cls.original_hash == hash_url(original),
+            cls.is_custom.is_(False),
+            cls.disabled.is_(False),
+            cls.original == original,
+        ).first()
+
+    @classmethod
+    def _create_custom(cls, original: str, slug: str) -> "URLMap":
+        if not SHORT_RE.fullmatch(slug):
+            raise SlugInvalid('Указано недопустимое имя для короткой ссылки')
+        if slug.lower() in cls.RESERVED:
+            raise SlugConflict(SLUG_CONFLICT_MESSAGE)
+        if cls.is_taken(slug):
+            raise SlugConflict(SLUG_CONFLICT_MESSAGE)
+        obj = cls(original=original, short=slug, is_custom=True)
+        if not cls._insert(obj):
+            raise SlugConflict(SLUG_CONFLICT_MESSAGE)
+        return obj
+
     @classmethod
     def create_one(cls, original_url: str, custom_slug: Optional[str] = None,
                    attempts: int = 32) -> "URLMap":
         original = cls._normalize_url(original_url)
         slug = (custom_slug or '').strip()
         if slug:
-            if not SHORT_RE.fullmatch(slug):
-                raise SlugInvalid(
-                    'Указано недопустимое имя для короткой ссылки')
+            return cls._create_custom(original, slug)
+        if current_app.config['DEDUP_AUTO_SLUGS']:
+            existing = cls.find_generated(original)
+            if existing is not None:
+                return existing
+        # Сгенерированный слаг уникален по построению: конфликт возможен
+        # только с пользовательским алиасом, тогда берём следующий.
+        for _ in range(attempts):
+            slug = slug_allocator.allocate()
             if slug.lower() in cls.RESERVED:
-                raise SlugConflict(
-                    'Предложенный вариант короткой ссылки уже существует.')
-            if cls.query.filter_by(short=slug).first():
-                raise SlugConflict(
-                    'Предложенный вариант короткой ссылки уже существует.')
-        else:
-            for _ in range(attempts):
-                guess = ''.join(
-                    secrets.choice(ALPHABET) for _ in range(SHORT_LEN))
-                if not cls.query.filter_by(short=guess).first():
-                    slug = guess
-                    break
-            if not slug:
-                raise RuntimeError(
-                    'Ошибка генерации уникальной короткой ссылки. '
-                    'Повторите попытку.')
-        obj = cls(original=original, short=slug)
-        db.session.add(obj)
+                continue
+            obj = cls(original=original, short=slug)
+            if cls._insert(obj):
+                return obj
+        raise RuntimeError(
+            'Ошибка генерации уникальной короткой ссылки. Повторите попытку.')
+
+    @staticmethod
+    def _row_params(row: dict) -> dict:
+        return {'original': row['original'], 'short': row['short'],
+                'is_custom': row['custom']}
+
+    @classmethod
+    def _insert_rows(cls, rows: List[dict]) -> None:
         try:
+            db.session.execute(db.insert(cls),
+                               [cls._row_params(row) for row in rows])
             db.session.commit()
+            return
         except IntegrityError:
             db.session.rollback()
-            raise SlugConflict(
-                'Предложенный вариант короткой ссылки уже существует.')
-        return obj
+        # Пакет упёрся в уникальность (гонка за алиас или совпадение
+        # сгенерированного слага с чужим алиасом): вставляем построчно
+        # в точках сохранения, чтобы отделить конфликтующие строки.
+        for row in rows:
+            cls._insert_row_nested(row)
+        db.session.commit()
+
+    @classmethod
+    def _insert_row_nested(cls, row: dict, attempts: int = 32) -> None:
+        for _ in range(attempts):
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(db.insert(cls), [cls._row_params(row)])
+                return
+            except IntegrityError:
+                if row['custom']:
+                    break
+                row['short'] = slug_allocator.allocate()
+        row['error'] = SlugConflict(SLUG_CONFLICT_MESSAGE)
+
+    @classmethod
+    def validate_item(cls, url: str,
+                      custom: Optional[str]) -> Tuple[str, Optional[str]]:
+        return cls._normalize_url(url), cls.validate_custom(custom)
+
+    @staticmethod
+    def _batch_rows(items: List[Tuple[str, Optional[str]]],
+                    results: List) -> dict:
+        rows = {}
+        customs = set()
+        for index, (original, slug) in enumerate(items):
+            if slug and slug in customs:
+                results[index] = SlugConflict(SLUG_CONFLICT_MESSAGE)
+                continue
+            if slug:
+                customs.add(slug)
+            rows[index] = {'original': original, 'short': slug,
+                           'custom': bool(slug)}
+        return rows
+
+    @classmethod
+    def _drop_taken_customs(cls, rows: dict, results: List) -> None:
+        customs = {row['short']: index for index, row in rows.items()
+                   if row['custom']}
+        if not customs:
+            return
+        taken = db.session.execute(
+            db.select(cls.short).where(cls.short.in_(list(customs)))
+        ).scalars().all()
+        for slug in taken:
+            index = customs[slug]
+            del rows[index]
+            results[index] = SlugConflict(SLUG_CONFLICT_MESSAGE)
+
+    @classmethod
+    def _reuse_generated(cls, rows: dict, results: List) -> dict:
+        """
+        Подставляет уже существующие сгенерированные слаги для тех же URL.
+
+        Повторы одного URL внутри пачки получают один новый слаг: строка
+        остаётся только у первого вхождения, для остальных возвращается
+        отображение «индекс повтора -> индекс первого вхождения».
+        """
+        by_original = {}
+        for index, row in rows.items():
+            if not row['custom']:
+                by_original.setdefault(row['original'], []).append(index)
+        if not by_original:
+            return {}
+        existing = db.session.execute(
+            db.select(cls.original, cls.short)
+            .where(cls.original_hash.in_(
+                [hash_url(original) for original in by_original]),
+                cls.is_custom.is_(False), cls.disabled.is_(False))
+            .order_by(cls.id)
+        ).all()
+        reused = {}
+        for original, short in existing:
+            reused.setdefault(original, short)
+        followers = {}
+        for original, (first, *others) in by_original.items():
+            for index in others:
+                del rows[index]
+                followers[index] = first
+            if original in reused:
+                del rows[first]
+                results[first] = (original, reused[original])
+        return followers
+
+    @classmethod
+    def store_validated(
+            cls, items: List[Tuple[str, Optional[str]]],
+            warm_cache: bool = True,
+    ) -> List[Union[Tuple[str, str], ValueError]]:
+        """
+        Сохраняет пачку уже проверенных пар (original, slug) одной
+        транзакцией: один IN-запрос на алиасы и один пакетный INSERT.
+
+        Возвращает по элементу на каждую пару в исходном порядке:
+        (original, short) при успехе либо SlugConflict.
+        """
+        results: List = [None] * len(items)
+        rows = cls._batch_rows(items, results)
+        cls._drop_taken_customs(rows, results)
+        followers = {}
+        if current_app.config['DEDUP_AUTO_SLUGS']:
+            followers = cls._reuse_generated(rows, results)
+        generated = [row for row in rows.values() if not row['custom']]
+        for row, slug in zip(generated,
+                             slug_allocator.allocate_many(len(generated))):
+            row['short'] = slug
+        if rows:
+            cls._insert_rows(list(rows.values()))
+        for index, row in rows.items():
+            if 'error' in row:
+                results[index] = row['error']
+                continue
+            slug_filter.add(row['short'])
+            if warm_cache:
+                slug_cache.set(row['short'], row['original'])
+            results[index] = (row['original'], row['short'])
+        for index, first in followers.items():
+            results[index] = results[first]
+        return results
+
+    @classmethod
+    def create_many(
+            cls, items: Iterable[Tuple[str, Optional[str]]],
+    ) -> List[Union[Tuple[str, str], ValueError]]:
+        """
+        Создаёт пачку ссылок одной транзакцией.
+
+        Возвращает по элементу на каждую пару (url, custom_id) в исходном
+        порядке: (original, short) при успехе либо исключение валидации.
+        """
+        results: List = []
+        valid = {}
+        for index, (url, custom) in enumerate(items):
+            results.append(None)
+            try:
+                valid[index] = cls.validate_item(url, custom)
+            except (SlugInvalid, SlugConflict, UrlInvalid) as e:
+                results[index] = e
+        stored = cls.store_validated(list(valid.values()))
+        for index, result in zip(valid, stored):
+            results[index] = result
+        return results
+
+
+class SlugSequence(db.Model):
+    __tablename__ = 'slug_sequence'
+
+    name = db.Column(db.String(32), primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False)
+
+    @classmethod
+    def reserve(cls, count: int, name: str = 'url_map') -> int:
+        """Атомарно сдвигает счётчик на `count` и возвращает начало блока."""
+        table = cls.__table__
+        while True:
+            with db.engine.begin() as conn:
+                updated = conn.execute(
+                    table.update()
+                    .where(table.c.name == name)
+                    .values(next_value=table.c.next_value + count)
+                )
+                if updated.rowcount:
+                    end = conn.execute(
+                        db.select(table.c.next_value)
+                        .where(table.c.name == name)
+                    ).scalar_one()
+                    return end - count
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(
+                        table.insert().values(name=name, next_value=count))
+                return 0
+            except IntegrityError:
+                continue
+
+
+class ClickRollup(db.Model):
+    """Почасовые агрегаты переходов: одна строка на (слаг, час)."""
+    __tablename__ = 'click_rollup'
+    GRANULARITIES = ('hour', 'day', 'week')
+
+    short = db.Column(db.String(16), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    count = db.Column(db.BigInteger, nullable=False)
+
+    @staticmethod
+    def hour_bucket(moment: datetime) -> datetime:
+        return moment.replace(minute=0, second=0, microsecond=0)
+
+    @classmethod
+    def _upsert(cls, params: List[dict]) -> None:
+        table = cls.__table__
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            module = sqlite if dialect == 'sqlite' else postgresql
+            stmt = module.insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.short, table.c.bucket],
+                set_={'count': table.c.count + stmt.excluded['count']},
+            )
+            db.session.execute(stmt, params)
+            return
+        if dialect == 'mysql':
+            stmt = mysql.insert(table)
+            stmt = stmt.on_duplicate_key_update(
+                count=table.c.count + stmt.inserted['count'])
+            db.session.execute(stmt, params)
+            return
+        for row in params:
+            updated = db.session.execute(
+                table.update()
+                .where(table.c.short == row['short'],
+                       table.c.bucket == row['bucket'])
+                .values(count=table.c.count + row['count']))
+            if not updated.rowcount:
+                db.session.execute(table.insert(), [row])
+
+    @classmethod
+    def add(cls, deltas: dict) -> None:
+        """Принимает {(short, bucket): count}, складывает с уже записанным."""
+        cls._upsert([
+            {'short': short, 'bucket': bucket, 'count': count}
+            for (short, bucket), count in sorted(deltas.items())
+        ])
+
+    @classmethod
+    def _bucket_expr(cls, granularity: str):
+        bucket = cls.__table__.c.bucket
+        if granularity == 'hour':
+            return bucket
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'postgresql':
+            return db.func.date_trunc(granularity, bucket)
+        if dialect == 'mysql':
+            day = db.func.date(bucket)
+            if granularity == 'day':
+                return day
+            return db.func.subdate(day, db.func.weekday(bucket))
+        if granularity == 'day':
+            return db.func.strftime('%Y-%m-%d 00:00:00', bucket)
+        # Неделя начинается с понедельника, как date_trunc('week').
+        return db.func.strftime(
+            '%Y-%m-%d 00:00:00', bucket, 'weekday 0', '-6 days')
+
+    @classmethod
+    def series(cls, short: str, start: datetime, end: datetime,
+               granularity: str = 'hour') -> List[Tuple[datetime, int]]:
+        table = cls.__table__
+        period = cls._bucket_expr(granularity).label('period')
+        rows = db.session.execute(
+            db.select(period, db.func.sum(table.c.count))
+            .where(table.c.short == short,
+                   table.c.bucket >= cls.hour_bucket(start),
+                   table.c.bucket < end)
+            .group_by(period)
+            .order_by(period)
+        ).all()
+        return [
+            (value if isinstance(value, datetime)
+             else datetime.fromisoformat(str(value)), int(total))
+            for value, total in rows
+        ]
+
+
+class DiskFile(db.Model):
+    """
+    Файл на Диске по SHA-256 содержимого и выданная на него короткая
+    ссылка: повторная загрузка того же содержимого её и получает.
+    """
+    __tablename__ = 'disk_file'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    remote_path = db.Column(db.String(256), nullable=False, index=True)
+    short = db.Column(db.String(16), nullable=False)
+    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @classmethod
+    def lookup(cls, digests: Iterable[Optional[str]]) -> dict:
+        """{sha256: DiskFile} для уже известных хешей."""
+        digests = {digest for digest in digests if digest}
+        if not digests:
+            return {}
+        return {row.sha256: row for row in db.session.execute(
+            db.select(cls).where(cls.sha256.in_(digests))).scalars()}
+
+    @classmethod
+    def recorded_paths(cls, paths: Iterable[str]) -> set:
+        """Пути из `paths`, для которых ссылка уже выдана."""
+        paths = set(paths)
+        if not paths:
+            return set()
+        return set(db.session.execute(
+            db.select(cls.remote_path).where(cls.remote_path.in_(paths)))
+            .scalars())
+
+    @classmethod
+    def remember(cls, rows: List[dict]) -> None:
+        """Записывает новые хеши; известный хеш остаётся как был."""
+        if not rows:
+            return
+        table = cls.__table__
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            module = sqlite if dialect == 'sqlite' else postgresql
+            db.session.execute(
+                module.insert(table).on_conflict_do_nothing(), rows)
+        elif dialect == 'mysql':
+            db.session.execute(
+                mysql.insert(table).prefix_with('IGNORE'), rows)
+        else:
+            known = cls.lookup(row['sha256'] for row in rows)
+            fresh = [row for row in rows if row['sha256'] not in known]
+            if fresh:
+                db.session.execute(table.insert(), fresh)
+        db.session.commit()
+
+
+class UploadSlot(db.Model):
+    """
+    Слот прямой загрузки, который ещё не завершили. Ссылка Диска для PUT
+    живёт не дольше токена слота, поэтому файл просроченного слота уже
+    не изменится, и его можно удалить.
+    """
+    __tablename__ = 'upload_slot'
+
+    remote_path = db.Column(db.String(256), primary_key=True)
+    expires = db.Column(db.DateTime, nullable=False, index=True)
+
+    @classmethod
+    def issue(cls, paths: List[str], ttl: float) -> None:
+        if not paths:
+            return
+        expires = datetime.utcnow() + timedelta(seconds=ttl)
+        db.session.execute(cls.__table__.insert(), [
+            {'remote_path': path, 'expires': expires} for path in paths])
+        db.session.commit()
+
+    @classmethod
+    def settle(cls, paths: Iterable[str]) -> None:
+        """Снимает завершённые слоты с учёта."""
+        paths = list(paths)
+        if not paths:
+            return
+        table = cls.__table__
+        db.session.execute(
+            table.delete().where(table.c.remote_path.in_(paths)))
+        db.session.commit()
+
+    @classmethod
+    def take_expired(cls, limit: int = 100) -> List[str]:
+        """Забирает с учёта пути просроченных слотов для удаления с Диска."""
+        table = cls.__table__
+        paths = list(db.session.execute(
+            db.select(table.c.remote_path)
+            .where(table.c.expires <= datetime.utcnow())
+            .order_by(table.c.expires).limit(limit)).scalars())
+        cls.settle(paths)
+        return paths
+
+
+class UploadJob(db.Model):
+    """
+    Задание фоновой загрузки файлов на Диск в очереди на базе данных.
+
+    Воркер забирает задание условным UPDATE (`claim`) и получает аренду
+    с токеном на `lease` секунд; пока аренда жива, продлевает её
+    (`renew`). Если воркер упал, по истечении аренды задание забирает
+    другой. Состояние файлов хранится в `files` как JSON: имя, путь в
+    staging и, по мере готовности, ссылка на Диск, слаг или ошибка.
+    """
+    __tablename__ = 'upload_job'
+    __table_args__ = (
+        db.Index('ix_upload_job_status_available', 'status',
+                 'available_at'),
+    )
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+    id = db.Column(db.String(32), primary_key=True,
+                   default=lambda: uuid.uuid4().hex)
+    status = db.Column(db.String(16), nullable=False, default=QUEUED)
+    files = db.Column(db.Text, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False,
+                             default=datetime.utcnow)
+    lease_token = db.Column(db.String(32))
+    lease_until = db.Column(db.DateTime)
+    error = db.Column(db.Text)
+    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                        onupdate=datetime.utcnow)
+
+    @property
+    def entries(self) -> List[dict]:
+        return json.loads(self.files)
+
+    @entries.setter
+    def entries(self, value: List[dict]) -> None:
+        self.files = json.dumps(value, ensure_ascii=False)
+
+    @classmethod
+    def enqueue(cls, entries: List[dict]) -> 'UploadJob':
+        job = cls(files=json.dumps(entries, ensure_ascii=False))
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    @classmethod
+    def _ready(cls, now: datetime):
+        table = cls.__table__
+        return db.or_(
+            db.and_(table.c.status == cls.QUEUED,
+                    table.c.available_at <= now),
+            db.and_(table.c.status == cls.RUNNING,
+                    table.c.lease_until < now),
+        )
+
+    @classmethod
+    def claim(cls, lease: float,
+              attempts: int = 8) -> Optional['UploadJob']:
+        """
+        Берёт в аренду самое старое готовое задание, в том числе с
+        истёкшей арендой упавшего воркера. Гонку за одно задание решает
+        условный UPDATE: проигравший пробует следующее.
+        """
+        table = cls.__table__
+        for _ in range(attempts):
+            now = datetime.utcnow()
+            job_id = db.session.execute(
+                db.select(table.c.id).where(cls._ready(now))
+                .order_by(table.c.available_at).limit(1)
+            ).scalar()
+            if job_id is None:
+                return None
+            token = uuid.uuid4().hex
+            updated = db.session.execute(
+                table.update()
+                .where(table.c.id == job_id, cls._ready(now))
+                .values(status=cls.RUNNING, lease_token=token,
+                        lease_until=now + timedelta(seconds=lease),
+                        attempts=table.c.attempts + 1, updated=now))
+            db.session.commit()
+            if updated.rowcount:
+                return db.session.get(cls, job_id, populate_existing=True)
+        return None
+
+    def _owned(self, **values) -> bool:
+        table = type(self).__table__
+        updated = db.session.execute(
+            table.update()
+            .where(table.c.id == self.id,
+                   table.c.lease_token == self.lease_token)
+            .values(updated=datetime.utcnow(), **values))
+        db.session.commit()
+        return bool(updated.rowcount)
+
+    def renew(self, lease: float) -> bool:
+        """Продлевает аренду и сохраняет `files`; False — аренда потеряна."""
+        return self._owned(
+            files=self.files,
+            lease_until=datetime.utcnow() + timedelta(seconds=lease))
+
+    def release(self, delay: float, error: str = None, **values) -> bool:
+        """Возвращает задание в очередь для повтора через `delay` секунд."""
+        return self._owned(
+            status=self.QUEUED, files=self.files, error=error,
+            lease_token=None, lease_until=None,
+            available_at=datetime.utcnow() + timedelta(seconds=delay),
+            **values)
+
+    def finish(self, status: str, error: str = None) -> bool:
+        return self._owned(status=status, files=self.files, error=error,
+                           lease_token=None, lease_until=None)
+
+
+def _load_shorts():
+    table = URLMap.__table__
+    # Фильтр перестраивается в фоновом потоке, вне контекста приложения.
+    with app.app_context():
+        engine = db.engine
+    conn = engine.connect()
+    try:
+        count = conn.execute(
+            db.select(db.func.count()).select_from(table)).scalar_one()
+        result = conn.execution_options(yield_per=10000).execute(
+            db.select(table.c.short))
+    except Exception:
+        conn.close()
+        raise
+
+    def shorts():
+        try:
+            yield from result.scalars()
+        finally:
+            conn.close()
+
+    return count, shorts()
+
+
+slug_filter = SlugFilter(
+    load=_load_shorts,
+    error_rate=app.config['BLOOM_ERROR_RATE'],
+    refresh_interval=app.config['BLOOM_REFRESH_INTERVAL'],
+)
+slug_allocator = SlugAllocator(
+    reserve=SlugSequence.reserve,
+    block_size=app.config['SLUG_BLOCK_SIZE'],
+    min_width=app.config['SHORT_URL_LENGTH'],
+    key=(app.config['SLUG_SCRAMBLE_KEY'] or '').encode() or None,
+)
+
+
+@event.listens_for(URLMap, 'after_insert')
+@event.listens_for(URLMap, 'after_update')
+def _remember_slug(mapper, connection, target):
+    slug_filter.add(target.short)
+
+
+@event.listens_for(URLMap, 'after_update')
+@event.listens_for(URLMap, 'after_delete')
+def _invalidate_cached_slug(mapper, connection, target):
+    slug_cache.delete(target.short)
+    old_shorts = inspect(target).attrs.short.history.deleted or ()
+    for short in old_shorts:
+        slug_cache.delete(short)
@@ -0,0 +1,156 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Tuple, TypeVar
+
+T = TypeVar('T')
+
+CIRCUIT_OPEN_MESSAGE = (
+    'Яндекс Диск временно недоступен. Повторите попытку позже.')
+
+
+class CircuitOpen(RuntimeError):
+    """Внешний сервис признан недоступным, вызов отклонён без попытки."""
+
+
+class CircuitBreaker:
+    """
+    Автомат «закрыт → открыт → полуоткрыт» для вызовов внешнего API.
+
+    После `threshold` сбоев подряд вызовы `reset_timeout` секунд сразу
+    получают CircuitOpen, не дожидаясь таймаутов. Затем пропускается
+    один пробный вызов: успех закрывает автомат, сбой снова открывает.
+    """
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.state = 'closed'
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def _cooling(self) -> bool:
+        return (self.state == 'open' and time.monotonic()
+                - self._opened_at < self.reset_timeout)
+
+    def check(self) -> None:
+        """Поднимает CircuitOpen, пока автомат открыт; пробу не занимает."""
+        with self._lock:
+            if self._cooling():
+                raise CircuitOpen(CIRCUIT_OPEN_MESSAGE)
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == 'closed':
+                return
+            if self.state == 'open' and not self._cooling():
+                self.state = 'half-open'
+            if self.state == 'half-open' and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpen(CIRCUIT_OPEN_MESSAGE)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probing = False
+
+    def release_probe(self) -> None:
+        """Проба прервана, не дав ответа: следующий вызов пробует снова."""
+        with self._lock:
+            self._probing = False
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == 'half-open' or self.failures >= self.threshold:
+                if self.state != 'open':
+                    self.opened += 1
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'state': self.state, 'failures': self.failures,
+                    'opened': self.opened}
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Экспоненциальная задержка с полным джиттером."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+async def call_with_retries(
+        call: Callable[[], Awaitable[T]], *,
+        attempts: int, base_delay: float, max_delay: float,
+        breaker: CircuitBreaker,
+        classify: Callable[[BaseException], Tuple[bool, bool]],
+        on_retry: Callable[[], None] = lambda: None,
+) -> T:
+    """
+    Вызывает `call()` до `attempts` раз с паузами `backoff_delay`.
+
+    `classify(exc) -> (повторять, считать сбоем сервиса)`: например,
+    429 стоит повторить, но автомат из-за него открывать не нужно.
+    """
+    for attempt in range(attempts):
+        breaker.before_call()
+        try:
+            result = await call()
+        except Exception as exc:
+            retryable, outage = classify(exc)
+            if outage:
+                breaker.on_failure()
+            else:
+                breaker.on_success()
+            if not retryable or attempt == attempts - 1:
+                raise
+            on_retry()
+            await asyncio.sleep(backoff_delay(attempt, base_delay, max_delay))
+        except BaseException:
+            # Отмена (CancelledError) ничего не говорит о сервисе, но
+            # без этого полуоткрытый автомат навсегда остался бы с пробой.
+            breaker.release_probe()
+            raise
+        else:
+            breaker.on_success()
+            return result
+
+
+async def hedged(call: Callable[[], Awaitable[T]], delay: float,
+                 on_hedge: Callable[[], None] = lambda: None) -> T:
+    """
+    Если `call()` не ответил за `delay` секунд, запускает второй такой же
+    вызов и возвращает первый успешный результат; второй отменяется.
+    Подходит только для идемпотентных запросов.
+    """
+    if not delay:
+        return await call()
+    first = asyncio.ensure_future(call())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+    on_hedge()
+    pending = {first, asyncio.ensure_future(call())}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
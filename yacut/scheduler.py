@@ -0,0 +1,284 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Hashable, List, Optional
+
+# Верхние границы корзин гистограммы ожидания в очереди, секунды.
+WAIT_BUCKETS = (0.01, 0.1, 0.5, 1, 5, 30, float('inf'))
+
+
+class UploadBusy(RuntimeError):
+    """Очередь загрузок переполнена, запрос отклонён без ожидания."""
+
+
+class _Waiter:
+    __slots__ = ('loop', 'future', 'granted')
+
+    def __init__(self, loop, future):
+        self.loop = loop
+        self.future = future
+        self.granted = False
+
+
+class Reservation:
+    """
+    Место в очереди, занятое `admit` до того, как загрузка в неё встала.
+    Переходит в очередь в `slot`; если загрузка так до неё и не дошла
+    (отменена раньше), место возвращает `release`.
+    """
+    __slots__ = ('_scheduler', 'held')
+
+    def __init__(self, scheduler: 'UploadScheduler'):
+        self._scheduler = scheduler
+        self.held = True
+
+    def release(self) -> None:
+        with self._scheduler._lock:
+            self._scheduler._take(self)
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class UploadScheduler:
+    """
+    Планировщик загрузок процесса с общим бюджетом параллельности.
+
+    Одновременно выполняется не больше `concurrency` загрузок.
+    Освободившийся слот достаётся следующему владельцу (запросу) по
+    кругу, а не следующему файлу в порядке FIFO, поэтому запрос с
+    десятком файлов задерживает остальных не больше чем на один слот.
+    Очередь ограничена `max_queue` файлами: `admit` сразу занимает
+    места под файлы запроса, а сверх лимита поднимает UploadBusy.
+    Состояние защищено блокировкой, ожидающие будятся на своём цикле
+    событий; после fork состояние сбрасывается.
+    """
+
+    def __init__(self, concurrency: int, max_queue: int):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._queues = OrderedDict()
+        self._active = 0
+        self._waiting = 0
+        self._reserved = 0
+        self.rejected = 0
+        self._wait_count = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_buckets = [0] * len(WAIT_BUCKETS)
+
+    def _check_fork(self) -> None:
+        if self._pid != os.getpid():
+            self._reset()
+
+    def admit(self, count: int) -> List[Reservation]:
+        """
+        Занимает места под `count` загрузок или отклоняет запрос, если
+        очередь заполнена. Места учитываются сразу, ещё до постановки
+        загрузок в очередь, поэтому одновременные запросы не проходят
+        проверку вместе сверх лимита.
+        """
+        with self._lock:
+            self._check_fork()
+            free = max(0, self.concurrency - self._active)
+            queued = self._waiting + self._reserved
+            if queued + count > self.max_queue + free:
+                self.rejected += count
+                raise UploadBusy(
+                    'Сервис загрузки файлов перегружен. '
+                    'Повторите попытку позже.')
+            self._reserved += count
+            return [Reservation(self) for _ in range(count)]
+
+    def _take(self, reservation: Optional[Reservation]) -> None:
+        if reservation is not None and reservation.held:
+            reservation.held = False
+            # После fork счётчик сброшен, а места родителя уже не в нём.
+            self._reserved = max(0, self._reserved - 1)
+
+    def _record_wait(self, seconds: float) -> None:
+        self._wait_count += 1
+        self._wait_total += seconds
+        self._wait_max = max(self._wait_max, seconds)
+        self._wait_buckets[bisect_left(WAIT_BUCKETS, seconds)] += 1
+
+    def _dispatch(self) -> None:
+        while self._active < self.concurrency and self._queues:
+            owner, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(owner)
+            else:
+                del self._queues[owner]
+            self._waiting -= 1
+            self._active += 1
+            waiter.granted = True
+            waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+
+    def set_concurrency(self, concurrency: int) -> None:
+        with self._lock:
+            self.concurrency = concurrency
+            self._dispatch()
+
+    def _release(self) -> None:
+        with self._lock:
+            self._active -= 1
+            self._dispatch()
+
+    def _cancel(self, owner: Hashable, waiter: _Waiter) -> None:
+        with self._lock:
+            if waiter.granted:
+                self._active -= 1
+                self._dispatch()
+                return
+            queue = self._queues[owner]
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[owner]
+            self._waiting -= 1
+
+    async def _acquire(self, owner: Hashable,
+                       reservation: Optional[Reservation] = None) -> None:
+        started = time.monotonic()
+        with self._lock:
+            self._check_fork()
+            self._take(reservation)
+            if self._active < self.concurrency and not self._waiting:
+                self._active += 1
+                self._record_wait(0.0)
+                return
+            loop = asyncio.get_running_loop()
+            waiter = _Waiter(loop, loop.create_future())
+            self._queues.setdefault(owner, deque()).append(waiter)
+            self._waiting += 1
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            self._cancel(owner, waiter)
+            raise
+        with self._lock:
+            self._record_wait(time.monotonic() - started)
+
+    @asynccontextmanager
+    async def slot(self, owner: Hashable,
+                   reservation: Optional[Reservation] = None):
+        await self._acquire(owner, reservation)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'concurrency': self.concurrency,
+                'max_queue': self.max_queue,
+                'active': self._active,
+                'waiting': self._waiting,
+                'reserved': self._reserved,
+                'rejected': self.rejected,
+                'queue_wait_count': self._wait_count,
+                'queue_wait_avg': (self._wait_total / self._wait_count
+                                   if self._wait_count else 0.0),
+                'queue_wait_max': self._wait_max,
+                'queue_wait_buckets': {
+                    ('+Inf' if bound == float('inf') else str(bound)): count
+                    for bound, count in zip(WAIT_BUCKETS, self._wait_buckets)
+                },
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._reset()
+
+
+class AimdLimit:
+    """
+    Адаптивный лимит параллельности планировщика (AIMD).
+
+    Успешный вызов увеличивает лимит на 1/limit, то есть примерно на
+    единицу за «окно» из limit вызовов, но только если задержка не выше
+    `latency_tolerance` базовой (медленно дрейфующего минимума). Ответ
+    429/5xx уменьшает лимит в `1 / backoff` раз, если вызов начался
+    после предыдущего уменьшения: отказы вызовов, запущенных ещё при
+    старом лимите, его повторно не снижают. Retry-After приостанавливает
+    вызовы до указанного момента: `delay()` возвращает остаток паузы.
+    Без планировщика лимит только считается: по нему пул аккаунтов
+    выбирает, куда отправить загрузку.
+    """
+
+    def __init__(self, scheduler: Optional[UploadScheduler], min_limit: int,
+                 max_limit: int, backoff: float = 0.5,
+                 latency_tolerance: float = 2.0, initial_limit: int = None):
+        self.scheduler = scheduler
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.initial_limit = (scheduler.concurrency if initial_limit is None
+                              else initial_limit)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.limit = float(self.initial_limit)
+        self._apply()
+        self._baseline = None
+        self._decreased_at = -math.inf
+        self.paused_until = 0.0
+        self.throttled = 0
+
+    def _apply(self) -> None:
+        if self.scheduler is not None:
+            self.scheduler.set_concurrency(int(self.limit))
+
+    def on_success(self, latency: float = None) -> None:
+        with self._lock:
+            if latency is not None:
+                baseline = self._baseline
+                self._baseline = (latency if baseline is None
+                                  else min(latency, baseline * 1.01))
+                if latency > self._baseline * self.latency_tolerance:
+                    return
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._apply()
+
+    def on_throttle(self, started: float,
+                    retry_after: float = None) -> None:
+        """`started` — момент начала вызова по `time.monotonic()`."""
+        now = time.monotonic()
+        with self._lock:
+            self.throttled += 1
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+            if started < self._decreased_at:
+                return
+            self._decreased_at = now
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            self._apply()
+
+    def delay(self) -> float:
+        return max(0.0, self.paused_until - time.monotonic())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'limit': round(self.limit, 2),
+                'min_limit': self.min_limit,
+                'max_limit': self.max_limit,
+                'throttled': self.throttled,
+                'latency_baseline': self._baseline,
+                'paused_for': round(self.delay(), 3),
+            }
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import string
+import threading
+from typing import Callable, List, Optional
+
+ALPHABET = string.ascii_letters + string.digits
+BASE = len(ALPHABET)
+MAX_WIDTH = 16
+FEISTEL_ROUNDS = 4
+
+
+def encode_base62(value: int, width: int) -> str:
+    chars = []
+    for _ in range(width):
+        value, rem = divmod(value, BASE)
+        chars.append(ALPHABET[rem])
+    if value:
+        raise ValueError('Значение не помещается в заданную ширину.')
+    return ''.join(reversed(chars))
+
+
+class Scrambler:
+    """
+    Биективная перестановка чисел из [0, 62**width).
+
+    Сбалансированная сеть Фейстеля на ближайшей чётной степени двойки
+    с «прогулкой по циклу» до попадания в нужный диапазон: соседние
+    значения счётчика превращаются в непохожие друг на друга слаги.
+    """
+
+    def __init__(self, key: bytes, rounds: int = FEISTEL_ROUNDS):
+        self.key = hashlib.blake2b(key, digest_size=32).digest()
+        self.rounds = rounds
+
+    def _round(self, half: int, index: int, mask: int) -> int:
+        digest = hashlib.blake2b(
+            half.to_bytes(16, 'big') + bytes([index]),
+            key=self.key, digest_size=16,
+        ).digest()
+        return int.from_bytes(digest, 'big') & mask
+
+    def _feistel(self, value: int, bits: int) -> int:
+        half_bits = bits // 2
+        mask = (1 << half_bits) - 1
+        left, right = value >> half_bits, value & mask
+        for index in range(self.rounds):
+            left, right = right, left ^ self._round(right, index, mask)
+        return (left << half_bits) | right
+
+    def permute(self, value: int, domain: int) -> int:
+        bits = (domain - 1).bit_length()
+        bits += bits % 2
+        value = self._feistel(value, bits)
+        while value >= domain:
+            value = self._feistel(value, bits)
+        return value
+
+
+class SlugAllocator:
+    """
+    Выдаёт короткие идентификаторы из монотонного счётчика в базе.
+
+    Счётчик резервируется блоками по `block_size` значений через
+    `reserve(count) -> first`, поэтому обращение к базе нужно лишь раз
+    на блок. Значение кодируется в base62 шириной не меньше `min_width`
+    и, если задан ключ, предварительно перемешивается `Scrambler`.
+    После fork() дочерний процесс заново резервирует свой блок.
+    """
+
+    def __init__(self, reserve: Callable[[int], int], block_size: int = 100,
+                 min_width: int = 6, key: Optional[bytes] = None):
+        self._reserve = reserve
+        self.block_size = block_size
+        self.min_width = min_width
+        self.scrambler = Scrambler(key) if key else None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self._pid = os.getpid()
+        self._next = 0
+        self._end = 0
+
+    def _take(self, count: int) -> List[int]:
+        values = []
+        with self._lock:
+            if self._pid != os.getpid():
+                self.reset()
+            while len(values) < count:
+                if self._next >= self._end:
+                    block = max(self.block_size, count - len(values))
+                    self._next = self._reserve(block)
+                    self._end = self._next + block
+                take = min(count - len(values), self._end - self._next)
+                values.extend(range(self._next, self._next + take))
+                self._next += take
+        return values
+
+    def encode(self, value: int) -> str:
+        width = self.min_width
+        while value >= BASE ** width:
+            width += 1
+        if width > MAX_WIDTH:
+            raise RuntimeError('Исчерпано пространство коротких ссылок.')
+        if self.scrambler is not None:
+            value = self.scrambler.permute(value, BASE ** width)
+        return encode_base62(value, width)
+
+    def allocate(self) -> str:
+        return self.encode(self._take(1)[0])
+
+    def allocate_many(self, count: int) -> List[str]:
+        return [self.encode(value) for value in self._take(count)]
@@ -0,0 +1,147 @@
+// Загрузка файлов браузером напрямую на Яндекс Диск: приложение выдаёт
+// ссылки для загрузки и после неё создаёт короткие ссылки. Если API
+// слотов недоступно, файлы уходят через приложение, а ссылки приходят
+// по мере готовности (Server-Sent Events); без них — обычная отправка.
+(function () {
+  'use strict';
+
+  const form = document.querySelector('form[data-slots-url]');
+  if (!form || !window.fetch) {
+    return;
+  }
+  const input = form.querySelector('input[type="file"]');
+  const submit = form.querySelector('[type="submit"]');
+  const background = form.querySelector('input[name="background"]');
+  const results = document.getElementById('direct-upload-results');
+  const errors = document.getElementById('direct-upload-errors');
+
+  async function postJson(url, body) {
+    const response = await fetch(url, {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'},
+      body: JSON.stringify(body),
+    });
+    const data = await response.json();
+    if (!response.ok) {
+      const error = new Error(data.message || response.statusText);
+      error.status = response.status;
+      throw error;
+    }
+    return data;
+  }
+
+  async function putFile(slot, file) {
+    try {
+      const response = await fetch(slot.href, {method: slot.method, body: file});
+      return response.ok;
+    } catch (error) {
+      return false;
+    }
+  }
+
+  function show(items) {
+    results.replaceChildren(...items.map((item) => {
+      const li = document.createElement('li');
+      if (item.short_link) {
+        const link = document.createElement('a');
+        link.href = item.short_link;
+        link.target = '_blank';
+        link.rel = 'noopener noreferrer';
+        link.textContent = item.name;
+        li.append(link);
+      } else {
+        li.textContent = `${item.name}: ${item.error}`;
+        li.className = 'text-danger';
+      }
+      return li;
+    }));
+    results.hidden = false;
+  }
+
+  async function upload(files) {
+    const slots = await postJson(form.dataset.slotsUrl, {
+      files: files.map((file) => ({name: file.name, size: file.size})),
+    });
+    const uploaded = await Promise.all(slots.items.map(
+      (slot, index) => slot.href ? putFile(slot, files[index]) : false));
+    const failed = slots.items.filter((slot) => !slot.token);
+    const tokens = slots.items.filter((slot) => slot.token)
+      .map((slot) => slot.token);
+    if (!uploaded.some(Boolean)) {
+      show(slots.items.map((slot) => ({
+        name: slot.name, error: slot.error || 'Не удалось загрузить файл',
+      })));
+      return;
+    }
+    const finalized = await postJson(form.dataset.finalizeUrl, {tokens});
+    show(finalized.items.concat(failed));
+  }
+
+  function parseEvent(block) {
+    const fields = {};
+    for (const line of block.split('\n')) {
+      const colon = line.indexOf(': ');
+      fields[line.slice(0, colon)] = line.slice(colon + 2);
+    }
+    return fields;
+  }
+
+  async function streamUpload() {
+    const response = await fetch(form.action || window.location.href, {
+      method: 'POST',
+      body: new FormData(form),
+      headers: {Accept: 'text/event-stream'},
+    });
+    const type = response.headers.get('Content-Type') || '';
+    if (!type.startsWith('text/event-stream')) {
+      // Ошибки формы и 503 сервер отдаёт обычной страницей.
+      form.submit();
+      return;
+    }
+    const items = [];
+    const reader = response.body.pipeThrough(new TextDecoderStream())
+      .getReader();
+    let buffer = '';
+    for (;;) {
+      const {value, done} = await reader.read();
+      if (done) {
+        return;
+      }
+      buffer += value;
+      let end;
+      while ((end = buffer.indexOf('\n\n')) !== -1) {
+        const fields = parseEvent(buffer.slice(0, end));
+        buffer = buffer.slice(end + 2);
+        if (fields.event === 'file') {
+          const item = JSON.parse(fields.data);
+          items[item.index] = {
+            name: item.name, short_link: item.short, error: item.error,
+          };
+          show(items.filter(Boolean));
+        }
+      }
+    }
+  }
+
+  form.addEventListener('submit', async (event) => {
+    const files = Array.from(input.files || []);
+    // Фоновую загрузку выполняет сервер: форма уходит как есть.
+    if (!files.length || (background && background.checked)) {
+      return;
+    }
+    event.preventDefault();
+    errors.textContent = '';
+    submit.disabled = true;
+    try {
+      await upload(files);
+    } catch (error) {
+      if ([400, 413, 503].includes(error.status)) {
+        errors.textContent = error.message;
+      } else {
+        await streamUpload().catch(() => form.submit());
+      }
+    } finally {
+      submit.disabled = false;
+    }
+  });
+})();
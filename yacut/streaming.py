@@ -0,0 +1,133 @@
+"""
+Потоковый разбор multipart/form-data для загрузки файлов на Диск.
+
+Части читаются из тела запроса по мере поступления и сразу передаются
+в загрузку через `ChunkPipe`, без SpooledTemporaryFile. Ограничения
+формы (`MAX_FILES`, `MAX_ONE_FILE`, `ALLOWED_EXTS`) проверяются до
+чтения данных части, а превышение размера прерывает загрузку.
+"""
+from concurrent.futures import Future
+from typing import Hashable, List, Optional, Tuple
+
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.sansio.multipart import (Data, Epilogue, Field, File,
+                                       MultipartDecoder, NeedData)
+from werkzeug.utils import secure_filename
+
+from .forms import ALLOWED_EXTS, MAX_FILES, MAX_ONE_FILE
+from .yandexdisk import ChunkPipe, start_upload
+
+FILES_FIELD = 'files'
+READ_SIZE = 64 * 1024
+# Заголовки частей и значения обычных полей держатся в памяти.
+MAX_FORM_MEMORY = 1024 * 1024
+
+
+class UploadRejected(Exception):
+    """Запрос на загрузку нарушает ограничения формы."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _too_large(name: str) -> UploadRejected:
+    return UploadRejected(
+        f'Файл «{name}» больше {MAX_ONE_FILE // (1024 * 1024)} МБ',
+        status_code=413)
+
+
+def _extension(name: str) -> str:
+    return name.rpartition('.')[2].lower() if '.' in name else ''
+
+
+def check_file(name: str, size: Optional[int] = None) -> None:
+    """Проверяет расширение и заявленный размер файла."""
+    if _extension(name) not in ALLOWED_EXTS:
+        raise UploadRejected(f'Недопустимый формат файла «{name}»')
+    if size is not None and size > MAX_ONE_FILE:
+        raise _too_large(name)
+
+
+class _Parts:
+    """Состояние разбора: текущая часть и начатые загрузки."""
+
+    def __init__(self, owner: Hashable):
+        self.owner = owner
+        self.uploads: List[Tuple[str, ChunkPipe]] = []
+        self.pipe: Optional[ChunkPipe] = None
+        self.name = ''
+        self.size = 0
+
+    def on_field(self, event: Field) -> None:
+        self.pipe = None
+
+    def on_file(self, event: File) -> None:
+        self.pipe, self.size = None, 0
+        self.name = (event.filename or '').strip()
+        if event.name != FILES_FIELD or not secure_filename(self.name):
+            return
+        if len(self.uploads) >= MAX_FILES:
+            raise UploadRejected(
+                f'Можно загрузить не более {MAX_FILES} файлов')
+        check_file(self.name, event.headers.get('Content-Length', type=int))
+        self.pipe = start_upload(self.name, self.owner)
+        self.uploads.append((self.name, self.pipe))
+
+    def on_data(self, event: Data) -> None:
+        if self.pipe is None:
+            return
+        self.size += len(event.data)
+        if self.size > MAX_ONE_FILE:
+            raise _too_large(self.name)
+        # Если загрузка уже упала, остаток части просто пропускается.
+        if event.data and not self.pipe.send(event.data):
+            self.pipe = None
+            return
+        if not event.more_data:
+            self.pipe.send(None)
+            self.pipe = None
+
+    def cancel(self) -> None:
+        for _, pipe in self.uploads:
+            pipe.consumer.cancel()
+
+
+def _parse(stream, decoder: MultipartDecoder, parts: _Parts,
+           read_size: int) -> None:
+    handlers = {Field: parts.on_field, File: parts.on_file,
+                Data: parts.on_data}
+    while True:
+        event = decoder.next_event()
+        if isinstance(event, NeedData):
+            decoder.receive_data(stream.read(read_size) or None)
+        elif isinstance(event, Epilogue):
+            return
+        elif type(event) in handlers:
+            handlers[type(event)](event)
+
+
+def stream_uploads(stream, boundary: bytes, owner: Hashable,
+                   read_size: int = None) -> List[Tuple[str, Future]]:
+    """
+    Читает тело запроса и запускает загрузку каждого файла на Диск.
+
+    Возвращает пары (имя файла, future с Uploaded), когда
+    тело прочитано целиком. При нарушении ограничений поднимает
+    UploadRejected и отменяет уже начатые загрузки.
+    """
+    decoder = MultipartDecoder(boundary, max_form_memory_size=MAX_FORM_MEMORY)
+    parts = _Parts(owner)
+    try:
+        _parse(stream, decoder, parts, read_size or READ_SIZE)
+    except RequestEntityTooLarge:
+        parts.cancel()
+        raise UploadRejected('Слишком большой заголовок или поле формы',
+                             status_code=413)
+    except ValueError:
+        parts.cancel()
+        raise UploadRejected('Некорректное тело multipart/form-data')
+    except BaseException:
+        parts.cancel()
+        raise
+    return [(name, pipe.consumer) for name, pipe in parts.uploads]
@@ -1,11 +1,21 @@
-from flask import render_template, request, flash, redirect, url_for, abort
+import json
+from typing import Iterator, List
+
+from aiohttp import ClientResponseError
+from flask import (Response, abort, flash, redirect, render_template,
+                   request, url_for)
 from werkzeug.utils import secure_filename
 
 from . import app
+from .clicks import record_click
+from .dedup import file_digests, link_results, start_uploads
 from .forms import FileUploaderForm, ShortLinkForm
+from .jobs import enqueue_upload
 from .models import URLMap, SlugInvalid, SlugConflict, UrlInvalid
-from .shortener import create_short_link
-from .yandexdisk import upload_files_to_disk
+from .resilience import CircuitOpen
+from .scheduler import UploadBusy
+from .yandexdisk import (Pending, UploadResult, aiter_completed,
+                         download_links, is_disk_path, iter_completed)
 
 
 @app.route('/', methods=['GET', 'POST'], endpoint='index_view')
@@ -32,12 +42,71 @@ async def index_view():
     return render_template('index.html', form=form)
 
 
+def redirect_target(original: str) -> str:
+    """Куда вести переход: путь на Диске заменяется ссылкой на скачивание."""
+    if not is_disk_path(original):
+        return original
+    try:
+        return download_links.resolve(original)
+    except Exception as e:
+        if isinstance(e, ClientResponseError) and e.status == 404:
+            abort(404)
+        app.logger.warning('Не удалось получить ссылку на %s: %r',
+                           original, e)
+        abort(503)
+
+
 @app.route('/<string:short>')
 def follow_short(short):
-    row = URLMap.query.filter_by(short=short).first_or_404()
-    if not row:
+    original = URLMap.get_original(short)
+    if original is None:
         abort(404)
-    return redirect(row.original, code=302)
+    target = redirect_target(original)
+    record_click(short)
+    return redirect(target, code=302)
+
+
+def _file_item(result: UploadResult, created, url_root: str) -> dict:
+    item = {'index': result.index, 'name': result.name.strip()}
+    if isinstance(result.error, CircuitOpen):
+        item['error'] = str(result.error)
+    elif result.error is not None:
+        item['error'] = 'Не удалось загрузить файл'
+    elif isinstance(created, ValueError):
+        item['error'] = str(created)
+    else:
+        item['short'] = url_root + created[1]
+    return item
+
+
+def _file_items(results: List[UploadResult], url_root: str) -> List[dict]:
+    """Создаёт короткие ссылки на загруженные файлы одной транзакцией."""
+    results = sorted(results)
+    return [_file_item(result, created, url_root)
+            for result, created in zip(results, link_results(results))]
+
+
+def _event(name: str, data: dict) -> str:
+    return f'event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+def _upload_events(pending: Pending, url_root: str) -> Iterator[str]:
+    # Строка пишется сразу по готовности файла, чтобы показанная
+    # ссылка уже работала, не дожидаясь самого медленного файла.
+    # Контекст запроса async-представления сюда не переносится
+    # (stream_with_context с ним несовместим), поэтому свой контекст.
+    counts = {'uploaded': 0, 'failed': 0}
+    with app.app_context():
+        for result in iter_completed(pending):
+            item = _file_items([result], url_root)[0]
+            counts['failed' if 'error' in item else 'uploaded'] += 1
+            yield _event('file', item)
+    yield _event('done', counts)
+
+
+def _wants_event_stream() -> bool:
+    return request.accept_mimetypes.best_match(
+        ['text/html', 'text/event-stream']) == 'text/event-stream'
 
 
 @app.route('/files', methods=['GET', 'POST'])
@@ -45,24 +114,26 @@ async def upload_file_and_get_url():
     form = FileUploaderForm()
     items = []
     if request.method == 'POST' and form.validate_on_submit():
-        file_objs = []
-        file_names = []
-        for f in (form.files.data or []):
-            if not f:
-                continue
-            raw = (f.filename or '').strip()
-            safe = secure_filename(raw)
-            if not safe:
-                continue
-            file_objs.append(f)
-            file_names.append(raw)
-
-        download_urls = await upload_files_to_disk(file_objs)
-
-        items = []
-        for fname, download_url in zip(file_names, download_urls):
-            obj = create_short_link(original_url=download_url)
-            short = url_for('follow_short', short=obj.short, _external=True)
-            items.append({'name': fname, 'short': short})
+        files = [f for f in (form.files.data or [])
+                 if f and secure_filename((f.filename or '').strip())]
+        if form.background.data:
+            job = enqueue_upload(files)
+            return render_template('file_uploader.html', form=form,
+                                   items=[], job=job), 202
+        digests = await file_digests(files)
+        try:
+            pending = start_uploads(files, digests=digests)
+        except (UploadBusy, CircuitOpen) as e:
+            form.files.errors.append(str(e))
+            return render_template('file_uploader.html', form=form,
+                                   items=[]), 503
+
+        if _wants_event_stream():
+            return Response(_upload_events(pending, request.url_root),
+                            mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache'})
+        items = _file_items(
+            [result async for result in aiter_completed(pending)],
+            request.url_root)
 
     return render_template('file_uploader.html', form=form, items=items)
@@ -1,31 +1,97 @@
 import asyncio
+import atexit
+import concurrent.futures
+import functools
+import hashlib
+import logging
 import os
+import threading
+import time
 import uuid
-from typing import List, Optional
+from email.utils import parsedate_to_datetime
+from typing import (AsyncIterator, Awaitable, Callable, Dict, Hashable,
+                    Iterator, List, NamedTuple, Optional, Tuple)
 
 import aiohttp
 from aiohttp import ClientSession, ClientTimeout
 from dotenv import load_dotenv
+from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
 
+from . import app
+from .accounts import DiskAccount, is_location, make_account_pool
+from .cache import TTLCache
+from .resilience import (CircuitBreaker, CircuitOpen, call_with_retries,
+                         hedged)
+from .scheduler import AimdLimit, Reservation, UploadScheduler
+
+logger = logging.getLogger(__name__)
+
 API_HOST = 'https://cloud-api.yandex.net/'
 API_VERSION = 'v1'
 REQUEST_UPLOAD_URL = f'{API_HOST}{API_VERSION}/disk/resources/upload'
 RESOURCES_URL = f'{API_HOST}{API_VERSION}/disk/resources'
 PUBLISH_URL = f'{API_HOST}{API_VERSION}/disk/resources/publish'
 DOWNLOAD_URL = f'{API_HOST}{API_VERSION}/disk/resources/download'
+DISK_INFO_URL = f'{API_HOST}{API_VERSION}/disk/'
 
 load_dotenv()
-DISK_TOKEN = os.environ.get('DISK_TOKEN')
-AUTH_HEADER = {'Authorization': f'OAuth {DISK_TOKEN}'}
 
 _CONCURRENCY = int(os.getenv('YA_CONCURRENCY', '4'))
-_SEM = asyncio.Semaphore(_CONCURRENCY)
+_MAX_QUEUE = int(os.getenv('YA_MAX_QUEUE', '100'))
+_CONCURRENCY_MIN = int(os.getenv('YA_CONCURRENCY_MIN', '1'))
+_CONCURRENCY_MAX = int(os.getenv('YA_CONCURRENCY_MAX', '32'))
+POOL_LIMIT = int(os.getenv('DISK_POOL_LIMIT', '100'))
+POOL_LIMIT_PER_HOST = int(os.getenv('DISK_POOL_LIMIT_PER_HOST', '16'))
+KEEPALIVE_TIMEOUT = float(os.getenv('DISK_KEEPALIVE_TIMEOUT', '30'))
+DNS_CACHE_TTL = int(os.getenv('DISK_DNS_CACHE_TTL', '300'))
+RETRY_ATTEMPTS = int(os.getenv('DISK_RETRY_ATTEMPTS', '4'))
+RETRY_BASE_DELAY = float(os.getenv('DISK_RETRY_BASE_DELAY', '0.2'))
+RETRY_MAX_DELAY = float(os.getenv('DISK_RETRY_MAX_DELAY', '5'))
+HEDGE_DELAY = float(os.getenv('DISK_HEDGE_DELAY', '0'))
+_CONNECT_TIMEOUT = float(os.getenv('DISK_CONNECT_TIMEOUT', '5'))
+# Таймауты по фазам: метаданные отвечают быстро, а PUT длится дольше
+# в зависимости от размера файла.
+META_TIMEOUT = ClientTimeout(
+    total=float(os.getenv('DISK_META_TIMEOUT', '15')),
+    sock_connect=_CONNECT_TIMEOUT)
+PUT_TIMEOUT = ClientTimeout(
+    total=float(os.getenv('DISK_PUT_TIMEOUT', '600')),
+    sock_connect=_CONNECT_TIMEOUT)
+upload_scheduler = UploadScheduler(_CONCURRENCY, _MAX_QUEUE)
+upload_limit = AimdLimit(upload_scheduler, _CONCURRENCY_MIN,
+                         max(_CONCURRENCY, _CONCURRENCY_MAX))
+_BREAKER_THRESHOLD = int(os.getenv('DISK_BREAKER_THRESHOLD', '5'))
+_BREAKER_RESET = float(os.getenv('DISK_BREAKER_RESET', '30'))
+disk_breaker = CircuitBreaker(_BREAKER_THRESHOLD, _BREAKER_RESET)
+disk_accounts = make_account_pool(
+    app.config,
+    min_free_space=int(os.getenv('DISK_MIN_FREE_SPACE', str(1 << 30))),
+    space_ttl=float(os.getenv('DISK_SPACE_TTL', '300')),
+    threshold=_BREAKER_THRESHOLD, reset_timeout=_BREAKER_RESET,
+    concurrency=_CONCURRENCY, min_concurrency=_CONCURRENCY_MIN,
+    max_concurrency=_CONCURRENCY_MAX)
+# Ответы, которые говорят о беде конкретного аккаунта, а не всего API:
+# отозванный токен, исчерпанный лимит запросов или место.
+ACCOUNT_ERRORS = (401, 403, 429, 507)
+call_stats = {'retries': 0, 'hedges': 0}
+# Чанков в канале между потоком запроса и загрузкой на Диск.
+PIPE_DEPTH = int(os.getenv('DISK_PIPE_DEPTH', '16'))
+# Ссылка на скачивание живёт на Диске несколько часов; кэш — заметно
+# меньше, чтобы при переходе не отдать уже истёкшую.
+LINK_TTL = float(os.getenv('DISK_LINK_TTL', '600'))
+LINK_CACHE_SIZE = int(os.getenv('DISK_LINK_CACHE_SIZE', '10000'))
+# Сколько поток запроса ждёт ссылку на скачивание, прежде чем ответить 503.
+LINK_RESOLVE_TIMEOUT = float(os.getenv('DISK_LINK_RESOLVE_TIMEOUT', '10'))
+# Публиковать файлы и хранить постоянную публичную ссылку вместо пути.
+PUBLIC_LINKS = os.getenv('DISK_PUBLIC_LINKS', '').lower() in (
+    '1', 'true', 'yes')
 
 
 def _ensure_token():
-    if not DISK_TOKEN:
-        raise RuntimeError('DISK_TOKEN не задан. Добавьте его в .env')
+    if not len(disk_accounts):
+        raise RuntimeError(
+            'Не заданы ни DISK_TOKENS, ни DISK_TOKEN. Добавьте токен в .env')
 
 
 def _safe_remote_path(original_filename: str) -> str:
@@ -36,84 +102,746 @@ def _safe_remote_path(original_filename: str) -> str:
     return f'app:/{final_name}'
 
 
-async def _get_upload_href(session: ClientSession, remote_path: str) -> str:
-    async with session.get(
-            REQUEST_UPLOAD_URL,
-            params={'path': remote_path, 'overwrite': 'true'},
-    ) as resp:
-        resp.raise_for_status()
-        data = await resp.json()
-        return data['href']
+def is_disk_path(original: str) -> bool:
+    # Ссылки на файлы хранят путь на Диске вместе с аккаунтом, а не
+    # временную ссылку на скачивание: она получается при переходе.
+    return is_location(original)
+
+
+def _retry_after(resp) -> Optional[float]:
+    value = resp.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, moment.timestamp() - time.time())
+
+
+def _account_limit(account: Optional[DiskAccount]) -> AimdLimit:
+    """
+    Лимит, которому достаются 429 аккаунта: в пуле из нескольких
+    аккаунтов у каждого свой, а с одним аккаунтом — общий.
+    """
+    if account is None or len(disk_accounts) < 2:
+        return upload_limit
+    return account.limit
+
+
+def _observe(resp, started: float, timed: bool = True,
+             account: DiskAccount = None) -> None:
+    """
+    Передаёт исход вызова Диска адаптивным лимитам: 429 — лимиту
+    аккаунта, 5xx — общему лимиту загрузок.
+    """
+    own = _account_limit(account)
+    if resp.status == 429:
+        own.on_throttle(started, _retry_after(resp))
+    elif resp.status >= 500:
+        upload_limit.on_throttle(started, _retry_after(resp))
+    elif resp.status < 400:
+        latency = time.monotonic() - started if timed else None
+        upload_limit.on_success(latency)
+        if own is not upload_limit:
+            own.on_success(latency)
+
+
+async def _wait_retry_after(account: DiskAccount = None) -> None:
+    delay = max(upload_limit.delay(), _account_limit(account).delay())
+    if delay:
+        await asyncio.sleep(delay)
+
+
+def _classify(exc: BaseException, failover: bool = False):
+    """
+    (повторять ли вызов, считать ли ошибку сбоем API Диска). При
+    `failover` 429 не повторяется: вызов перейдёт на другой аккаунт.
+    """
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return (exc.status >= 500 or exc.status == 429 and not failover,
+                exc.status >= 500)
+    if isinstance(exc, (aiohttp.ClientConnectionError,
+                        asyncio.TimeoutError)):
+        return True, True
+    return False, False
+
+
+def _count(key: str) -> None:
+    call_stats[key] += 1
+
+
+async def _disk_call(call: Callable[[], Awaitable], hedge: bool = False,
+                     attempts: int = None, account: DiskAccount = None,
+                     failover: bool = False):
+    """
+    Вызов API Диска с повторами и автоматом `disk_breaker`; идемпотентные
+    GET при `hedge` дублируются, если не ответили за HEDGE_DELAY. Итог
+    вызова от имени `account` учитывается в здоровье аккаунта; при
+    `failover` на 429 вызов сразу уступает следующему аккаунту пула.
+    """
+    async def attempt():
+        await _wait_retry_after(account)
+        if hedge:
+            return await hedged(call, HEDGE_DELAY, lambda: _count('hedges'))
+        return await call()
+
+    try:
+        result = await call_with_retries(
+            attempt, attempts=attempts or RETRY_ATTEMPTS,
+            base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY,
+            breaker=disk_breaker,
+            classify=functools.partial(_classify, failover=failover),
+            on_retry=lambda: _count('retries'))
+    except aiohttp.ClientResponseError as exc:
+        if account is not None and exc.status in ACCOUNT_ERRORS:
+            account.on_failure(exc.status)
+        raise
+    if account is not None:
+        account.health.on_success()
+    return result
+
+
+async def _get_json(session: ClientSession, account: DiskAccount,
+                    url: str, params: dict, failover: bool = False) -> dict:
+    async def call():
+        started = time.monotonic()
+        async with session.get(url, params=params, headers=account.headers,
+                               timeout=META_TIMEOUT) as resp:
+            _observe(resp, started, account=account)
+            resp.raise_for_status()
+            return await resp.json()
+
+    return await _disk_call(call, hedge=True, account=account,
+                            failover=failover)
+
+
+async def _get_href(session: ClientSession, url: str, location: str,
+                    failover: bool = False, **params) -> str:
+    account, remote_path = disk_accounts.locate(location)
+    return (await _get_json(session, account, url,
+                            dict(params, path=remote_path),
+                            failover=failover))['href']
+
+
+async def _get_upload_href(session: ClientSession, location: str,
+                           failover: bool = False) -> str:
+    return await _get_href(session, REQUEST_UPLOAD_URL, location,
+                           failover=failover, overwrite='true')
+
+
+async def _get_content(session: ClientSession,
+                       location: str) -> Tuple[Optional[str], Optional[int]]:
+    """SHA-256 и размер содержимого, посчитанные Диском."""
+    account, remote_path = disk_accounts.locate(location)
+    data = await _get_json(session, account, RESOURCES_URL,
+                           {'path': remote_path, 'fields': 'sha256,size'})
+    return data.get('sha256'), data.get('size')
+
+
+async def _delete_resource(session: ClientSession, location: str) -> None:
+    account, remote_path = disk_accounts.locate(location)
+
+    async def call():
+        started = time.monotonic()
+        async with session.delete(
+                RESOURCES_URL, headers=account.headers, timeout=META_TIMEOUT,
+                params={'path': remote_path, 'permanently': 'true'}) as resp:
+            _observe(resp, started, account=account)
+            if resp.status != 404:
+                resp.raise_for_status()
+
+    await _disk_call(call, account=account)
 
 
 async def _publish_and_get_public_url(session: ClientSession,
-                                      remote_path: str) -> str:
-    async with session.put(PUBLISH_URL, params={'path': remote_path}) as pub:
-        if pub.status not in (200, 202, 409):
-            pub.raise_for_status()
-
-    async with session.get(RESOURCES_URL,
-                           params={'path': remote_path}) as meta:
-        meta.raise_for_status()
-        data = await meta.json()
-        public_url = data.get('public_url')
-        if not public_url:
-            raise RuntimeError(
-                'Не удалось получить public_url после публикации.')
-        return public_url
-
-
-async def _iter_file_async(stream, chunk_size: int = 1 << 20):
+                                      location: str) -> str:
+    account, remote_path = disk_accounts.locate(location)
+
+    async def publish():
+        started = time.monotonic()
+        async with session.put(PUBLISH_URL, params={'path': remote_path},
+                               headers=account.headers,
+                               timeout=META_TIMEOUT) as pub:
+            _observe(pub, started, account=account)
+            if pub.status not in (200, 202, 409):
+                pub.raise_for_status()
+
+    await _disk_call(publish, account=account)
+    data = await _get_json(session, account, RESOURCES_URL,
+                           {'path': remote_path, 'fields': 'public_url'})
+    public_url = data.get('public_url')
+    if not public_url:
+        raise RuntimeError('Не удалось получить public_url после публикации.')
+    return public_url
+
+
+async def _stored_link(session: ClientSession, location: str) -> str:
+    """Что хранить как исходный URL ссылки на загруженный файл."""
+    if PUBLIC_LINKS:
+        return await _publish_and_get_public_url(session, location)
+    return location
+
+
+async def _check_space(session: ClientSession, account: DiskAccount) -> None:
+    data = await _get_json(session, account, DISK_INFO_URL,
+                           {'fields': 'total_space,used_space'})
+    account.free_space = data['total_space'] - data['used_space']
+
+
+async def _refresh_space(session: ClientSession) -> None:
+    """Обновляет свободное место аккаунтов, если сведения устарели."""
+    stale = disk_accounts.claim_stale()
+    results = await asyncio.gather(
+        *(_check_space(session, account) for account in stale),
+        return_exceptions=True)
+    for account, result in zip(stale, results):
+        if isinstance(result, Exception):
+            logger.warning('Не удалось узнать место на аккаунте Диска %s: '
+                           '%r', account.name, result)
+
+
+async def _upload_target(session: ClientSession,
+                         filename: str) -> Tuple[DiskAccount, str, str]:
+    """
+    (аккаунт, путь, ссылка для PUT) на аккаунте, выбранном пулом; если
+    аккаунт отказал (токен, лимит, место), пробуется следующий.
+    Аккаунт нужно вернуть в пул через `disk_accounts.release`.
+    """
+    await _refresh_space(session)
+    tried = []
+    while True:
+        account = disk_accounts.acquire(exclude=tried)
+        location = disk_accounts.location(account,
+                                          _safe_remote_path(filename))
+        # На последнем из аккаунтов 429 снова повторяется с паузой.
+        failover = len(tried) + 1 < len(disk_accounts)
+        try:
+            return account, location, await _get_upload_href(
+                session, location, failover=failover)
+        except aiohttp.ClientResponseError as exc:
+            disk_accounts.release(account)
+            tried.append(account)
+            if exc.status not in ACCOUNT_ERRORS or (
+                    len(tried) == len(disk_accounts)):
+                raise
+        except BaseException:
+            disk_accounts.release(account)
+            raise
+
+
+class ChunkPipe:
+    """
+    Ограниченный канал чанков файла из потока запроса в цикл клиента
+    Диска. `send` блокирует поток, пока в канале нет места, так что
+    чтение тела запроса идёт не быстрее загрузки на Диск.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop,
+                 depth: int = PIPE_DEPTH):
+        self._loop = loop
+        self._queue = asyncio.Queue(depth)
+        self.consumer: Optional[concurrent.futures.Future] = None
+
+    def seekable(self) -> bool:
+        return False
+
+    def send(self, chunk: Optional[bytes]) -> bool:
+        """`None` — конец файла. False, если загрузка уже завершилась."""
+        put = asyncio.run_coroutine_threadsafe(
+            self._queue.put(chunk), self._loop)
+        done, _ = concurrent.futures.wait(
+            (put, self.consumer),
+            return_when=concurrent.futures.FIRST_COMPLETED)
+        if put in done:
+            return True
+        put.cancel()
+        return False
+
+    async def __aiter__(self):
+        while (chunk := await self._queue.get()) is not None:
+            yield chunk
+
+
+async def _iter_file_async(stream, chunk_size: int = 1 << 20, digest=None):
+    """Чанки файла для PUT; по пути обновляет `digest`, если он задан."""
+    if hasattr(stream, '__aiter__'):
+        async for chunk in stream:
+            if digest is not None:
+                digest.update(chunk)
+            yield chunk
+        return
     loop = asyncio.get_running_loop()
     while True:
         chunk = await loop.run_in_executor(None, stream.read, chunk_size)
         if not chunk:
             break
+        if digest is not None:
+            digest.update(chunk)
         yield chunk
 
 
-async def _upload_one(session: ClientSession, file_storage) -> Optional[str]:
+async def _put_file(session: ClientSession, href: str, stream,
+                    account: DiskAccount = None) -> str:
+    """Загружает поток по `href` и возвращает SHA-256 отправленных данных."""
+    # Повторить PUT можно, только если поток удаётся перемотать.
+    seekable = getattr(stream, 'seekable', lambda: False)()
+    start = stream.tell() if seekable else None
+    digest = hashlib.sha256()
+
+    async def call():
+        nonlocal digest
+        if start is not None:
+            stream.seek(start)
+        digest = hashlib.sha256()
+        started = time.monotonic()
+        async with session.put(href, data=_iter_file_async(stream,
+                                                           digest=digest),
+                               timeout=PUT_TIMEOUT) as put_resp:
+            # Длительность PUT зависит от размера файла, поэтому в оценку
+            # задержки идут только метаданные, а здесь — лишь статус.
+            _observe(put_resp, started, timed=False, account=account)
+            put_resp.raise_for_status()
+
+    await _disk_call(call, attempts=None if seekable else 1,
+                     account=account)
+    return digest.hexdigest()
+
+
+class UploadTooLarge(RuntimeError):
+    """Загруженный напрямую файл больше допустимого; `size` — его размер."""
+
+    def __init__(self, size: int):
+        super().__init__(size)
+        self.size = size
+
+
+class Uploaded(NamedTuple):
+    """
+    Файл на Диске: хранимая ссылка (путь на Диске либо публичная
+    ссылка), путь с аккаунтом пула и SHA-256 содержимого.
+    """
+    link: str
+    remote_path: str
+    sha256: Optional[str] = None
+    # Слаг, если файл с тем же содержимым уже был загружен раньше.
+    short: Optional[str] = None
+
+
+async def _upload_one(session: ClientSession, file_storage,
+                      owner: Hashable,
+                      reservation: Optional[Reservation] = None
+                      ) -> Optional[Uploaded]:
     if not file_storage or not getattr(file_storage, 'filename', None):
         return None
 
-    remote_path = _safe_remote_path(file_storage.filename)
+    async with upload_scheduler.slot(owner, reservation):
+        account, location, href = await _upload_target(
+            session, file_storage.filename)
+        try:
+            sha256 = await _put_file(session, href, file_storage.stream,
+                                     account)
+        finally:
+            disk_accounts.release(account)
+    return Uploaded(await _stored_link(session, location), location, sha256)
 
-    async with _SEM:
-        href = await _get_upload_href(session, remote_path)
-        async with session.put(href, data=_iter_file_async(
-                file_storage.stream)) as put_resp:
-            put_resp.raise_for_status()
 
-        download_href = await _get_download_href(session, remote_path)
-        return download_href
+async def _get_download_href(session: ClientSession, location: str) -> str:
+    return await _get_href(session, DOWNLOAD_URL, location)
+
+
+class DiskClient:
+    """
+    Общая на процесс сессия aiohttp к API Диска с пулом соединений.
+
+    Сессия создаётся лениво и живёт на «домашнем» цикле событий: в
+    ASGI-режиме это цикл сервера (`bind`), иначе — отдельный фоновый
+    поток, куда вызовы из временных циклов WSGI-запросов передаются
+    через `run_coroutine_threadsafe`. Так соединения, TLS-сессии и
+    DNS-кэш переживают запрос. После fork дочерний процесс не трогает
+    сессию родителя и открывает свою.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._stats = dict.fromkeys((
+            'requests', 'in_flight', 'connections_created',
+            'connections_reused', 'dns_cache_hits', 'dns_cache_misses',
+        ), 0)
+
+    def _forget_parent(self) -> None:
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._loop = self._thread = self._session = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._thread is not None:
+            self.close()
+        with self._lock:
+            self._forget_parent()
+            if self._loop is not loop:
+                self._loop, self._thread, self._session = loop, None, None
+
+    def _home(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            self._forget_parent()
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._session = None
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name='yandex-disk',
+                    daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def _count(self, key: str, delta: int = 1):
+        async def handler(session, context, params):
+            self._stats[key] += delta
+        return handler
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(self._count('requests'))
+        trace.on_request_start.append(self._count('in_flight'))
+        trace.on_request_end.append(self._count('in_flight', -1))
+        trace.on_request_exception.append(self._count('in_flight', -1))
+        trace.on_connection_create_end.append(
+            self._count('connections_created'))
+        trace.on_connection_reuseconn.append(
+            self._count('connections_reused'))
+        trace.on_dns_cache_hit.append(self._count('dns_cache_hits'))
+        trace.on_dns_cache_miss.append(self._count('dns_cache_misses'))
+        return trace
+
+    def _get_session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=POOL_LIMIT,
+                limit_per_host=POOL_LIMIT_PER_HOST,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=DNS_CACHE_TTL,
+            )
+            # Заголовок авторизации у каждого вызова свой: он зависит от
+            # аккаунта пула. Общего таймаута нет: он задаётся на фазу.
+            self._session = aiohttp.ClientSession(
+                timeout=ClientTimeout(total=None,
+                                      sock_connect=_CONNECT_TIMEOUT),
+                connector=connector,
+                trace_configs=[self._trace_config()],
+            )
+        return self._session
+
+    async def _call(self, func: Callable[..., Awaitable], *args):
+        return await func(self._get_session(), *args)
+
+    async def run(self, func: Callable[..., Awaitable], *args):
+        """Выполняет `func(session, *args)` на домашнем цикле клиента."""
+        home = self._home()
+        if home is asyncio.get_running_loop():
+            return await self._call(func, *args)
+        return await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(self._call(func, *args), home))
 
+    def submit(self, func: Callable[..., Awaitable],
+               *args) -> concurrent.futures.Future:
+        """Как `run`, но для синхронного кода: сразу возвращает future."""
+        return asyncio.run_coroutine_threadsafe(
+            self._call(func, *args), self._home())
 
-async def _get_download_href(session: ClientSession, remote_path: str) -> str:
-    async with session.get(DOWNLOAD_URL, params={'path': remote_path}) as resp:
-        resp.raise_for_status()
-        data = await resp.json()
-        return data['href']
+    def stats(self) -> dict:
+        return dict(self._stats, limit=POOL_LIMIT,
+                    limit_per_host=POOL_LIMIT_PER_HOST,
+                    scheduler=upload_scheduler.stats(),
+                    adaptive=upload_limit.stats(),
+                    breaker=disk_breaker.stats(),
+                    accounts=disk_accounts.stats(),
+                    links=download_links.stats(), **call_stats)
 
+    async def aclose(self) -> None:
+        """Закрывает сессию; вызывается на цикле, к которому привязан."""
+        with self._lock:
+            session, self._session = self._session, None
+            if self._thread is None:
+                self._loop = None
+        if session is not None and not session.closed:
+            await session.close()
 
-async def upload_files_to_disk(files: List) -> List[str]:
+    def close(self) -> None:
+        """Закрывает сессию и фоновый поток; для atexit и тестов."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            loop, thread, session = self._loop, self._thread, self._session
+            self._loop = self._thread = self._session = None
+        if thread is None:
+            return
+        if session is not None and not session.closed:
+            asyncio.run_coroutine_threadsafe(
+                session.close(), loop).result(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        loop.close()
+
+
+class UploadResult(NamedTuple):
+    """Итог загрузки одного файла; `index` — позиция во входном списке."""
+    index: int
+    name: str
+    link: Optional[str] = None
+    error: Optional[BaseException] = None
+    remote_path: Optional[str] = None
+    sha256: Optional[str] = None
+    short: Optional[str] = None
+
+
+Pending = Dict[concurrent.futures.Future, Tuple[int, str]]
+
+
+def start_uploads(files: List, owner: Optional[Hashable] = None) -> Pending:
+    """
+    Ставит файлы в общий планировщик и сразу возвращает
+    {future: (индекс, имя)}; `owner` — ключ честной очереди (по
+    умолчанию каждый вызов — отдельный владелец). Если очередь заполнена,
+    поднимает UploadBusy, а пока API Диска недоступно — CircuitOpen.
+    """
     _ensure_token()
+    files = [(index, f) for index, f in enumerate(files or [])
+             if f and getattr(f, 'filename', None)]
     if not files:
-        return []
-
-    timeout = ClientTimeout(total=600)  # общий таймаут.
-    async with aiohttp.ClientSession(headers=AUTH_HEADER,
-                                     timeout=timeout) as session:
-        tasks = [
-            asyncio.create_task(_upload_one(session, f))
-            for f in files
-            if f and getattr(f, 'filename', None)
-        ]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-    urls: List[str] = []
-    for r in results:
-        if isinstance(r, Exception):
-            continue
-        if r:
-            urls.append(r)
-    return urls
+        return {}
+    disk_breaker.check()
+    disk_accounts.check()
+    reservations = upload_scheduler.admit(len(files))
+    owner = owner or object()
+    return {_submit_upload(f, owner, reservation): (index, f.filename)
+            for (index, f), reservation in zip(files, reservations)}
+
+
+def _submit_upload(file_storage, owner: Hashable,
+                   reservation: Reservation) -> concurrent.futures.Future:
+    future = disk_client.submit(_upload_one, file_storage, owner, reservation)
+    # Загрузка, отменённая до постановки в очередь, возвращает место.
+    future.add_done_callback(lambda _: reservation.release())
+    return future
+
+
+def _result(future, index: int, name: str) -> UploadResult:
+    error = future.exception()
+    if error is None:
+        return UploadResult(index, name, **future.result()._asdict())
+    logger.warning('Не удалось загрузить файл %s на Яндекс Диск: %r',
+                   name, error)
+    return UploadResult(index, name, error=error)
+
+
+def iter_completed(pending: Pending, idle: Optional[float] = None
+                   ) -> Iterator[Optional[UploadResult]]:
+    """
+    Результаты по мере завершения загрузок; для синхронного кода. Если
+    за `idle` секунд ни одна загрузка не завершилась, отдаёт None, чтобы
+    вызывающий мог, например, продлить аренду задания.
+    """
+    waiting = dict(pending)
+    try:
+        while waiting:
+            done, _ = concurrent.futures.wait(
+                waiting, timeout=idle,
+                return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                yield None
+            for future in done:
+                yield _result(future, *waiting.pop(future))
+    finally:
+        for future in waiting:
+            future.cancel()
+
+
+async def aiter_completed(pending: Pending) -> AsyncIterator[UploadResult]:
+    """Результаты по мере завершения загрузок на текущем цикле событий."""
+    waiting = {asyncio.wrap_future(future): key
+               for future, key in pending.items()}
+    try:
+        while waiting:
+            done, _ = await asyncio.wait(
+                waiting, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                yield _result(future, *waiting.pop(future))
+    finally:
+        for future in waiting:
+            future.cancel()
+
+
+async def _gather(session: ClientSession, func: Callable[..., Awaitable],
+                  args: List) -> List:
+    return await asyncio.gather(*(func(session, arg) for arg in args),
+                                return_exceptions=True)
+
+
+async def _upload_slot(session: ClientSession, filename: str):
+    # Файл загрузит браузер, поэтому аккаунт сразу возвращается в пул.
+    account, location, href = await _upload_target(session, filename)
+    disk_accounts.release(account)
+    return location, href
+
+
+async def request_upload_slots(filenames: List[str]) -> List:
+    """
+    Выдаёт пары (remote_path, href), чтобы браузер загрузил файлы на Диск
+    напрямую; вместо пары — исключение, если ссылку получить не удалось.
+    """
+    _ensure_token()
+    disk_breaker.check()
+    disk_accounts.check()
+    return await disk_client.run(_gather, _upload_slot, filenames)
+
+
+async def _resolve_uploaded(session: ClientSession, remote_path: str,
+                            max_size: Optional[int] = None) -> Uploaded:
+    # Метаданные заодно подтверждают, что файл действительно загружен.
+    sha256, size = await _get_content(session, remote_path)
+    if max_size is not None and (size or 0) > max_size:
+        # Браузер загружает мимо приложения и может прислать больше
+        # заявленного: такой файл ссылки не получает и удаляется.
+        await _delete_resource(session, remote_path)
+        raise UploadTooLarge(size)
+    return Uploaded(await _stored_link(session, remote_path), remote_path,
+                    sha256)
+
+
+async def resolve_uploads(remote_paths: List[str],
+                          max_size: Optional[int] = None) -> List:
+    """
+    Uploaded (хранимая ссылка и хеш от Диска) для уже загруженных файлов
+    либо исключение вместо каждого; файлы больше `max_size` байт
+    удаляются с Диска и получают UploadTooLarge.
+    """
+    _ensure_token()
+    disk_breaker.check()
+    return await disk_client.run(
+        _gather, functools.partial(_resolve_uploaded, max_size=max_size),
+        remote_paths)
+
+
+def _log_discard(future: concurrent.futures.Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning('Не удалось удалить копию файла с Диска: %r',
+                       future.exception())
+
+
+def discard_files(remote_paths: List[str]
+                  ) -> List[concurrent.futures.Future]:
+    """Удаляет лишние копии файлов с Диска в фоне."""
+    futures = [disk_client.submit(_delete_resource, remote_path)
+               for remote_path in remote_paths]
+    for future in futures:
+        future.add_done_callback(_log_discard)
+    return futures
+
+
+def start_upload(filename: str, owner: Hashable) -> ChunkPipe:
+    """
+    Начинает загрузку файла, тело которого ещё поступает: чанки
+    передаются через `pipe.send`, результат (Uploaded) — в
+    `pipe.consumer`. Для синхронного кода вне цикла клиента.
+    """
+    _ensure_token()
+    disk_breaker.check()
+    disk_accounts.check()
+    reservation, = upload_scheduler.admit(1)
+    pipe = ChunkPipe(disk_client._home())
+    pipe.consumer = _submit_upload(
+        FileStorage(stream=pipe, filename=filename), owner, reservation)
+    return pipe
+
+
+class DownloadLinks:
+    """
+    Ссылки на скачивание по пути на Диске для перехода по короткой
+    ссылке. Кэш с TTL `LINK_TTL`; одновременные запросы одного пути
+    ждут один общий вызов API, но не дольше `timeout` секунд: общий
+    вызов при этом не отменяется и наполнит кэш для следующих.
+    """
+
+    def __init__(self, maxsize: int = LINK_CACHE_SIZE, ttl: float = LINK_TTL,
+                 timeout: float = LINK_RESOLVE_TIMEOUT):
+        self._cache = TTLCache(maxsize, ttl)
+        self.timeout = timeout
+        self._lock = threading.RLock()
+        self._inflight: Dict[str, concurrent.futures.Future] = {}
+        self.coalesced = 0
+
+    def reset(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._inflight.clear()
+            self.coalesced = 0
+
+    def _settle(self, remote_path: str,
+                future: concurrent.futures.Future) -> None:
+        with self._lock:
+            if self._inflight.get(remote_path) is future:
+                del self._inflight[remote_path]
+            if not future.cancelled() and future.exception() is None:
+                self._cache.set(remote_path, future.result())
+
+    def _future(self, remote_path: str) -> concurrent.futures.Future:
+        with self._lock:
+            future = self._inflight.get(remote_path)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            _ensure_token()
+            disk_breaker.check()
+            future = disk_client.submit(_get_download_href, remote_path)
+            self._inflight[remote_path] = future
+            future.add_done_callback(
+                lambda done: self._settle(remote_path, done))
+            return future
+
+    def resolve_many(self, remote_paths: List[str]) -> Dict[str, object]:
+        """
+        {путь: ссылка на скачивание или исключение}; не дождавшиеся
+        ответа за `timeout` секунд пути получают TimeoutError.
+        """
+        found, futures = {}, {}
+        for remote_path in dict.fromkeys(remote_paths):
+            href = self._cache.get(remote_path)
+            if href is not None:
+                found[remote_path] = href
+                continue
+            try:
+                futures[remote_path] = self._future(remote_path)
+            except (CircuitOpen, RuntimeError) as e:
+                found[remote_path] = e
+        deadline = time.monotonic() + self.timeout
+        for remote_path, future in futures.items():
+            try:
+                error = future.exception(
+                    max(0.0, deadline - time.monotonic()))
+            except concurrent.futures.TimeoutError as e:
+                error = e
+            found[remote_path] = future.result() if error is None else error
+        return found
+
+    def resolve(self, remote_path: str) -> str:
+        """Ссылка на скачивание; ошибку API поднимает как есть."""
+        href = self.resolve_many([remote_path])[remote_path]
+        if isinstance(href, Exception):
+            raise href
+        return href
+
+    def stats(self) -> dict:
+        return dict(self._cache.stats(), coalesced=self.coalesced)
+
+
+disk_client = DiskClient()
+download_links = DownloadLinks()
+atexit.register(disk_client.close)